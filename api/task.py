@@ -1,67 +1,265 @@
-""" API library for calling the to-do list webservice.
-
-See server.py for all possible calls.
-
-Returns a JSend compliant response as python dictionary.
-
-Typical usage:
-    result = api.task.select(1234)
-    if result["status"] == jsend.SUCCESS then:
-            data = result["data"]
-            ...
-"""
-
-import json
-from datetime import date
-
-import requests
-
-import jsend
-import server
-
-URL = f"http://{server.HOST}:{server.PORT}"
-
-
-def select(task_id=None):
-    try:
-        if task_id is None:
-            result = requests.get(URL + "/task")
-        else:
-            result = requests.get(URL + f"/task/{task_id:d}")
-        return result.json()
-    except Exception as e:
-        result = jsend.error("select task failed", code=type(e).__name__, data=str(e))
-        return json.loads(result)
-
-
-def insert(summary="", description="", duedate=date.today(), status_id="O"):
-    try:
-        result = requests.post(URL + "/task", json=dict(summary=summary, description=description,
-                                                        duedate=duedate.isoformat(), status_id=status_id))
-        return result.json()
-    except Exception as e:
-        result = jsend.error("insert task failed", code=type(e).__name__, data=str(e))
-        return json.loads(result)
-
-
-def update(task_id, summary, description, duedate, status_id):
-    try:
-        result = requests.put(URL + f"/task/{task_id:d}",
-                              json=dict(task_id=task_id, summary=summary, description=description,
-                                        duedate=duedate.isoformat(), status_id=status_id))
-        return result.json()
-    except Exception as e:
-        result = jsend.error("update task failed", code=type(e).__name__, data=str(e))
-        return json.loads(result)
-
-
-def delete(task_id=None):
-    try:
-        if task_id is None:
-            result = requests.delete(URL + "/task")
-        else:
-            result = requests.delete(URL + f"/task/{task_id:d}")
-        return result.json()
-    except Exception as e:
-        result = jsend.error("delete task failed", code=type(e).__name__, data=str(e))
-        return json.loads(result)
+""" API library for calling the to-do list webservice.
+
+See server.py for all possible calls.
+
+Returns a JSend compliant response as python dictionary.
+
+Typical usage:
+    result = api.task.select(1234)
+    if result["status"] == jsend.SUCCESS then:
+            data = result["data"]
+            ...
+
+The module level functions share one TaskClient, which keeps the connections to the
+web service open between calls. Create a TaskClient (or an AsyncTaskClient for use
+with asyncio) to use different settings:
+
+    client = api.task.TaskClient(timeout=(1, 5), retries=5)
+    results = client.select_many([1, 2, 3])
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import jsend
+import server
+
+URL = f"http://{server.HOST}:{server.PORT}"
+
+RETRY_STATUS = (502, 503, 504)  # responses after which an idempotent request is retried
+
+
+class TaskClient:
+    """ Client for the web service using a pool of persistent (keep-alive) connections.
+
+    Idempotent calls (GET, PUT and DELETE) are retried after a connection error, a timeout
+    or a RETRY_STATUS response, waiting an exponentially growing and randomized (jittered)
+    time between attempts. Inserts are never retried as this could create duplicate tasks.
+    """
+
+    def __init__(self, url=URL, timeout=(3.05, 10), retries=3, backoff=0.1, pool_size=10):
+        """
+        :param str url: base URL of the web service
+        :param timeout: seconds to wait for a connection and for a response, as tuple or single value
+        :param int retries: number of retries for idempotent calls
+        :param float backoff: average wait in seconds before the first retry, doubles on every retry
+        :param int pool_size: maximum number of connections kept open
+        """
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, method, path, description, idempotent=True, **kwargs):
+        """ Call the web service and return the JSend response as dictionary.
+
+        :param str method: HTTP method
+        :param str path: path relative to the base URL
+        :param str description: description of the call for the error message on failure
+        :param bool idempotent: True if the call may safely be retried
+        :return dict: JSend compliant response, an error response if the call failed
+        """
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                result = self.session.request(method, self.url + path, timeout=self.timeout, **kwargs)
+                if result.status_code not in RETRY_STATUS or attempt == attempts - 1:
+                    return result.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == attempts - 1:
+                    return json.loads(jsend.error(f"{description} failed", code=type(e).__name__, data=str(e)))
+            except Exception as e:
+                return json.loads(jsend.error(f"{description} failed", code=type(e).__name__, data=str(e)))
+            time.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def select(self, task_id=None):
+        if task_id is None:
+            return self.request("GET", "/task", "select task")
+        return self.request("GET", f"/task/{task_id:d}", "select task")
+
+    def select_page(self, limit=100, after=None, total=False, **filters):
+        """ Fetch one page of tasks, pass data["next"] of the result as after to get the next page.
+
+        :param bool total: also return the number of tasks matching the filters in data["total"]
+        :param filters: status_id, duedate_from, duedate_to and/or sort, see server.task_get()
+        """
+        params = dict(filters, limit=limit)
+        if after is not None:
+            params["after"] = after
+        if total:
+            params["total"] = 1
+        return self.request("GET", "/task", "select task", params=params)
+
+    def search(self, query, limit=20, after=None):
+        """ Full-text search, best match first. Pass data["next"] of the result as after to get the next page. """
+        params = dict(q=query, limit=limit)
+        if after is not None:
+            params["after"] = after
+        return self.request("GET", "/task/_search", "search task", params=params)
+
+    def insert(self, summary="", description="", duedate=None, status_id="O"):
+        duedate = date.today() if duedate is None else duedate
+        return self.request("POST", "/task", "insert task", idempotent=False,
+                            json=dict(summary=summary, description=description, duedate=duedate.isoformat(),
+                                      status_id=status_id))
+
+    def update(self, task_id, summary, description, duedate, status_id):
+        return self.request("PUT", f"/task/{task_id:d}", "update task",
+                            json=dict(task_id=task_id, summary=summary, description=description,
+                                      duedate=duedate.isoformat(), status_id=status_id))
+
+    def delete(self, task_id=None):
+        if task_id is None:
+            return self.request("DELETE", "/task", "delete task")
+        return self.request("DELETE", f"/task/{task_id:d}", "delete task")
+
+    def select_many(self, task_ids):
+        """ Fetch several tasks concurrently, using up to pool_size connections.
+
+        :return list: JSend response per task id, in the order of task_ids
+        """
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            return list(executor.map(self.select, task_ids))
+
+    def insert_many(self, tasks, batch_size=1000):
+        """ Insert many tasks using as few requests as possible.
+
+        :param iterable tasks: dicts with key summary and optionally description, duedate and status_id
+        :param int batch_size: number of tasks per request
+        :return list: JSend result per task, in the order of tasks
+        """
+        results = []
+        batch = []
+        for task in tasks:
+            if isinstance(task.get("duedate"), date):
+                task = dict(task, duedate=task["duedate"].isoformat())
+            batch.append(task)
+            if len(batch) == batch_size:
+                results.extend(self._insert_batch(batch))
+                batch = []
+        if batch:
+            results.extend(self._insert_batch(batch))
+        return results
+
+    def _insert_batch(self, batch):
+        result = self.request("POST", "/task/_bulk", "insert task", idempotent=False, json=batch)
+        if result["status"] == jsend.SUCCESS:
+            return result["data"]
+        return [result] * len(batch)  # the whole batch failed
+
+
+class AsyncTaskClient:
+    """ asyncio counterpart of TaskClient, every call runs on the connection pool of a TaskClient.
+
+    This is not a native asyncio client: the blocking calls of the TaskClient (requests) run on a
+    thread pool of pool_size threads, so at most pool_size calls are in progress at the same time.
+    It lets coroutines call the web service without blocking the event loop.
+
+    Usage:
+        async with api.task.AsyncTaskClient() as client:
+            results = await client.select_many([1, 2, 3])
+    """
+
+    def __init__(self, **kwargs):
+        """ :param kwargs: settings for the TaskClient, see TaskClient.__init__() """
+        self.client = TaskClient(**kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=self.client.pool_size)
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(self, function, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: function(*args, **kwargs))
+
+    async def select(self, task_id=None):
+        return await self._run(self.client.select, task_id)
+
+    async def select_page(self, limit=100, after=None, total=False, **filters):
+        return await self._run(self.client.select_page, limit, after, total, **filters)
+
+    async def search(self, query, limit=20, after=None):
+        return await self._run(self.client.search, query, limit, after)
+
+    async def insert(self, summary="", description="", duedate=None, status_id="O"):
+        return await self._run(self.client.insert, summary, description, duedate, status_id)
+
+    async def update(self, task_id, summary, description, duedate, status_id):
+        return await self._run(self.client.update, task_id, summary, description, duedate, status_id)
+
+    async def delete(self, task_id=None):
+        return await self._run(self.client.delete, task_id)
+
+    async def select_many(self, task_ids):
+        """ Fetch several tasks concurrently, return the JSend response per task id in order. """
+        return await asyncio.gather(*(self.select(task_id) for task_id in task_ids))
+
+    async def insert_many(self, tasks, batch_size=1000):
+        return await self._run(self.client.insert_many, tasks, batch_size)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    """ Return the TaskClient shared by the module level functions, created by the first call from any thread. """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:  # another thread may have created it while this one waited
+                _client = TaskClient()
+    return _client
+
+
+def select(task_id=None):
+    return client().select(task_id)
+
+
+def select_page(limit=100, after=None, total=False, **filters):
+    return client().select_page(limit, after, total, **filters)
+
+
+def search(query, limit=20, after=None):
+    return client().search(query, limit, after)
+
+
+def insert(summary="", description="", duedate=None, status_id="O"):
+    return client().insert(summary, description, duedate, status_id)
+
+
+def update(task_id, summary, description, duedate, status_id):
+    return client().update(task_id, summary, description, duedate, status_id)
+
+
+def delete(task_id=None):
+    return client().delete(task_id)
@@ -0,0 +1,205 @@
+""" ASGI variant of the web service for manipulating tasks in a todo-list.
+
+Serves exactly the same routes and JSend responses as server.py, because every request
+is handled by the Bottle app in server.py. The event loop only moves bytes between the
+client and the app: requests run on a bounded pool of worker threads, so blocking calls
+to the database (via the db package) and to logging never block the event loop.
+Thousands of idle keep-alive connections therefore cost no threads.
+
+Backpressure: at most max_workers requests are handled at the same time and at most
+max_pending wait for a worker. Any request on top of that is immediately answered
+with 503 Service Unavailable and a Retry-After header.
+
+Start the server via the terminal (requires an ASGI server like uvicorn):
+    > start python asgi.py
+or
+    > uvicorn asgi:app --host 127.0.0.10 --port 8080
+when the database is initialized elsewhere.
+"""
+import asyncio
+import io
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import jsend
+import metrics
+import server
+
+logger = logging.getLogger(__name__)
+
+
+class RequestBody(io.RawIOBase):
+    """ File-like wsgi.input which is read by a worker thread while the event loop receives the body. """
+
+    def __init__(self, loop, receive, body=b"", more_body=True):
+        super().__init__()
+        self._loop = loop
+        self._receive = receive
+        self._buffer = bytearray(body)
+        self._more_body = more_body
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        """ Wait for the next part of the body from the event loop, return False at the end of the body. """
+        if not self._more_body:
+            return False
+        message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+        if message["type"] == "http.disconnect":
+            self._more_body = False
+            raise ConnectionError("client disconnected")
+        self._buffer += message.get("body", b"")
+        self._more_body = message.get("more_body", False)
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer and self._fill():
+            pass
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+
+class Application:
+    """ ASGI application which runs a WSGI application on a bounded pool of worker threads. """
+
+    def __init__(self, wsgi_app, max_workers=8, max_pending=100):
+        """
+        :param wsgi_app: WSGI application handling the requests
+        :param int max_workers: number of requests handled simultaneously
+        :param int max_pending: number of requests which may wait for a worker
+        """
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.in_flight = 0  # requests being handled or waiting for a worker
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asgi-worker")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+        else:
+            raise NotImplementedError(f"unsupported ASGI scope type {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope, receive, send):
+        if self.in_flight >= self.max_workers + self.max_pending:
+            logger.warning("rejecting %s %s, %d requests in flight", scope["method"], scope["path"], self.in_flight)
+            body = jsend.error(message="server busy, retry later")
+            await send({"type": "http.response.start", "status": 503,
+                        "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1"),
+                                    (b"content-length", str(len(body)).encode("latin-1"))]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if any(name == b"content-length" for name, _ in scope["headers"]):
+                body, content_length = RequestBody(loop, receive), None
+            else:  # the WSGI app needs the length of the body, so receive it completely first
+                content, more_body = b"", True
+                while more_body:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        return
+                    content += message.get("body", b"")
+                    more_body = message.get("more_body", False)
+                body, content_length = RequestBody(loop, receive, content, more_body=False), len(content)
+            environ = self.environ(scope, body, content_length)
+            await loop.run_in_executor(self.executor, self.run_wsgi, environ, loop, send)
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def environ(scope, body, content_length=None):
+        """ Build the WSGI environment for an ASGI http scope. """
+        server_name, server_port = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server_name,
+            "SERVER_PORT": str(server_port),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BufferedReader(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                environ[name] = value
+            elif f"HTTP_{name}" in environ:
+                environ[f"HTTP_{name}"] += "," + value
+            else:
+                environ[f"HTTP_{name}"] = value
+        if content_length is not None:
+            environ["CONTENT_LENGTH"] = str(content_length)
+        return environ
+
+    def run_wsgi(self, environ, loop, send):
+        """ Run the WSGI application in a worker thread and send its response via the event loop. """
+
+        def call(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        status_headers = []
+
+        def start_response(status, headers, exc_info=None):
+            status_headers[:] = [int(status.split(" ", 1)[0]),
+                                 [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            call({"type": "http.response.start", "status": status_headers[0], "headers": status_headers[1]})
+            for chunk in result:
+                if chunk:
+                    call({"type": "http.response.body", "body": chunk, "more_body": True})
+            call({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+
+app = Application(server.app)
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S",
+                        level=logging.INFO)
+
+    DBNAME = ":memory:"  # For persistent storage change to "todo.db"
+    SCRIPT = "todo.sql"
+
+    try:
+        import uvicorn
+    except ImportError:
+        logger.error("an ASGI server is required to run the app, install uvicorn")
+    else:
+        metrics.install(server.app, caches={"task": server.task_cache, "page": server.page_cache})
+        if server.open_database(DBNAME, SCRIPT):
+            threading.Thread(target=server.maintain_database, name="maintenance", daemon=True).start()
+            uvicorn.run(app, host=server.HOST, port=server.PORT)
@@ -0,0 +1,182 @@
+""" Load test and latency benchmark for the /task API.
+
+Starts server.app in a multi-threaded WSGI server within this process, connected to an
+in-memory or file database seeded with synthetic tasks. A number of client threads then
+send a mix of read and write requests. Reported per route are the number of requests,
+errors, throughput and the p50/p95/p99 latency.
+
+The results can be saved as a baseline, and a later run can be compared against it: the
+run fails (exit code 1) if the throughput of a route dropped, or its p95 latency rose,
+by more than the tolerance.
+
+Usage:
+    > python -m bench.load --tasks 100000 --clients 8 --requests 20000
+    > python -m bench.load --save baseline.json
+    > python -m bench.load --compare baseline.json --tolerance 10
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import requests
+
+import db
+import server
+
+ROUTES = {  # name: default weight in the workload mix
+    "get": 60,  # GET /task/<id>
+    "page": 25,  # GET /task?limit=...
+    "put": 10,  # PUT /task/<id>
+    "post": 5,  # POST /task
+}
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def seed(count, batch_size=10000):
+    """ Insert count synthetic tasks. """
+    rng = random.Random(0)
+
+    def tasks():
+        for i in range(count):
+            yield dict(summary=f"task {i}", description="synthetic task " * rng.randint(1, 10),
+                       duedate=f"20{rng.randint(15, 30)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                       status_id=rng.choice("OC"))
+
+    db.task.insert_many(tasks(), batch_size)
+    db.release()
+
+
+def start_server(dbname, tasks):
+    """ Start server.app on a free port, return its base URL. """
+    if dbname != ":memory:" and os.path.exists(dbname):
+        os.remove(dbname)
+    server.open_database(dbname, "todo.sql")
+    seed(tasks)
+    httpd = make_server("127.0.0.1", 0, server.app, server_class=server.ThreadingWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{httpd.server_port}"
+
+
+def client(url, mix, count, max_id, results, rng):
+    """ Send count requests, record (route, seconds, ok) in results. """
+    session = requests.Session()
+    routes, weights = zip(*mix.items())
+    for _ in range(count):
+        route = rng.choices(routes, weights)[0]
+        task_id = rng.randint(1, max_id)
+        start = time.perf_counter()
+        try:
+            if route == "get":
+                response = session.get(f"{url}/task/{task_id}")
+            elif route == "page":
+                response = session.get(f"{url}/task", params=dict(limit=50, sort=rng.choice(("id", "-duedate")),
+                                                                  status_id=rng.choice("OC")))
+            elif route == "put":
+                response = session.put(f"{url}/task/{task_id}", json=dict(summary=f"updated {task_id}"))
+            else:
+                response = session.post(f"{url}/task", json=dict(summary="new task"))
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        results.append((route, time.perf_counter() - start, ok))
+
+
+def percentile(values, p):
+    """ Nearest-rank percentile of a sorted list. """
+    return values[max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))]
+
+
+def report(results, elapsed):
+    """ Summarize the results per route. """
+    summary = {}
+    for route in ROUTES:
+        latencies = sorted(seconds for name, seconds, _ in results if name == route)
+        if latencies:
+            summary[route] = dict(requests=len(latencies),
+                                  errors=sum(1 for name, _, ok in results if name == route and not ok),
+                                  throughput=round(len(latencies) / elapsed, 1),
+                                  p50=round(percentile(latencies, 50) * 1000, 3),
+                                  p95=round(percentile(latencies, 95) * 1000, 3),
+                                  p99=round(percentile(latencies, 99) * 1000, 3))
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """ Print the difference with the baseline, return False if any route regressed more than tolerance %. """
+    passed = True
+    for route, current in summary.items():
+        if route not in baseline:
+            continue
+        throughput = (current["throughput"] / baseline[route]["throughput"] - 1) * 100
+        p95 = (current["p95"] / baseline[route]["p95"] - 1) * 100
+        regressed = throughput < -tolerance or p95 > tolerance
+        passed &= not regressed
+        print(f"{route:6} throughput {throughput:+7.1f}%  p95 {p95:+7.1f}%  {'REGRESSION' if regressed else 'ok'}")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=":memory:", help="database file, default :memory: (file is recreated)")
+    parser.add_argument("--tasks", type=int, default=10000, help="number of synthetic tasks to seed")
+    parser.add_argument("--clients", type=int, default=4, help="number of concurrent client threads")
+    parser.add_argument("--requests", type=int, default=4000, help="total number of requests")
+    parser.add_argument("--mix", default=",".join(f"{route}={weight}" for route, weight in ROUTES.items()),
+                        help="workload mix as route=weight pairs, routes: " + ", ".join(ROUTES))
+    parser.add_argument("--url", help="test a running server at this URL instead of starting one")
+    parser.add_argument("--save", metavar="FILE", help="save the results as baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    mix = {route: int(weight) for route, weight in (pair.split("=") for pair in args.mix.split(","))}
+    if not set(mix) <= set(ROUTES):
+        parser.error(f"unknown route in --mix, use {', '.join(ROUTES)}")
+
+    logging.disable(logging.WARNING)
+
+    url = args.url
+    if url is None:
+        print(f"seeding {args.tasks} tasks in {args.db}")
+        url = start_server(args.db, args.tasks)
+
+    results = []  # list.append is thread-safe
+    threads = [threading.Thread(target=client, args=(url, mix, args.requests // args.clients, args.tasks, results,
+                                                     random.Random(i)))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = report(results, elapsed)
+    print(f"{len(results)} requests in {elapsed:.1f} s by {args.clients} clients ({len(results) / elapsed:.1f}/s)")
+    print(f"{'route':6} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, row in summary.items():
+        print(f"{route:6} {row['requests']:8} {row['errors']:6} {row['throughput']:8} "
+              f"{row['p50']:8} {row['p95']:8} {row['p99']:8}")
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(summary, file, indent=4)
+
+    if args.compare:
+        with open(args.compare) as file:
+            if not compare(summary, json.load(file), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
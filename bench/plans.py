@@ -0,0 +1,114 @@
+""" Check the query plans of the statements issued by db.task for full table scans.
+
+Seeds an in-memory database with synthetic tasks, calls the functions of db.task with every
+sort order and combination of filters, and records the statements actually executed. Each
+statement is then run through EXPLAIN QUERY PLAN. Statements which read a complete table of
+at least --min-rows rows without an index are reported, and make the check fail (exit code 1).
+
+Reading the collection in id order is a scan of the table in primary key order by definition,
+which stops at the LIMIT of a page. With only a filter on status, which matches about half of
+the tasks, SQLite rightly prefers that scan over an index plus sorting. These scans are
+expected and not reported, see EXPECTED.
+
+The same check runs as part of the tests (test_db.TestQueryPlans).
+
+Usage:
+    > python -m bench.plans [--tasks 10000] [--min-rows 1000] [--verbose]
+"""
+import argparse
+import re
+import sys
+
+import db
+from bench.load import seed
+
+# Scans of table task in primary key order, possibly filtered on status and stopping at a LIMIT
+EXPECTED = re.compile(r"FROM task( WHERE status_id = '\w+')?( ORDER BY task\.id( DESC)?)?( LIMIT \d+)?;")
+
+
+def workload():
+    """ Call every kind of read and write in db.task. """
+    db.task.select()
+    db.task.select(1)
+    db.task.select(raw=True)
+    db.task.select(1, raw=True)
+    db.task.revision()
+
+    for sort in db.task.SORT_KEYS:
+        for order in (sort, f"-{sort}"):
+            for status_id in (None, "O"):
+                for duedate_from, duedate_to in ((None, None), ("2020-01-01", "2020-12-31")):
+                    filters = dict(status_id=status_id, duedate_from=duedate_from, duedate_to=duedate_to, sort=order)
+                    tasks, after = db.task.select_page(limit=50, raw=True, **filters)
+                    if after is not None:
+                        db.task.select_page(limit=50, after=after, raw=True, **filters)
+                    list(db.task.iterate(raw=True, **filters))
+                    db.task.count(status_id, duedate_from, duedate_to)
+
+    results, after = db.task.search("synthetic", limit=10)
+    if after is not None:
+        db.task.search("synthetic", limit=10, after=after)
+
+    db.task.changes(db.task.last_change() - 10)
+    db.task.compact_changes()
+
+    task_id = db.task.insert("summary", "description", "2020-01-01", "O")
+    db.task.update(task_id, summary="changed")
+    db.task.update(task_id, status_id="C", version=2)
+    db.task.delete(task_id, version=3)
+    db.task.delete(task_id)
+
+    task_id = db.task.insert("summary", "description", "2020-01-01", "O")
+    db.task.update(task_id, summary="changed", returning=True)
+    db.task.update(task_id, status_id="C", version=2, returning=True)
+    db.task.delete(task_id, version=3, returning=True)
+    db.task.delete(task_id, returning=True)
+
+
+def unexpected_scans(statements, min_rows=1000):
+    """ Return the statements whose query plan reads a large table without an index, apart from EXPECTED.
+
+    :param list statements: SQL statements as recorded by db.record_statements()
+    :param int min_rows: tables with fewer rows may be scanned
+    :return list: (statement, steps which scan a table) for every unique statement with an unexpected full scan
+    """
+    found = []
+    for sql in dict.fromkeys(statements):  # unique, in order of execution
+        if sql.startswith(("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")):
+            continue
+        scans = db.full_scans(sql, min_rows=min_rows)
+        if scans and not EXPECTED.search(sql):
+            found.append((sql, scans))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10000, help="number of synthetic tasks to seed")
+    parser.add_argument("--min-rows", type=int, default=1000, help="tables with fewer rows may be scanned")
+    parser.add_argument("--verbose", action="store_true", help="show the plan of every statement")
+    args = parser.parse_args()
+
+    db.connect(":memory:")
+    with open("todo.sql") as file:
+        db.executescript(file.read())
+    seed(args.tasks)
+    db.execute("ANALYZE;")
+
+    with db.record_statements() as statements:
+        workload()
+
+    failed = unexpected_scans(statements, args.min_rows)
+    for sql, scans in failed:
+        print(f"FULL SCAN: {', '.join(scans)}\n    {' '.join(sql.split())}")
+    if args.verbose:
+        for sql in dict.fromkeys(statements):
+            print(f"{'; '.join(db.explain(sql))}\n    {' '.join(sql.split())}")
+
+    print(f"{len(set(statements))} statements checked, {len(failed)} with a full scan")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+""" Benchmark for the cost of serializing task collections to JSend responses.
+
+Reads tasks from an in-memory database (so the rows contain the same date and datetime
+objects as in the web service) and reports the time to build a success response per
+10k tasks for every available jsend encoder. For comparison 'legacy' is the previous
+implementation: json.dumps() of the complete envelope with a default hook, encoded to
+UTF-8 afterwards.
+
+Next the time to read and serialize the tasks is reported for typed rows (dates converted
+to Python objects and back to text) and raw rows (dates read as text), see db.task.RAW_COLUMNS.
+
+Finally the time and peak memory to build a response for the complete collection in raw
+mode are compared for sqlite3.Row objects converted to dicts, db.task.Task records and
+the columnar format (format=columns in the web service).
+
+Usage:
+    > python -m bench.serialize [--tasks 10000] [--repeat 20]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import db
+import jsend
+from bench.load import seed
+
+
+def legacy(data):
+    return json.dumps({"status": jsend.SUCCESS, "data": data}, default=jsend.json_serialize).encode("utf-8")
+
+
+def listing(form):
+    """ Build the response for all tasks with the rows in form dict, Task or columns. """
+    if form == "dict":
+        return jsend.success([dict(row) for row in db.execute(f"SELECT {db.task.RAW_COLUMNS} FROM task;")])
+    return jsend.success(db.task.select_page(raw=True, columnar=form == "columns")[0])
+
+
+def peak_memory(function, data):
+    """ Return the peak memory allocated while calling function(data) in bytes. """
+    tracemalloc.start()
+    function(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def timed(function, data, repeat):
+    """ Return the best time of repeat calls of function(data) in milliseconds. """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(data)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=10000, help="number of tasks per response")
+    parser.add_argument("--repeat", type=int, default=20, help="number of runs, the best is reported")
+    args = parser.parse_args()
+
+    db.connect(":memory:")
+    with open("todo.sql") as file:
+        db.executescript(file.read())
+    db.task.delete()
+    seed(args.tasks)
+
+    tasks = [dict(task) for task in db.task.select()]
+    scale = 10000 / len(tasks)
+
+    print(f"{'encoder':8} {'ms/10k tasks':>12} {'bytes':>10}")
+    print(f"{'legacy':8} {timed(legacy, tasks, args.repeat) * scale:12.2f} {len(legacy(tasks)):10}")
+    default = jsend.encoder()
+    for name in jsend.ENCODERS:
+        jsend.use(name)
+        print(f"{name:8} {timed(jsend.success, tasks, args.repeat) * scale:12.2f} {len(jsend.success(tasks)):10}")
+    jsend.use(default)
+
+    print(f"\n{'rows':8} {'ms/10k tasks':>12}  (read and serialize using {default})")
+    for name, raw in (("typed", False), ("raw", True)):
+        milliseconds = timed(lambda _: jsend.success(db.task.select(raw=raw)), None, args.repeat)
+        print(f"{name:8} {milliseconds * scale:12.2f}")
+
+    print(f"\n{'rows':8} {'ms/10k tasks':>12} {'peak MB':>10}  (complete collection using {default})")
+    for form in ("dict", "Task", "columns"):
+        print(f"{form:8} {timed(listing, form, args.repeat) * scale:12.2f} {peak_memory(listing, form) / 1e6:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+""" Micro-benchmark for the per-call overhead of single task writes via db.task.
+
+Runs insert(), update() and delete() against an in-memory database and reports the
+average time per call. The updates cycle through different combinations of fields,
+which is where building the SQL text per call used to cost the most.
+
+With --db the writes go to a database file, where the cost of committing dominates.
+Use --threads to write from several threads and --group-commit to let these threads
+share commits (see db.sqlite.start_group_commit); the time per call then is the wall
+clock time divided by the total number of calls.
+
+Usage:
+    > python -m bench.write [--count 20000] [--cached-statements 256]
+    > python -m bench.write --db bench.db --count 2000 --threads 8 --group-commit --synchronous FULL
+"""
+import argparse
+import os
+import threading
+import time
+
+import db
+
+UPDATES = (  # field combinations for update(), in the order summary, description, duedate, status_id
+    ("summary", None, None, None),
+    (None, "description", None, None),
+    (None, None, "2020-01-01", None),
+    (None, None, None, "C"),
+    ("summary", "description", None, None),
+    ("summary", "description", "2020-01-01", "O"),
+)
+
+
+def timed(function, arguments, threads=1):
+    """ Call function for every tuple in arguments, return the average time per call in microseconds. """
+
+    def run(part):
+        for argument in part:
+            function(*argument)
+
+    def worker(part):
+        run(part)
+        db.release()
+
+    start = time.perf_counter()
+    if threads == 1:  # in this thread, which holds the only connection to an in-memory database
+        run(arguments)
+    else:
+        workers = [threading.Thread(target=worker, args=(arguments[i::threads],)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    return (time.perf_counter() - start) / len(arguments) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20000, help="number of calls per operation")
+    parser.add_argument("--cached-statements", type=int, default=None,
+                        help="size of the sqlite3 statement cache (default: db.sqlite default)")
+    parser.add_argument("--db", default=":memory:", help="database file, default :memory: (file is recreated)")
+    parser.add_argument("--threads", type=int, default=1, help="number of writing threads (needs --db)")
+    parser.add_argument("--group-commit", action="store_true", help="enable group commit (needs --db)")
+    parser.add_argument("--synchronous", default="NORMAL", choices=db.SYNCHRONOUS,
+                        help="PRAGMA synchronous for group commit")
+    args = parser.parse_args()
+
+    if args.db == ":memory:" and (args.threads > 1 or args.group_commit):
+        parser.error("--threads and --group-commit need a database file, use --db")
+
+    if args.db != ":memory:" and os.path.exists(args.db):
+        os.remove(args.db)
+
+    if args.cached_statements is None:
+        db.create(args.db, pool_size=args.threads + 1)
+    else:
+        db.create(args.db, pool_size=args.threads + 1, cached_statements=args.cached_statements)
+
+    with open("todo.sql") as file:
+        db.executescript(file.read())
+
+    if args.group_commit:
+        db.start_group_commit(synchronous=args.synchronous)
+
+    inserts = [(f"task {i}", "description" if i % 2 else None, None, "C" if i % 3 else None)
+               for i in range(args.count)]
+    print(f"insert  {timed(db.task.insert, inserts, args.threads):8.1f} us/call")
+
+    ids = [row["id"] for row in db.task.select()]
+    updates = [(ids[i % len(ids)], *UPDATES[i % len(UPDATES)]) for i in range(args.count)]
+    print(f"update  {timed(db.task.update, updates, args.threads):8.1f} us/call")
+
+    deletes = [(task_id,) for task_id in ids[:args.count]]
+    print(f"delete  {timed(db.task.delete, deletes, args.threads):8.1f} us/call")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+""" In-process LRU cache with a bound on the number of entries and on the total size.
+
+Usage:
+
+    responses = cache.LRUCache(max_entries=1000, max_bytes=1024 * 1024)
+
+    generation = responses.generation
+    body = responses.get(key)
+    if body is None:
+        body = expensive_function(key)
+        responses.put(key, body, generation=generation)
+
+Passing the generation which was current before the value was computed prevents
+storing a stale value when the cache was invalidated in the meantime.
+
+With a ttl an entry also expires that many seconds after it was stored, for values
+which can change without the cache being told, like responses of another service.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """ Least recently used cache, safe for use by multiple threads. """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024, ttl: float = None):
+        """
+        :param int max_entries: maximum number of entries in the cache
+        :param int max_bytes: maximum total size of the cached values
+        :param float ttl: seconds after which an entry expires, None to keep entries until evicted
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = 0  # incremented on every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key: (value, size, expiry time or None), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Return the value for key, or None if key is not in the cache. """
+        with self._lock:
+            try:
+                value, size, expires = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, size: int = None, generation: int = None) -> None:
+        """ Store value under key, evicting the least recently used entries when full.
+
+        :param key: hashable key
+        :param value: value to store, must not be None
+        :param int size: size of value in bytes, defaults to len(value)
+        :param int generation: generation before value was computed, value is not stored if
+                               the cache was invalidated since then
+        """
+        if size is None:
+            size = len(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size, None if self.ttl is None else time.monotonic() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, key) -> None:
+        """ Remove key from the cache. """
+        with self._lock:
+            self.generation += 1
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self) -> None:
+        """ Remove all entries from the cache. """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """ Return the hit, miss and eviction counters and the current number of entries and bytes. """
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        entries=len(self._entries), bytes=self._bytes)
@@ -1,84 +1,215 @@
-""" UI server to maintain a todo list.
-
-Usage:
-    Start client app via the terminal: > start python client.py
-    Then browse to localhost:8080 to open the UI.
-"""
-from datetime import datetime
-
-from bottle import Bottle, redirect, request, template
-
-import api.task
-import jsend
-
-app = Bottle()
-
-
-@app.get("/")
-@app.get("/app")
-@app.get("/app/list")
-def task_list():
-    result = api.task.select()
-    if result["status"] == jsend.SUCCESS:
-        return template("list", tasks=result["data"])
-    else:
-        return template("error", result=result)
-
-
-@app.route("/app/new", method=["GET", "POST"])
-def task_new():
-    if request.method == "GET":
-        return template("new")
-    else:  # POST
-        summary = request.forms.summary
-        description = request.forms.description
-        duedate = datetime.strptime(request.forms.duedate, "%Y-%m-%d").date()
-        result = api.task.insert(summary, description, duedate, "O")
-        if result["status"] == jsend.SUCCESS:
-            redirect("/app/list")
-        else:
-            return template("error", result=result)
-
-
-@app.route("/app/edit/<task_id:int>", method=["GET", "POST"])
-def task_edit(task_id):
-    if request.method == "GET":
-        result = api.task.select(task_id)
-        if result["status"] == jsend.SUCCESS:
-            return template("edit", id=task_id, task=result["data"])
-        else:
-            return template("error", result=result)
-    else:  # POST
-        summary = request.forms.summary
-        description = request.forms.description
-        duedate = datetime.strptime(request.forms.duedate, "%Y-%m-%d").date()
-        status = request.forms.status
-        result = api.task.update(task_id, summary, description, duedate, "O" if status == "open" else "C")
-        if result["status"] == jsend.SUCCESS:
-            redirect("/app/list")
-        else:
-            return template("error", result=result)
-
-
-@app.route("/app/delete/<task_id:int>", method=["GET", "POST"])
-def task_delete(task_id):
-    if request.method == "GET":
-        result = api.task.select(task_id)
-        if result["status"] == jsend.SUCCESS:
-            return template("delete", id=task_id, task=result["data"])
-        else:
-            return template("error", result=result)
-    else:  # POST
-        answer = request.forms.answer
-        if answer == "yes":
-            result = api.task.delete(task_id)
-            if result["status"] == jsend.SUCCESS:
-                redirect("/app/list")
-            else:
-                return template("error", result=result)
-        else:
-            redirect("/app/list")
-
-
-if __name__ == "__main__":
-    app.run(host="localhost", port=8080, debug=True, reloader=True)
+""" UI server to maintain a todo list.
+
+The task list is paged, sorted and searched by the web service: bootgrid (see views/list.tpl)
+runs in AJAX mode and requests only the page it shows from /app/tasks. Responses of the web
+service are reused for RESPONSE_TTL seconds, and dropped as soon as a task is added, edited
+or deleted via this UI. Changes made by other clients show within RESPONSE_TTL seconds.
+
+Usage:
+    Start client app via the terminal: > start python client.py
+    Then browse to localhost:8080 to open the UI.
+"""
+import html
+from datetime import datetime
+
+from bottle import TEMPLATE_PATH, Bottle, SimpleTemplate, redirect, request, response
+
+import api.task
+import cache
+import jsend
+
+RESPONSE_TTL = 5  # seconds a response of the web service is reused
+ROW_COUNTS = (10, 25, 50, 100)  # page sizes offered by the task list
+SORTABLE = ("id", "duedate")  # columns of the task list the web service can sort on
+SKIP_LIMIT = 1000  # maximum number of tasks fetched per call when skipping to a page, at most server.MAX_LIMIT
+
+app = Bottle()
+
+# Responses of the web service and the cursors of task list pages. Every entry counts as one byte,
+# so the size of the cache is bounded by the number of entries.
+responses = cache.LRUCache(max_entries=1000, ttl=RESPONSE_TTL)
+
+# Every template is compiled only once, also when running in debug mode in which bottle.template()
+# compiles the template on every call.
+VIEWS = {name: SimpleTemplate(name=name, lookup=TEMPLATE_PATH) for name in ("list", "new", "edit", "delete", "error")}
+
+
+def view(name, **kwargs):
+    return VIEWS[name].render(**kwargs)
+
+
+def cached(key, call, *args, **kwargs):
+    """ Return the response of a call to the web service from the cache, or call and cache a successful response. """
+    generation = responses.generation
+    result = responses.get(key)
+    if result is None:
+        result = call(*args, **kwargs)
+        if result["status"] == jsend.SUCCESS:
+            responses.put(key, result, size=1, generation=generation)
+    return result
+
+
+def search_query(phrase):
+    """ Turn the words typed in the search box into an FTS5 query.
+
+    The query matches the tasks which contain words starting with every one of the typed words.
+    """
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in phrase.split())
+
+
+def fetch(limit, after, sort, phrase):
+    """ Fetch limit tasks after cursor after, in sort order or the tasks matching the search phrase. """
+    if phrase:
+        return cached(("search", phrase, limit, after), api.task.search, search_query(phrase), limit, after)
+    return cached(("page", sort, limit, after), api.task.select_page, limit, after, total=True, sort=sort)
+
+
+def task_page(page, row_count, sort="id", phrase=""):
+    """ Fetch a page of the task list, the first page is 1.
+
+    The web service pages via a cursor (the position after the last task of the previous page)
+    instead of a page number. The cursor of every page fetched is cached, so moving to the next
+    or previous page costs a single call. To reach another page the tasks in between are skipped
+    in calls of up to SKIP_LIMIT tasks, starting at the nearest page before it with a known cursor.
+
+    :return dict: JSend response with in data the 'tasks' on the page, the cursor of the 'next' page
+                  and, unless searching, the 'total' number of tasks
+    """
+    key = ("cursors", sort, phrase, row_count)
+    cursors = responses.get(key)  # page number: cursor
+    if cursors is None:
+        cursors = {}
+        responses.put(key, cursors, size=1)
+
+    start = max((known for known in cursors if known <= page), default=1)
+    after = cursors.get(start)
+
+    while start < page:
+        pages = min(page - start, max(SKIP_LIMIT // row_count, 1))
+        result = fetch(pages * row_count, after, sort, phrase)
+        if result["status"] != jsend.SUCCESS:
+            return result
+        after = result["data"]["next"]
+        if after is None:  # the list is shorter than the page number implies
+            return dict(result, data=dict(result["data"], tasks=[]))
+        start += pages
+        cursors[start] = after
+
+    result = fetch(row_count, after, sort, phrase)
+    if result["status"] == jsend.SUCCESS and result["data"]["next"] is not None:
+        cursors[page + 1] = result["data"]["next"]
+    return result
+
+
+@app.get("/")
+@app.get("/app")
+@app.get("/app/list")
+def task_list():
+    return view("list", row_counts=ROW_COUNTS)
+
+
+@app.post("/app/tasks")
+def task_rows():
+    """ Return a page of the task list in the format of bootgrid in AJAX mode.
+
+    form fields, as sent by bootgrid:
+        current - page number, the first page is 1
+        rowCount - number of tasks per page, one of ROW_COUNTS
+        sort[<column>] - asc or desc, for a column in SORTABLE
+        searchPhrase - only tasks containing words starting with these words, best match first
+
+    When searching the web service does not count the matches, total then includes one task more
+    than fetched so far if there are more matches.
+    """
+    response.headers["Content-Type"] = "application/json"
+    try:
+        current = int(request.forms.get("current", 1))
+        row_count = int(request.forms.get("rowCount", ROW_COUNTS[0]))
+    except ValueError:
+        current = row_count = None
+    if current is None or current < 1 or row_count not in ROW_COUNTS:
+        response.status = 400
+        return jsend.fail(data="invalid current or rowCount")
+
+    sort = "id"
+    for column in SORTABLE:
+        direction = request.forms.get(f"sort[{column}]")
+        if direction is not None:
+            sort = f"-{column}" if direction == "desc" else column
+    phrase = request.forms.getunicode("searchPhrase", "").strip()
+
+    result = task_page(current, row_count, sort, phrase)
+    if result["status"] != jsend.SUCCESS:
+        response.status = 502
+        return jsend.dumps(result)
+
+    tasks = result["data"]["tasks"]
+    total = result["data"].get("total")
+    if total is None:
+        total = (current - 1) * row_count + len(tasks) + (result["data"]["next"] is not None)
+    # bootgrid shows the values as HTML
+    rows = [dict(id=task["id"], summary=html.escape(task["summary"]), duedate=task["duedate"], status=task["status_id"])
+            for task in tasks]
+    return jsend.dumps(dict(current=current, rowCount=row_count, rows=rows, total=total))
+
+
+@app.route("/app/new", method=["GET", "POST"])
+def task_new():
+    if request.method == "GET":
+        return view("new")
+    else:  # POST
+        summary = request.forms.summary
+        description = request.forms.description
+        duedate = datetime.strptime(request.forms.duedate, "%Y-%m-%d").date()
+        result = api.task.insert(summary, description, duedate, "O")
+        if result["status"] == jsend.SUCCESS:
+            responses.clear()
+            redirect("/app/list")
+        else:
+            return view("error", result=result)
+
+
+@app.route("/app/edit/<task_id:int>", method=["GET", "POST"])
+def task_edit(task_id):
+    if request.method == "GET":
+        result = cached(("task", task_id), api.task.select, task_id)
+        if result["status"] == jsend.SUCCESS:
+            return view("edit", id=task_id, task=result["data"])
+        else:
+            return view("error", result=result)
+    else:  # POST
+        summary = request.forms.summary
+        description = request.forms.description
+        duedate = datetime.strptime(request.forms.duedate, "%Y-%m-%d").date()
+        status = request.forms.status
+        result = api.task.update(task_id, summary, description, duedate, "O" if status == "open" else "C")
+        if result["status"] == jsend.SUCCESS:
+            responses.clear()
+            redirect("/app/list")
+        else:
+            return view("error", result=result)
+
+
+@app.route("/app/delete/<task_id:int>", method=["GET", "POST"])
+def task_delete(task_id):
+    if request.method == "GET":
+        result = cached(("task", task_id), api.task.select, task_id)
+        if result["status"] == jsend.SUCCESS:
+            return view("delete", id=task_id, task=result["data"])
+        else:
+            return view("error", result=result)
+    else:  # POST
+        answer = request.forms.answer
+        if answer == "yes":
+            result = api.task.delete(task_id)
+            if result["status"] == jsend.SUCCESS:
+                responses.clear()
+                redirect("/app/list")
+            else:
+                return view("error", result=result)
+        else:
+            redirect("/app/list")
+
+
+if __name__ == "__main__":
+    app.run(host="localhost", port=8080, debug=True, reloader=True)
@@ -1,3 +1,4 @@
-import db.task as task
-
-from db.sqlite import *
+from db.sqlite import *
+
+import db.schema as schema
+import db.task as task
@@ -0,0 +1,86 @@
+""" Version of the database schema and the migrations between versions
+
+The schema version is stored in the database file itself (PRAGMA user_version), so opening
+a database with a current schema costs a single PRAGMA: no DDL is executed. A new database
+is initialized by the DDL script (todo.sql), which sets the version as its last statement.
+
+A database which was created before the schema was versioned has version 0. Migrations are
+applied one version at a time, and the version is only updated after a migration completed,
+so an interrupted migration is simply repeated on the next start.
+"""
+
+import logging
+
+import db
+
+logger = logging.getLogger(__name__)
+
+VERSION = 2  # version of the schema created by todo.sql
+
+
+class ErrorSchemaTooNew(Exception):
+    """ The database was created by a newer version of this software. """
+
+    def __init__(self, found):
+        super().__init__(f"database schema version {found} is newer than the supported version {VERSION}")
+        self.found = found
+
+
+def version():
+    """ Return the schema version of the connected database, 0 if unversioned. """
+    return db.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def is_empty():
+    """ Return True if the connected database contains no tables, indices, views or triggers. """
+    return db.execute("SELECT count(*) FROM sqlite_master;").fetchone()[0] == 0
+
+
+def initialize(script):
+    """ Create the schema and the initial content of an empty database.
+
+    :param str script: filename of the DDL script, which sets PRAGMA user_version
+    """
+    with open(script) as file:
+        db.executescript(file.read())
+
+
+def _migrate_to_1():
+    """ Add task versions, the full-text search index, change log and indexes to an unversioned database.
+
+    The change log triggers use the version column, so it is added first.
+    """
+    db.task.create_versioning()
+    db.task.create_search_index()
+    db.task.create_change_log()
+    db.task.create_indexes()
+
+
+def _migrate_to_2():
+    """ Let an update which sets modified itself, like an import, keep the version and modified it specifies. """
+    db.task.create_versioning()  # recreates the triggers
+    db.task.create_change_log()
+
+
+MIGRATIONS = {  # version: function which upgrades the schema from the previous version
+    1: _migrate_to_1,
+    2: _migrate_to_2,
+}
+
+
+def upgrade():
+    """ Apply the migrations needed to bring the schema of the connected database to VERSION.
+
+    :return int: the schema version found before upgrading
+    :raises: ErrorSchemaTooNew - the schema version is newer than VERSION
+    """
+    found = version()
+    if found > VERSION:
+        raise ErrorSchemaTooNew(found)
+
+    for target in range(found + 1, VERSION + 1):
+        logger.info("migrating database schema from version %d to %d", target - 1, target)
+        MIGRATIONS[target]()
+        db.execute(f"PRAGMA user_version = {target};")
+
+    return found
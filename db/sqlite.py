@@ -1,318 +1,1028 @@
-import collections
-import datetime
-import logging
-import sqlite3
-
-import db
-
-logger = logging.getLogger(__name__)
-
-""" This module can only handle a connection to one database at a time. 
-    The connection object for the currently connected database is stored 
-    internally in variable _connection. """
-
-_connection: sqlite3.Connection = None
-
-logger.debug(f"SQLite driver version: {sqlite3.version}")
-logger.debug(f"SQLite version: {sqlite3.sqlite_version}")
-logger.debug(f"parameter style: {sqlite3.paramstyle}")
-
-
-def adapt_datetime(dt_obj: datetime.datetime) -> str:
-    """ Convert datetime object to datetime string in ISO 8601 format.
-
-    :param datetime.datetime dt_obj: Python datetime object
-    :return str: datetime value as a string in ISO 8601 format: 2017-06-24 12:00:00
-    """
-    return dt_obj.isoformat(sep=" ", timespec="seconds")
-
-
-def convert_datetime(dt_str: bytes) -> datetime.datetime:
-    """ Convert datetime string in ISO 8601 format to datetime object.
-
-    :param bytes dt_str: datetime value as a string in ISO 8601 format: 2017-06-24 12:00:00
-    :return datetime.datetime: Python datetime object
-    """
-    return datetime.datetime.strptime(dt_str.decode("utf-8"), "%Y-%m-%d %H:%M:%S")
-
-
-def adapt_time(tm_obj: datetime.time) -> str:
-    """ Convert time object to time string in HH:MM format (note: no seconds).
-
-    :param datetime.datetime.time tm_obj: Python time object
-    :return str: time value as a string in HH:MM format: 12:00
-    """
-    return tm_obj.isoformat(timespec="minutes")
-
-
-def convert_time(tm_str: bytes) -> datetime.time:
-    """ Convert time string in HH:MM format to time object (seconds will default to 00).
-
-    :param bytes tm_str: datetime value as a string in HH:MM format: 12:00
-    :return datetime.datetime.time: Python time object
-    """
-    return datetime.datetime.strptime(tm_str.decode("utf-8"), "%H:%M").time()
-
-
-# For column with type DATETIME when writing to a database convert datetime objects to datetime strings
-sqlite3.register_adapter(datetime.datetime, adapt_datetime)
-
-# For column with type DATETIME when reading from a database convert datetime strings to datetime objects
-sqlite3.register_converter("DATETIME", convert_datetime)
-
-# For column with type TIME when writing to a database convert time objects to time strings
-sqlite3.register_adapter(datetime.time, adapt_time)
-
-# For column with type TIME when reading from a database convert time strings to time objects
-sqlite3.register_converter("TIME", convert_time)
-
-# For column with type BOOLEAN when writing to a database convert booleans to integers
-sqlite3.register_adapter(bool, int)
-
-# For column with type BOOLEAN when reading from a database convert integers to booleans
-sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
-
-
-class ErrorAlreadyConnected(sqlite3.DatabaseError):
-    pass
-
-
-class ErrorNotConnected(sqlite3.DatabaseError):
-    def __init__(self, *args):
-        super().__init__(args)
-
-    def __str__(self):
-        return "not connected to a database"
-
-
-def connection() -> sqlite3.Connection:
-    return _connection
-
-
-def create(dbname: str = ":memory:") -> None:
-    """ Create a new database and open a connection to it.
-
-    :param str dbname: database filename, if not specified create an in-memory database
-    :return: None
-    :raises: FileExistsError - file with name dbname already exists
-    """
-    global _connection
-
-    if dbname != ":memory:":
-        try:
-            with open(dbname, "r+"):
-                pass
-            raise FileExistsError
-        except FileNotFoundError:
-            _connection = sqlite3.connect(dbname)  # this call creates the database
-            db.close()
-
-    db.connect(dbname)
-
-
-def connect(dbname: str = ":memory:") -> None:
-    """ Open a connection to an existing SQLite database or a new in-memory database.
-
-    :param str dbname: database filename
-    :return: None
-    :raises: FileNotFoundError - file dbname not found
-    :raises: PermissionError - no read and/or write access to file dbname
-    :raises: sqlite3.DatabaseError - dbname is not a valid SQLite database
-    :raises: ErrorAlreadyConnected - already connected to a database
-    """
-    global _connection
-
-    if _connection is not None:
-        raise ErrorAlreadyConnected(f"already connected to database {name()}")
-
-    if dbname != ":memory:":
-        # check if file dbname exists and is not read-only
-        with open(dbname, mode="r+"):
-            pass
-    try:
-        _connection = sqlite3.connect(dbname, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-        _connection.row_factory = sqlite3.Row  # best use sqlite3.Row, alternatively use namedtuple_factory (6 X slower)
-        _connection.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        _connection.execute("PRAGMA foreign_keys = ON;")
-        _connection.execute("PRAGMA journal_mode = WAL;")  # WAL (faster) or DELETE (slower)
-    except sqlite3.Error as e:
-        logger.error(f"{__name__}.connect({dbname}): {type(e).__name__} - {e}")
-        _connection = None
-        raise e
-
-    # for SQL debugging purposes uncomment the next lines
-    if logger.getEffectiveLevel() <= logging.DEBUG:
-        _connection.set_trace_callback(logger.debug)  # write every executed SQL statement to the logger
-
-
-def close() -> None:
-    global _connection
-
-    if _connection is not None:
-        _connection.close()
-    _connection = None
-
-
-def commit() -> None:
-    _connection.commit()
-
-
-def rollback() -> None:
-    _connection.rollback()
-
-
-def execute(sql: str, parameters: tuple = None) -> sqlite3.Cursor:
-    """ Execute a query on the connected database.
-
-    :param str sql: SQL query
-    :param tuple parameters: query parameters (if any)
-    :return sqlite3.Cursor: query results
-    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
-    :raises: sqlite3.ProgrammingError - incorrect number of bindings
-    :raises: sqlite3.OperationalError - SQL syntax error
-    """
-    try:
-        if _connection is None:
-            raise ErrorNotConnected
-
-        return _connection.execute(sql, () if parameters is None else parameters)
-    except sqlite3.Error as e:
-        logger.error(f"{e.__module__}.{type(e).__name__} - {e}")
-        logger.error(f"SQL statement: {sql}")
-        if parameters:
-            logger.error(f"statement parameters: {parameters}")
-        raise e
-
-
-def executemany(sql: str, seq_of_parameters=None) -> sqlite3.Cursor:
-    """ Executes an SQL statement against all parameter sequences or mappings found in sequence seq_of_parameters
-
-    :param str sql: SQL statement
-    :param sequence seq_of_parameters: sequence of parameters
-    :return: sqlite3.Cursor
-    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
-    :raises: sqlite3.ProgrammingError - incorrect number of bindings
-    :raises: sqlite3.OperationalError - SQL syntax error
-    """
-    try:
-        if _connection is None:
-            raise ErrorNotConnected
-
-        return _connection.executemany(sql, () if seq_of_parameters is None else seq_of_parameters)
-    except sqlite3.Error as e:
-        logger.error(f"{e.__module__}.{type(e).__name__} - {e}")
-        logger.error(f"SQL statement: {sql}")
-        raise e
-
-
-def executescript(sql_script: str) -> sqlite3.Cursor:
-    """ Issues a commit and then executes multiple SQL statements.
-
-    :param str sql_script: one or more SQL statements
-    :return: sqlite3.Cursor
-    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
-    :raises: sqlite3.OperationalError - SQL syntax error
-    """
-    try:
-        if _connection is None:
-            raise ErrorNotConnected
-
-        return _connection.executescript(sql_script)
-    except sqlite3.Error as e:
-        logger.error(f"{e.__module__}.{type(e).__name__} - {e}")
-        logger.error(f"SQL script: {sql_script}")
-        raise e
-
-
-def iterate(cursor: sqlite3.Cursor, arraysize: int = 1000) -> sqlite3.Row:
-    """ Fetch query results from cursor in chunks of arraysize records.
-
-    Usage: db.iterate(db.execute("SELECT * FROM table"))
-    """
-    while True:
-        rows = cursor.fetchmany(arraysize)
-        if not rows:
-            break
-        for row in rows:
-            yield row
-
-
-def dump(filename: str = "dump.sql") -> None:
-    """ Dump the structure and content of the database to a file.
-
-    :param: str filename: script where SQL statements from dump will be saved
-
-    Note that iterdump() generates an exception if the rowfactory
-    is a namedtuple_factory, so in this case the database cannot
-    be dumped.
-    """
-    if _connection is None:
-        raise ErrorNotConnected
-
-    if _connection.row_factory is not namedtuple_factory:
-        with open(filename, "w") as file:
-            for line in _connection.iterdump():
-                file.write("{0}\n".format(line))
-    else:
-        logger.warning("Cannot dump database which has namedtuple_factory as row_factory")
-
-
-def load(filename: str = "dump.sql") -> None:
-    """ Load the structure and/or content of a database from a file.
-
-    This function is meant to be used in conjunction with dump().
-
-    :param: str filename: script containing SQL code to create and/or populate tables
-    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
-    :raises: FileNotFoundError - filename not found
-    :raises: PermissionError - no read access to filename
-    """
-    if _connection is None:
-        raise ErrorNotConnected
-
-    setting = _connection.execute("PRAGMA foreign_keys;").fetchone()
-    _connection.execute("PRAGMA foreign_keys = OFF;")
-    with open(filename, "r") as file:
-        _connection.executescript(file.read())
-    _connection.execute("PRAGMA foreign_keys = {};".format(setting['foreign_keys']))
-
-
-def export_table_to_dsv(table: str, delimiter: str = ";") -> None:
-    """ Write contents of a table or view to delimiter separated file 'table.txt'.
-        The decimal separator is always a dot. Using .txt forces Excel to use the
-        import dialog where you can specify the separator to use.
-    """
-    import csv
-
-    if _connection is None:
-        raise ErrorNotConnected
-
-    rows = _connection.execute(f"SELECT * FROM {table}")
-    filename = f"{table}.txt"
-    with open(filename, "w", encoding="windows-1252", newline="") as file:
-        writer = csv.writer(file, dialect="excel", delimiter=delimiter)
-        writer.writerow([i[0] for i in rows.description])  # write headers
-        writer.writerows(rows)  # write data
-
-
-def name():
-    """ Return the name of the connected database. """
-    if _connection is None:
-        raise ErrorNotConnected()
-
-    for dbinfo in _connection.execute("PRAGMA database_list;"):
-        if dbinfo['name'] == "main":
-            return dbinfo['file'] if dbinfo['file'] != "" else ":memory:"
-
-
-def namedtuple_factory(cursor: sqlite3.Cursor, row: sqlite3.Row) -> tuple:
-    """ Tuple based access to a database row.
-
-    Allow access to a field in a row via row.field_name, instead of
-    row['field_name'] when using sqlite3.Row as row factory, or
-    even row[index_of_field] when not using a row factory at all.
-    Performance impact: 6 x slower than when using sqlite3.Row
-    """
-    fields = [col[0] for col in cursor.description]
-    Row = collections.namedtuple("Row", fields)
-    return Row(*row)
+import collections
+import contextlib
+import datetime
+import functools
+import itertools
+import logging
+import os
+import queue
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import db
+
+logger = logging.getLogger(__name__)
+
+""" This module can only handle one database at a time. Connections to the
+    currently connected database are kept in a pool. A thread checks out a
+    connection from the pool on its first database call and keeps using it
+    until it calls release(), so consecutive calls in a thread (like a
+    transaction) use the same connection. Writers are serialized via
+    transaction(), readers run in parallel thanks to WAL journaling.
+    An in-memory database can only be reached via a single connection, so
+    for ":memory:" the pool size is always 1.
+
+    Optionally writes are group committed: write() hands the work to a single
+    writer thread with its own connection, which applies the writes of many
+    threads in one transaction, so they share the cost of a single commit.
+
+    Several processes can use the same database file, each with its own pool.
+    A write transaction starts with BEGIN IMMEDIATE, so a writer waits for the
+    write lock of another process (PRAGMA busy_timeout) before it reads
+    anything, and write() retries a transaction which still found the database
+    locked. Use changed() to find out whether another connection (possibly in
+    another process) changed the database. """
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CACHED_STATEMENTS = 256  # number of compiled statements sqlite3 keeps per connection
+PROGRESS_INTERVAL = 10000  # statements or rows between calls of a progress function in dump() and load()
+BUSY_RETRIES = 3  # number of times write() retries a transaction which failed because the database was locked
+BUSY_BACKOFF = 0.05  # average seconds before the first retry, doubles on every retry
+
+PROFILES = {  # name: PRAGMA settings applied to every connection, see connect()
+    "default": {
+        "page_size": 4096,  # bytes, only effective for a new database
+        "synchronous": "NORMAL",  # in WAL mode a commit does not wait for the disk, the database stays consistent
+        "cache_size": -16384,  # negative means KiB, so 16 MiB page cache per connection
+        "mmap_size": 134217728,  # read up to 128 MiB of the database via memory mapped I/O
+        "temp_store": "MEMORY",  # temporary tables and indices (e.g. for sorting) in memory
+        "busy_timeout": 5000,  # milliseconds to wait for a lock held by another connection
+        "wal_autocheckpoint": 1000,  # pages in the WAL which trigger a checkpoint on commit
+        "journal_size_limit": 67108864,  # truncate the WAL to 64 MiB after a checkpoint
+    },
+}
+PROFILES["durable"] = dict(PROFILES["default"], synchronous="FULL")  # every commit survives a power failure
+PROFILES["small"] = dict(PROFILES["default"], cache_size=-2048, mmap_size=0, temp_store="DEFAULT")
+
+_dbname: str = None  # name of the connected database, None if not connected
+_pool_size: int = DEFAULT_POOL_SIZE
+_cached_statements: int = DEFAULT_CACHED_STATEMENTS
+_connections: list = []  # all open connections in the pool
+_idle: list = []  # connections available for checkout
+_available: threading.BoundedSemaphore = None  # number of connections which can still be checked out
+_generation: int = 0  # incremented on every close() to invalidate connections bound to threads
+_lock = threading.Lock()  # protects the pool administration
+_write_lock = threading.RLock()  # serializes write transactions
+_local = threading.local()  # connection and transaction depth of the current thread
+_observer = None  # function(sql, seconds) called after every statement, see observe()
+_pragmas: dict = PROFILES["default"]  # PRAGMA settings of the connected database
+_data_versions: dict = {}  # connection: PRAGMA data_version at the previous call of changed()
+
+SYNCHRONOUS = ("OFF", "NORMAL", "FULL", "EXTRA")  # durability levels, see PRAGMA synchronous
+
+_commit_queue: queue.Queue = None  # pending writes for the group commit thread, None if group commit is off
+_commit_thread: threading.Thread = None
+
+logger.debug(f"SQLite driver version: {sqlite3.version}")
+logger.debug(f"SQLite version: {sqlite3.sqlite_version}")
+logger.debug(f"parameter style: {sqlite3.paramstyle}")
+
+
+def adapt_datetime(dt_obj: datetime.datetime) -> str:
+    """ Convert datetime object to datetime string in ISO 8601 format.
+
+    :param datetime.datetime dt_obj: Python datetime object
+    :return str: datetime value as a string in ISO 8601 format: 2017-06-24 12:00:00
+    """
+    return dt_obj.isoformat(sep=" ", timespec="seconds")
+
+
+def convert_datetime(dt_str: bytes) -> datetime.datetime:
+    """ Convert datetime string in ISO 8601 format to datetime object.
+
+    :param bytes dt_str: datetime value as a string in ISO 8601 format: 2017-06-24 12:00:00
+    :return datetime.datetime: Python datetime object
+    """
+    return datetime.datetime.strptime(dt_str.decode("utf-8"), "%Y-%m-%d %H:%M:%S")
+
+
+def adapt_time(tm_obj: datetime.time) -> str:
+    """ Convert time object to time string in HH:MM format (note: no seconds).
+
+    :param datetime.datetime.time tm_obj: Python time object
+    :return str: time value as a string in HH:MM format: 12:00
+    """
+    return tm_obj.isoformat(timespec="minutes")
+
+
+def convert_time(tm_str: bytes) -> datetime.time:
+    """ Convert time string in HH:MM format to time object (seconds will default to 00).
+
+    :param bytes tm_str: datetime value as a string in HH:MM format: 12:00
+    :return datetime.datetime.time: Python time object
+    """
+    return datetime.datetime.strptime(tm_str.decode("utf-8"), "%H:%M").time()
+
+
+# For column with type DATETIME when writing to a database convert datetime objects to datetime strings
+sqlite3.register_adapter(datetime.datetime, adapt_datetime)
+
+# For column with type DATETIME when reading from a database convert datetime strings to datetime objects
+sqlite3.register_converter("DATETIME", convert_datetime)
+
+# For column with type TIME when writing to a database convert time objects to time strings
+sqlite3.register_adapter(datetime.time, adapt_time)
+
+# For column with type TIME when reading from a database convert time strings to time objects
+sqlite3.register_converter("TIME", convert_time)
+
+# For column with type BOOLEAN when writing to a database convert booleans to integers
+sqlite3.register_adapter(bool, int)
+
+# For column with type BOOLEAN when reading from a database convert integers to booleans
+sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
+
+
+class ErrorAlreadyConnected(sqlite3.DatabaseError):
+    pass
+
+
+class ErrorNotConnected(sqlite3.DatabaseError):
+    def __init__(self, *args):
+        super().__init__(args)
+
+    def __str__(self):
+        return "not connected to a database"
+
+
+class ErrorPoolExhausted(sqlite3.DatabaseError):
+    pass
+
+
+def _open() -> sqlite3.Connection:
+    """ Open a new connection to the database for the pool. """
+    connection = sqlite3.connect(_dbname, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                                 check_same_thread=False,  # the pool guarantees one thread at a time
+                                 cached_statements=_cached_statements)
+    try:
+        connection.row_factory = sqlite3.Row  # best use sqlite3.Row, alternatively use namedtuple_factory (6 X slower)
+        if "page_size" in _pragmas:  # before switching to WAL, which fixes the page size of a new database
+            connection.execute(f"PRAGMA page_size = {_pragmas['page_size']};")
+        connection.execute("PRAGMA journal_mode = WAL;")  # WAL (faster) or DELETE (slower), fails if not a database
+        connection.execute("PRAGMA foreign_keys = ON;")
+        for pragma, value in _pragmas.items():
+            if pragma != "page_size":
+                connection.execute(f"PRAGMA {pragma} = {value};")
+    except sqlite3.Error:
+        connection.close()
+        raise
+
+    # for SQL debugging purposes uncomment the next lines
+    if logger.getEffectiveLevel() <= logging.DEBUG:
+        connection.set_trace_callback(logger.debug)  # write every executed SQL statement to the logger
+
+    return connection
+
+
+def _healthy(connection: sqlite3.Connection) -> bool:
+    """ Check if a pooled connection is still usable. """
+    try:
+        connection.execute("SELECT 1;").fetchone()
+        return True
+    except sqlite3.Error as e:
+        logger.warning(f"discarding unhealthy connection: {type(e).__name__} - {e}")
+        return False
+
+
+def acquire(timeout: float = None) -> sqlite3.Connection:
+    """ Check out a connection from the pool and bind it to the current thread.
+
+    If the current thread already holds a connection this connection is returned.
+
+    :param float timeout: maximum number of seconds to wait for a free connection, None waits forever
+    :return sqlite3.Connection: connection for exclusive use by the current thread
+    :raises: sqlite.ErrorNotConnected - not connected to a database
+    :raises: sqlite.ErrorPoolExhausted - no connection became available within timeout seconds
+    """
+    if _dbname is None:
+        raise ErrorNotConnected
+
+    if getattr(_local, "generation", None) == _generation:
+        return _local.connection
+
+    if not _available.acquire(timeout=timeout):
+        raise ErrorPoolExhausted(f"no connection available within {timeout} seconds")
+
+    try:
+        connection = None
+        while connection is None:
+            with _lock:
+                connection = _idle.pop() if _idle else None
+            if connection is None:
+                connection = _open()
+                with _lock:
+                    _connections.append(connection)
+            elif not _healthy(connection):
+                _discard(connection)
+                connection = None
+    except BaseException:
+        _available.release()
+        raise
+
+    _local.connection = connection
+    _local.generation = _generation
+    _local.depth = 0
+    return connection
+
+
+def release() -> None:
+    """ Return the connection bound to the current thread to the pool.
+
+    An open transaction is rolled back first. Does nothing if the thread holds no connection.
+    """
+    if getattr(_local, "generation", None) != _generation:
+        return
+
+    connection = _local.connection
+    del _local.connection, _local.generation, _local.depth
+
+    try:
+        if connection.in_transaction:
+            logger.warning("rollback of uncommitted transaction while releasing connection")
+            connection.rollback()
+    except sqlite3.Error:
+        _discard(connection)
+    else:
+        with _lock:
+            _idle.append(connection)
+    _available.release()
+
+
+def _discard(connection: sqlite3.Connection) -> None:
+    with _lock:
+        if connection in _connections:
+            _connections.remove(connection)
+        _data_versions.pop(connection, None)
+    try:
+        connection.close()
+    except sqlite3.Error:
+        pass
+
+
+@contextlib.contextmanager
+def pooled(timeout: float = None):
+    """ Context manager which provides a connection for the duration of a with block.
+
+    Use this in code running outside the request/response cycle, like generators which
+    are consumed after the request handler returned. If the current thread already
+    holds a connection it is used and not released afterwards.
+    """
+    bound = getattr(_local, "generation", None) == _generation
+    connection = acquire(timeout)
+    try:
+        yield connection
+    finally:
+        if not bound:
+            release()
+
+
+@contextlib.contextmanager
+def transaction():
+    """ Context manager for a write transaction.
+
+    Writers in this process are serialized, the transaction is committed when the with
+    block ends normally and rolled back on an exception. Nested transactions are merged
+    into the outermost one.
+
+    The transaction starts with BEGIN IMMEDIATE, which takes the write lock of the
+    database right away (waiting busy_timeout for a writer in another process). So all
+    statements in the with block, also savepoints and DDL, are part of the transaction,
+    and a read in it can never be outdated by a write of another process.
+
+    :raises: sqlite3.OperationalError - database is locked, the write lock was not obtained within busy_timeout
+    """
+    connection = acquire()
+    with _write_lock:
+        if _local.depth > 0:
+            _local.depth += 1
+            try:
+                yield connection
+            finally:
+                _local.depth -= 1
+        else:
+            _local.depth = 1
+            _local.after_commit = []
+            try:
+                with connection:
+                    connection.execute("BEGIN IMMEDIATE;")
+                    yield connection
+                calls, _local.after_commit = _local.after_commit, []
+            finally:
+                _local.depth = 0
+                _local.after_commit = []
+            for function, args in calls:
+                function(*args)
+
+
+def on_commit(function, *args) -> None:
+    """ Call function(*args) once the transaction() of the current thread is committed, or now if there is none.
+
+    Use this for side effects which must not be seen before the data is, like invalidating a
+    cache: a reader which refills the cache before the commit would still read the old data.
+    The call is dropped when the transaction is rolled back.
+    """
+    if getattr(_local, "depth", 0) > 0:
+        _local.after_commit.append((function, args))
+    else:
+        function(*args)
+
+
+def is_busy(error: Exception) -> bool:
+    """ Return True if error is an SQLITE_BUSY or SQLITE_LOCKED error, meaning the database was locked. """
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is None:
+        return "locked" in str(error)
+    return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def retry_busy(function, *args):
+    """ Call function(*args) which runs a transaction(), retry it when the database was locked.
+
+    Retries up to BUSY_RETRIES times after a randomized, exponentially growing wait. Do not
+    use within a transaction, as only the complete transaction can be retried.
+    """
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return function(*args)
+        except sqlite3.OperationalError as e:
+            if not is_busy(e) or attempt == BUSY_RETRIES:
+                raise
+            logger.warning("database locked, retry %d of %d: %s", attempt + 1, BUSY_RETRIES, e)
+        time.sleep(BUSY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def changed() -> bool:
+    """ Return True if another connection changed the database since the previous call on this connection.
+
+    Uses PRAGMA data_version of the connection of the current thread, which does not read the
+    database. The other connection can be in another process, but can also be another connection
+    in the pool of this process. Returns True on the first call for a connection.
+    """
+    connection_ = connection()
+    version = connection_.execute("PRAGMA data_version;").fetchone()[0]
+    with _lock:
+        previous = _data_versions.get(connection_)
+        _data_versions[connection_] = version
+    return previous != version
+
+
+def start_group_commit(interval: float = 0.0, max_batch: int = 100, synchronous: str = "NORMAL") -> None:
+    """ Apply all writes made via write() in a single writer thread which commits them in groups.
+
+    The writer takes all pending writes (at most max_batch), applies each of them within its
+    own savepoint and commits them all at once. Writes arriving while a group is committed
+    form the next group, so groups grow with the load. A positive interval makes the first
+    write of a group wait up to interval seconds for others to join. Every caller receives
+    its own result or exception once its group is committed.
+
+    With synchronous NORMAL a commit in WAL mode does not wait for the disk, so after a power
+    failure the most recent commits may be lost (but the database is never corrupted). FULL
+    also makes every commit durable, which group commit makes affordable.
+
+    The web service enables it with option --group-commit (see server.py). A write made within
+    a transaction() of the calling thread, like a request of a route with transaction=True,
+    joins that transaction instead and is not grouped.
+
+    :param float interval: maximum number of seconds a write waits for others to join its group
+    :param int max_batch: maximum number of writes per transaction
+    :param str synchronous: OFF, NORMAL, FULL or EXTRA, PRAGMA synchronous for the writer connection
+    :raises: sqlite.ErrorNotConnected - not connected to a database
+    :raises: ValueError - in-memory database (the writer needs its own connection) or invalid synchronous
+    """
+    global _commit_queue, _commit_thread
+
+    if _dbname is None:
+        raise ErrorNotConnected
+    if _dbname == ":memory:":
+        raise ValueError("group commit needs a database file, an in-memory database has a single connection")
+    if synchronous.upper() not in SYNCHRONOUS:
+        raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS)}")
+    if _commit_thread is not None:
+        stop_group_commit()
+
+    connection = _open()
+    connection.execute(f"PRAGMA synchronous = {synchronous.upper()};")
+
+    _commit_queue = queue.Queue()
+    _commit_thread = threading.Thread(target=_group_commit, args=(connection, _commit_queue, interval, max_batch),
+                                      name="group-commit", daemon=True)
+    _commit_thread.start()
+    logger.info("group commit started, interval %s s, max batch %d, synchronous %s", interval, max_batch, synchronous)
+
+
+def stop_group_commit() -> None:
+    """ Apply the pending writes and stop the group commit thread. Does nothing if group commit is off. """
+    global _commit_queue, _commit_thread
+
+    if _commit_thread is None:
+        return
+
+    _commit_queue.put(None)
+    _commit_thread.join()
+    _commit_queue = None
+    _commit_thread = None
+
+
+def _group_commit(connection: sqlite3.Connection, pending: queue.Queue, interval: float, max_batch: int) -> None:
+    """ Main loop of the group commit thread. """
+    _local.connection = connection
+    _local.generation = _generation
+    _local.depth = 0
+    try:
+        stopping = False
+        while not stopping:
+            item = pending.get()
+            if item is None:
+                return
+            group = [item]
+            deadline = time.monotonic() + interval
+            while len(group) < max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            _commit_group(group)
+    finally:
+        del _local.connection, _local.generation, _local.depth
+        connection.close()
+
+
+def _apply_group(group: list) -> list:
+    """ Apply a group of (future, function, args) in one transaction, return (succeeded, result) per write. """
+    results = []
+    with transaction() as connection:
+        for future, function, args in group:
+            connection.execute("SAVEPOINT write;")
+            try:
+                results.append((True, function(*args)))
+            except Exception as e:
+                connection.execute("ROLLBACK TO write;")
+                results.append((False, e))
+            connection.execute("RELEASE write;")
+    return results
+
+
+def _commit_group(group: list) -> None:
+    """ Apply a group of (future, function, args) in one transaction and resolve the futures. """
+    group = [item for item in group if item[0].set_running_or_notify_cancel()]
+    try:
+        results = retry_busy(_apply_group, group)
+    except Exception as e:  # the commit failed, so none of the writes were applied
+        logger.error(f"group commit of {len(group)} writes failed: {type(e).__name__} - {e}")
+        for future, _, _ in group:
+            future.set_exception(e)
+        return
+
+    logger.debug("group commit of %d writes", len(group))
+
+    for (future, _, _), (succeeded, result) in zip(group, results):
+        if succeeded:
+            future.set_result(result)
+        else:
+            future.set_exception(result)
+
+
+def submit(function, *args) -> Future:
+    """ Schedule function(*args) as a write in a transaction, return a future for its result.
+
+    Function uses the module level calls like execute() for its database access. With group
+    commit the call is made by the writer thread and the future is resolved once its group
+    is committed. Without group commit, or when the current thread is already in a
+    transaction(), the call is made right away in (or joining) a transaction of this thread.
+    A transaction which found the database locked is retried, see retry_busy().
+    """
+    future = Future()
+    if _commit_queue is not None and getattr(_local, "depth", 0) == 0:
+        _commit_queue.put((future, function, args))
+        return future
+    try:
+        if getattr(_local, "depth", 0) > 0:
+            result = function(*args)
+        else:
+            result = retry_busy(_transact, function, args)
+    except Exception as e:
+        future.set_exception(e)
+    else:
+        future.set_result(result)
+    return future
+
+
+def _transact(function, args):
+    with transaction():
+        return function(*args)
+
+
+def write(function, *args):
+    """ Call function(*args) as a write in a transaction, see submit(), return its result once committed. """
+    return submit(function, *args).result()
+
+
+def pool_status() -> dict:
+    """ Return the size of the pool and the number of open, idle and checked out connections. """
+    with _lock:
+        return dict(size=_pool_size, open=len(_connections), idle=len(_idle),
+                    in_use=len(_connections) - len(_idle))
+
+
+def connection() -> sqlite3.Connection:
+    """ Return the connection of the current thread, checking one out from the pool if needed. """
+    if getattr(_local, "generation", None) == _generation:
+        return _local.connection
+    return acquire()
+
+
+def create(dbname: str = ":memory:", pool_size: int = DEFAULT_POOL_SIZE,
+           cached_statements: int = DEFAULT_CACHED_STATEMENTS, pragmas=None) -> None:
+    """ Create a new database and open a connection to it.
+
+    :param str dbname: database filename, if not specified create an in-memory database
+    :param int pool_size: maximum number of simultaneous connections
+    :param int cached_statements: size of the compiled statement cache of each connection
+    :param pragmas: name of a profile in PROFILES or a dict with PRAGMA settings, see connect()
+    :return: None
+    :raises: FileExistsError - file with name dbname already exists
+    """
+    if dbname != ":memory:":
+        try:
+            with open(dbname, "r+"):
+                pass
+            raise FileExistsError
+        except FileNotFoundError:
+            sqlite3.connect(dbname).close()  # this call creates the database
+
+    db.connect(dbname, pool_size, cached_statements, pragmas)
+
+
+def _profile(pragmas) -> dict:
+    """ Return the PRAGMA settings for a profile name or a dict of settings on top of the default profile. """
+    if pragmas is None:
+        return PROFILES["default"]
+    if isinstance(pragmas, str):
+        try:
+            return PROFILES[pragmas]
+        except KeyError:
+            raise ValueError(f"unknown profile {pragmas}, use one of {', '.join(PROFILES)}") from None
+    profile = dict(PROFILES["default"])
+    for pragma, value in pragmas.items():
+        if pragma not in profile:
+            raise ValueError(f"unsupported PRAGMA {pragma}, use one of {', '.join(profile)}")
+        if not isinstance(value, int) and not str(value).isalpha():  # values end up in the SQL text
+            raise ValueError(f"invalid value {value!r} for PRAGMA {pragma}")
+        profile[pragma] = value
+    return profile
+
+
+def connect(dbname: str = ":memory:", pool_size: int = DEFAULT_POOL_SIZE,
+            cached_statements: int = DEFAULT_CACHED_STATEMENTS, pragmas=None, create: bool = False) -> None:
+    """ Open a connection pool to an existing SQLite database or a new in-memory database.
+
+    Every connection is opened with foreign keys enabled, in WAL journal mode and with
+    the PRAGMA settings in pragmas: either the name of a profile in PROFILES or a dict
+    with settings which replace those of the default profile, like {"synchronous": "FULL"}.
+    Use settings() to check the effective values.
+
+    :param str dbname: database filename
+    :param int pool_size: maximum number of simultaneous connections, always 1 for ":memory:"
+    :param int cached_statements: size of the compiled statement cache of each connection
+    :param pragmas: name of a profile in PROFILES or a dict with PRAGMA settings, None for the default profile
+    :param bool create: create an empty database if file dbname does not exist
+    :return: None
+    :raises: FileNotFoundError - file dbname not found (and create is False)
+    :raises: PermissionError - no read and/or write access to file dbname
+    :raises: sqlite3.DatabaseError - dbname is not a valid SQLite database
+    :raises: ErrorAlreadyConnected - already connected to a database
+    :raises: ValueError - unknown profile, unsupported PRAGMA or invalid value
+    """
+    global _dbname, _pool_size, _cached_statements, _available, _pragmas
+
+    if _dbname is not None:
+        raise ErrorAlreadyConnected(f"already connected to database {name()}")
+
+    _pragmas = _profile(pragmas)
+
+    if dbname != ":memory:":
+        if create and not os.path.exists(dbname):
+            sqlite3.connect(dbname).close()  # this call creates the database
+        # check if file dbname exists and is not read-only
+        with open(dbname, mode="r+"):
+            pass
+
+    _dbname = dbname
+    _pool_size = 1 if dbname == ":memory:" else max(1, pool_size)
+    _cached_statements = cached_statements
+    _available = threading.BoundedSemaphore(_pool_size)
+
+    try:
+        _connections.append(_open())  # open the first connection right away to validate the database
+    except sqlite3.Error as e:
+        logger.error(f"{__name__}.connect({dbname}): {type(e).__name__} - {e}")
+        _dbname = None
+        raise e
+
+    _idle.extend(_connections)
+
+
+def close() -> None:
+    """ Close all connections in the pool, including connections still checked out. """
+    global _dbname, _generation
+
+    stop_group_commit()
+
+    with _lock:
+        for connection in _connections:
+            connection.close()
+        _connections.clear()
+        _idle.clear()
+        _data_versions.clear()
+        _dbname = None
+        _generation += 1
+
+
+def settings() -> dict:
+    """ Return the effective PRAGMA settings of the connection of the current thread.
+
+    :return dict: pragma: value (None if not applicable), for journal_mode, foreign_keys and the profile
+    """
+    effective = {}
+    for pragma in ("journal_mode", "foreign_keys", *_pragmas):
+        row = execute(f"PRAGMA {pragma};").fetchone()  # no row if not applicable, like mmap_size for ":memory:"
+        effective[pragma] = None if row is None else row[0]
+    return effective
+
+
+def checkpoint(mode: str = "PASSIVE") -> tuple:
+    """ Copy the content of the WAL to the database file.
+
+    A PASSIVE checkpoint copies as much as possible without waiting for readers or writers,
+    so the WAL does not keep growing when the automatic checkpoints on commit are starved by
+    continuous reads. The WAL is reused (and truncated to the journal_size_limit) after a
+    checkpoint which copied everything.
+
+    :param str mode: PASSIVE, FULL, RESTART or TRUNCATE
+    :return tuple: (1 if blocked by a lock else 0, pages in the WAL, pages checkpointed), -1 if not in WAL mode
+    """
+    if mode.upper() not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"invalid checkpoint mode {mode}")
+    return tuple(execute(f"PRAGMA wal_checkpoint({mode.upper()});").fetchone())
+
+
+def optimize() -> None:
+    """ Let SQLite update the query planner statistics where they are outdated or missing. """
+    execute("PRAGMA optimize;")
+
+
+@contextlib.contextmanager
+def record_statements():
+    """ Record the statements executed via the connection of the current thread, for use with explain().
+
+    The statements are recorded as executed, so with the parameter values filled in. Statements
+    run by triggers and virtual tables (traced as comments by SQLite) are left out.
+
+        with db.record_statements() as statements:
+            db.task.select_page(limit=10, status_id="O")
+        for sql in statements:
+            print(sql, db.full_scans(sql))
+
+    :return list: the recorded SQL statements
+    """
+    connection_ = connection()
+    statements = []
+    connection_.set_trace_callback(lambda sql: None if sql.startswith("--") else statements.append(sql))
+    try:
+        yield statements
+    finally:
+        connection_.set_trace_callback(logger.debug if logger.getEffectiveLevel() <= logging.DEBUG else None)
+
+
+def explain(sql: str, parameters: tuple = None) -> list:
+    """ Return the query plan of an SQL statement.
+
+    :param str sql: SQL statement
+    :param tuple parameters: statement parameters (if any)
+    :return list: the steps of the plan as shown by EXPLAIN QUERY PLAN, like "SEARCH task USING INDEX ..."
+    """
+    return [row[3] for row in execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+
+
+def full_scans(sql: str, parameters: tuple = None, min_rows: int = 1000) -> list:
+    """ Return the steps in the query plan of an SQL statement which read a large table without an index.
+
+    :param str sql: SQL statement
+    :param tuple parameters: statement parameters (if any)
+    :param int min_rows: tables with fewer rows are small enough to scan
+    :return list: the steps which scan a table of at least min_rows rows, like "SCAN task"
+    """
+    scans = []
+    for step in explain(sql, parameters):
+        match = re.fullmatch(r"SCAN (\w+)(?: AS \w+)?", step)
+        if match and execute(f'SELECT count(*) FROM "{match[1]}";').fetchone()[0] >= min_rows:
+            scans.append(step)
+    return scans
+
+
+def commit() -> None:
+    connection().commit()
+
+
+def rollback() -> None:
+    connection().rollback()
+    _local.after_commit = []  # the changes are undone, see on_commit()
+
+
+def observe(observer=None) -> None:
+    """ Call observer(sql, seconds) after every execute(), executemany() and executescript().
+
+    Used for collecting statement timings. When no observer is set (the default) the
+    only overhead per statement is a single comparison.
+
+    :param function observer: function(sql, seconds), None to stop observing
+    """
+    global _observer
+
+    _observer = observer
+
+
+def _timed(method, sql, *args) -> sqlite3.Cursor:
+    """ Call method(sql, *args) and report its duration to the observer. """
+    start = time.perf_counter()
+    try:
+        return method(sql, *args)
+    finally:
+        _observer(sql, time.perf_counter() - start)
+
+
+def execute(sql: str, parameters: tuple = None) -> sqlite3.Cursor:
+    """ Execute a query on the connected database.
+
+    :param str sql: SQL query
+    :param tuple parameters: query parameters (if any)
+    :return sqlite3.Cursor: query results
+    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
+    :raises: sqlite3.ProgrammingError - incorrect number of bindings
+    :raises: sqlite3.OperationalError - SQL syntax error
+    """
+    try:
+        if _observer is None:
+            return connection().execute(sql, () if parameters is None else parameters)
+        return _timed(connection().execute, sql, () if parameters is None else parameters)
+    except sqlite3.Error as e:
+        logger.error(f"{e.__module__}.{type(e).__name__} - {e}")
+        logger.error(f"SQL statement: {sql}")
+        if parameters:
+            logger.error(f"statement parameters: {parameters}")
+        raise e
+
+
+def executemany(sql: str, seq_of_parameters=None) -> sqlite3.Cursor:
+    """ Executes an SQL statement against all parameter sequences or mappings found in sequence seq_of_parameters
+
+    :param str sql: SQL statement
+    :param sequence seq_of_parameters: sequence of parameters
+    :return: sqlite3.Cursor
+    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
+    :raises: sqlite3.ProgrammingError - incorrect number of bindings
+    :raises: sqlite3.OperationalError - SQL syntax error
+    """
+    try:
+        if _observer is None:
+            return connection().executemany(sql, () if seq_of_parameters is None else seq_of_parameters)
+        return _timed(connection().executemany, sql, () if seq_of_parameters is None else seq_of_parameters)
+    except sqlite3.Error as e:
+        logger.error(f"{e.__module__}.{type(e).__name__} - {e}")
+        logger.error(f"SQL statement: {sql}")
+        raise e
+
+
+def executescript(sql_script: str) -> sqlite3.Cursor:
+    """ Issues a commit and then executes multiple SQL statements.
+
+    :param str sql_script: one or more SQL statements
+    :return: sqlite3.Cursor
+    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
+    :raises: sqlite3.OperationalError - SQL syntax error
+    """
+    try:
+        if _observer is None:
+            return connection().executescript(sql_script)
+        return _timed(connection().executescript, sql_script)
+    except sqlite3.Error as e:
+        logger.error(f"{e.__module__}.{type(e).__name__} - {e}")
+        logger.error(f"SQL script: {sql_script}")
+        raise e
+
+
+def iterate(cursor: sqlite3.Cursor, arraysize: int = 1000) -> sqlite3.Row:
+    """ Fetch query results from cursor in chunks of arraysize records.
+
+    Usage: db.iterate(db.execute("SELECT * FROM table"))
+    """
+    while True:
+        rows = cursor.fetchmany(arraysize)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+def dump(filename: str = "dump.sql", progress=None) -> int:
+    """ Dump the structure and content of the database to a file.
+
+    The statements are written while they are generated, so memory use does not depend
+    on the size of the database.
+
+    :param: str filename: script where SQL statements from dump will be saved
+    :param function progress: progress(count) is called every PROGRESS_INTERVAL statements
+    :return int: number of statements written
+
+    Note that iterdump() generates an exception if the rowfactory
+    is a namedtuple_factory, so in this case the database cannot
+    be dumped.
+
+    The content of virtual tables (like the full-text search index) is not dumped, as it
+    is stored in their shadow tables which are dumped. Python < 3.13 dumps both. The schema
+    version (PRAGMA user_version) is added at the end.
+    """
+    con = connection()
+
+    if con.row_factory is namedtuple_factory:
+        logger.warning("Cannot dump database which has namedtuple_factory as row_factory")
+        return 0
+
+    virtual = tuple(f"INSERT INTO \"{name}\" VALUES(" for name, in con.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%';"))
+
+    count = 0
+    with open(filename, "w", encoding="utf-8") as file:
+        for line in con.iterdump():
+            if virtual and line.startswith(virtual):
+                continue
+            file.write(line)
+            file.write("\n")
+            count += 1
+            if progress is not None and count % PROGRESS_INTERVAL == 0:
+                progress(count)
+        user_version = con.execute("PRAGMA user_version;").fetchone()[0]
+        if user_version:  # not part of iterdump()
+            file.write(f"PRAGMA user_version = {user_version};\n")
+            count += 1
+    return count
+
+
+def _statements(file):
+    """ Read the SQL statements from a script file one at a time. """
+    statement = ""
+    for line in file:
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+    if statement.strip():
+        yield statement.strip()  # incomplete, let SQLite report the error
+
+
+def load(filename: str = "dump.sql", chunk_size: int = 1000, progress=None) -> int:
+    """ Load the structure and/or content of a database from a file.
+
+    This function is meant to be used in conjunction with dump(). The script is read and
+    executed one statement at a time and committed every chunk_size statements, so memory
+    use does not depend on the size of the script. The transaction statements of the script
+    itself are skipped. If a statement fails the chunks committed before remain.
+
+    :param: str filename: script containing SQL code to create and/or populate tables
+    :param int chunk_size: number of statements per transaction
+    :param function progress: progress(count) is called every PROGRESS_INTERVAL statements
+    :return int: number of statements executed
+    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
+    :raises: FileNotFoundError - filename not found
+    :raises: PermissionError - no read access to filename
+    """
+    con = connection()
+
+    setting = con.execute("PRAGMA foreign_keys;").fetchone()[0]
+    con.execute("PRAGMA foreign_keys = OFF;")
+    count = 0
+    try:
+        with open(filename, "r", encoding="utf-8") as file:
+            statements = (sql for sql in _statements(file)
+                          if sql.upper() not in ("BEGIN TRANSACTION;", "BEGIN;", "COMMIT;", "COMMIT TRANSACTION;"))
+            for chunk in iter(lambda: list(itertools.islice(statements, chunk_size)), []):
+                with transaction():
+                    for sql in chunk:
+                        execute(sql)
+                        count += 1
+                        if progress is not None and count % PROGRESS_INTERVAL == 0:
+                            progress(count)
+    finally:
+        con.execute(f"PRAGMA foreign_keys = {setting};")
+    return count
+
+
+def export_table_to_dsv(table: str, delimiter: str = ";", filename: str = None,
+                        encoding: str = "windows-1252") -> int:
+    """ Write contents of a table or view to a delimiter separated file, by default 'table.txt'.
+        The decimal separator is always a dot. Using .txt forces Excel to use the
+        import dialog where you can specify the separator to use. The rows are
+        written while they are fetched.
+
+    :return int: number of rows written
+    """
+    import csv
+
+    cursor = connection().execute(f"SELECT * FROM {table}")
+    filename = filename or f"{table}.txt"
+    count = 0
+    with open(filename, "w", encoding=encoding, newline="") as file:
+        writer = csv.writer(file, dialect="excel", delimiter=delimiter)
+        writer.writerow([i[0] for i in cursor.description])  # write headers
+        for rows in iter(lambda: cursor.fetchmany(1000), []):
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+def snapshot(filename: str) -> None:
+    """ Write a consistent and compacted copy of the database to a file, using VACUUM INTO.
+
+    The copy is written to filename.tmp first and then renamed, so filename always contains
+    a complete snapshot, even when writing fails halfway. Other connections can keep reading
+    and writing meanwhile. An in-memory database only has one connection, which this call
+    occupies until the snapshot is written.
+
+    :param str filename: file for the snapshot, an existing file is replaced
+    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
+    :raises: sqlite3.OperationalError - called within a transaction
+    """
+    temporary = f"{filename}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)  # left behind by an interrupted snapshot, VACUUM INTO needs a new file
+    execute("VACUUM INTO ?;", (temporary,))
+    os.replace(temporary, filename)
+
+
+def restore(filename: str) -> None:
+    """ Replace the complete content of the database by that of a database file, like a snapshot.
+
+    Uses the online backup API, which copies the pages of the file as is, so loading a large
+    database into an in-memory database takes little more than reading the file.
+
+    :param str filename: database file to restore
+    :raises: sqlite.ErrorNotConnected - cannot operate on a closed database
+    :raises: FileNotFoundError - filename not found
+    :raises: sqlite3.DatabaseError - filename is not a valid SQLite database
+    """
+    if not os.path.exists(filename):
+        raise FileNotFoundError(filename)
+    source = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        source.backup(connection())
+    finally:
+        source.close()
+
+
+def name():
+    """ Return the name of the connected database. """
+    for dbinfo in connection().execute("PRAGMA database_list;"):
+        if dbinfo['name'] == "main":
+            return dbinfo['file'] if dbinfo['file'] != "" else ":memory:"
+
+
+@functools.lru_cache(maxsize=256)
+def _namedtuple_class(description: tuple) -> type:
+    """ Return the namedtuple class for the rows of a query, built once per cursor.description. """
+    return collections.namedtuple("Row", [column[0] for column in description])
+
+
+def namedtuple_factory(cursor: sqlite3.Cursor, row: tuple) -> tuple:
+    """ Tuple based access to a database row.
+
+    Allow access to a field in a row via row.field_name, instead of
+    row['field_name'] when using sqlite3.Row as row factory, or
+    even row[index_of_field] when not using a row factory at all.
+    The namedtuple class is cached per query result layout, so only
+    the first row of a new kind of query pays for building it.
+    """
+    return _namedtuple_class(cursor.description)._make(row)
+
+
+def record_factory(record_class: type):
+    """ Return a row factory which creates a record_class(*row) for every row.
+
+    Usage: cursor.row_factory = db.record_factory(Task)
+
+    The columns of the query must match the parameters of record_class in number and order.
+    """
+    def factory(cursor: sqlite3.Cursor, row: tuple):
+        return record_class(*row)
+
+    return factory
@@ -1,101 +1,959 @@
-"""" Database operations on table 'task' """
-
-import logging
-
-import db
-
-logger = logging.getLogger(__name__)
-
-
-def select(task_id=None):
-    sql = "SELECT id, summary, description, duedate, status_id, modified FROM task"
-
-    if task_id is None:
-        sql += ";"
-        result = db.execute(sql).fetchall()
-    else:
-        sql += " WHERE id = ?1;"
-        result = db.execute(sql, (task_id,)).fetchone()
-
-    logger.debug("{} - parameters{}".format(sql, () if task_id is None else (task_id,)))
-
-    return result
-
-
-def insert(summary, description=None, duedate=None, status_id=None):
-    parameters = [summary]
-
-    sql = "INSERT INTO task(summary"
-
-    if description:
-        parameters.append(description)
-    else:
-        parameters.append("")
-    sql += ", description"
-
-    if duedate:
-        parameters.append(duedate)
-        sql += ", duedate"
-
-    if status_id:
-        parameters.append(status_id)
-        sql += ", status_id"
-
-    sql += ") VALUES("
-
-    for i in range(1, len(parameters) + 1):
-        sql += "?{}{}".format(i, "" if i == len(parameters) else ",")
-
-    sql += ");"
-
-    logger.debug("{} - parameters{}".format(sql, tuple(parameters)))
-
-    with db.connection():
-        cursor = db.connection().cursor()
-        cursor.execute(sql, tuple(parameters))
-        return cursor.lastrowid
-
-
-def update(task_id, summary=None, description=None, duedate=None, status_id=None):
-    parameters = [task_id]
-
-    sql = "UPDATE task SET"
-
-    if summary:
-        parameters.append(summary)
-        sql += "{} summary = ?{}".format("" if len(parameters) == 2 else ",", len(parameters))
-
-    if description:
-        parameters.append(description)
-        sql += "{} description = ?{}".format("" if len(parameters) == 2 else ",", len(parameters))
-
-    if duedate:
-        parameters.append(duedate)
-        sql += "{} duedate = ?{}".format("" if len(parameters) == 2 else ",", len(parameters))
-
-    if status_id:
-        parameters.append(status_id)
-        sql += "{} status_id = ?{}".format("" if len(parameters) == 2 else ",", len(parameters))
-
-    sql += " WHERE id = ?1;"
-
-    if len(parameters) > 1:
-        logger.debug("{} - parameters{}".format(sql, tuple(parameters)))
-        with db.connection():
-            db.execute(sql, tuple(parameters))
-    else:
-        logger.warning("UPDATE task {} without values".format(task_id))
-
-
-def delete(task_id=None):
-    sql = "DELETE FROM task"
-
-    if task_id is None:
-        sql += ";"
-    else:
-        sql += " WHERE id = ?1;"
-
-    logger.debug("{} - parameters{}".format(sql, () if task_id is None else (task_id,)))
-
-    with db.connection():
-        db.execute(sql, () if task_id is None else (task_id,))
+"""" Database operations on table 'task' """
+
+import dataclasses
+import itertools
+import logging
+import sqlite3
+
+import db
+
+logger = logging.getLogger(__name__)
+
+# Columns which make up the keyset for every supported sort order, the primary key always comes last
+# to guarantee a unique position. Prefix a sort order with '-' for descending.
+SORT_KEYS = {"id": ("id",), "duedate": ("duedate", "id"), "modified": ("modified", "id")}
+
+COLUMNS = "id, summary, description, duedate, status_id, modified, version"
+
+# The same columns in raw mode: dates are returned as the ISO 8601 text which jsend would make of the
+# converted date and datetime objects, so they skip the conversion to Python objects and back. Use raw
+# mode when the tasks are only serialized, as in the web service.
+RAW_COLUMNS = ("id, summary, description, CAST(duedate AS TEXT) AS duedate, status_id, "
+               "replace(modified, ' ', 'T') AS modified, version")
+
+BATCH_SIZE = 1000  # default number of rows per executemany() call in the bulk operations
+
+DEFAULT_SEARCH_LIMIT = 20
+
+
+@dataclasses.dataclass(slots=True)
+class Task:
+    """ A row of table task, as returned by select(), select_page() and iterate().
+
+    Uses less memory than sqlite3.Row or a dict, and orjson serializes it without
+    converting it to a dict first. Like sqlite3.Row the fields can also be accessed
+    via task["name"] or task[index], iterating yields the values and dict(task) works.
+    """
+    id: int
+    summary: str
+    description: str
+    duedate: object  # datetime.date, or ISO 8601 text in raw mode
+    status_id: str
+    modified: object  # datetime.datetime, or ISO 8601 text in raw mode
+    version: int
+
+    def keys(self):
+        return self.__slots__
+
+    def __getitem__(self, key):
+        return getattr(self, key if isinstance(key, str) else self.__slots__[key])
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+
+_task_factory = db.record_factory(Task)
+
+# All statements are built once, so every call uses identical SQL text which sqlite3 finds
+# in its statement cache instead of compiling the statement again.
+_SELECT_ALL = f"SELECT {COLUMNS} FROM task;"
+_SELECT_ONE = f"SELECT {COLUMNS} FROM task WHERE id = ?1;"
+_SELECT_ALL_RAW = f"SELECT {RAW_COLUMNS} FROM task;"
+_SELECT_ONE_RAW = f"SELECT {RAW_COLUMNS} FROM task WHERE id = ?1;"
+
+# The fields which are specified in an insert or update are encoded as a bitmask. Only these
+# fields are written, so on insert the database defaults apply to the others and on update
+# the others keep their value (and their indexes are left alone).
+_SUMMARY = 1
+_DESCRIPTION = 2
+_DUEDATE = 4
+_STATUS_ID = 8
+
+_FIELDS = ((_SUMMARY, "summary"), (_DESCRIPTION, "description"), (_DUEDATE, "duedate"), (_STATUS_ID, "status_id"))
+
+
+def _columns(mask):
+    return [column for bit, column in _FIELDS if mask & bit]
+
+
+def _insert_sql(mask):
+    columns = _columns(mask)
+    return "INSERT INTO task({}) VALUES({});".format(", ".join(columns),
+                                                     ", ".join(f"?{i}" for i in range(1, len(columns) + 1)))
+
+
+def _update_sql(mask, version=False, returning=False):
+    columns = _columns(mask)
+    # Setting modified and version here, instead of via trigger [update modified], saves a nested UPDATE
+    # and makes RETURNING report them: it does not see changes made by triggers
+    sql = "UPDATE task SET {}, modified = DATETIME('now', 'localtime'), version = version + 1 WHERE id = ?1".format(
+        ", ".join(f"{column} = ?{i}" for i, column in enumerate(columns, start=2)))
+    if version:
+        sql += " AND version = ?{}".format(len(columns) + 2)
+    if returning:
+        sql += f" RETURNING {RAW_COLUMNS}"
+    return sql + ";"
+
+
+# UPDATE and DELETE ... RETURNING need SQLite 3.35, older versions read the task in the same transaction
+RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+_INSERT = {mask: _insert_sql(mask) for mask in range(16) if mask & _SUMMARY and mask & _DESCRIPTION}
+_UPDATE = {mask: _update_sql(mask) for mask in range(1, 16)}
+_UPDATE_VERSION = {mask: _update_sql(mask, version=True) for mask in range(1, 16)}
+_UPDATE_RETURNING = {(mask, version): _update_sql(mask, version, returning=True)
+                     for mask in range(1, 16) for version in (False, True)}
+
+_DELETE_ALL = "DELETE FROM task;"
+_DELETE_ONE = "DELETE FROM task WHERE id = ?1;"
+_DELETE_VERSION = "DELETE FROM task WHERE id = ?1 AND version = ?2;"
+_DELETE_ONE_RETURNING = f"DELETE FROM task WHERE id = ?1 RETURNING {RAW_COLUMNS};"
+_DELETE_VERSION_RETURNING = f"DELETE FROM task WHERE id = ?1 AND version = ?2 RETURNING {RAW_COLUMNS};"
+
+# Functions which are called with the task id after a task was inserted, updated or deleted.
+# The task id is None if any task may have changed. Used to invalidate caches.
+listeners = []
+
+
+def _changed(task_id=None):
+    for listener in listeners:
+        db.on_commit(listener, task_id)  # within a transaction() only once it is committed
+
+
+def select(task_id=None, raw=False):
+    """ Fetch a single task or all tasks.
+
+    :param bool raw: return dates as ISO 8601 text instead of date and datetime objects
+    """
+    if task_id is None:
+        sql = _SELECT_ALL_RAW if raw else _SELECT_ALL
+        cursor = db.execute(sql)
+        cursor.row_factory = _task_factory
+        result = cursor.fetchall()
+    else:
+        sql = _SELECT_ONE_RAW if raw else _SELECT_ONE
+        cursor = db.execute(sql, (task_id,))
+        cursor.row_factory = _task_factory
+        result = cursor.fetchone()
+
+    logger.debug("%s - parameters%s", sql, () if task_id is None else (task_id,))
+
+    return result
+
+
+def revision():
+    """ Return the revision number of table task, which is incremented on every change to any task. """
+    sql = "SELECT value FROM revision WHERE name = 'task';"
+
+    logger.debug("%s", sql)
+
+    return db.execute(sql).fetchone()["value"]
+
+
+def _filters(status_id=None, duedate_from=None, duedate_to=None):
+    """ Return the conditions of a WHERE clause and their parameters for the collection filters. """
+    conditions = []
+    parameters = []
+
+    if status_id is not None:
+        conditions.append("status_id = ?")
+        parameters.append(status_id)
+
+    if duedate_from is not None:
+        conditions.append("duedate >= ?")
+        parameters.append(duedate_from)
+
+    if duedate_to is not None:
+        conditions.append("duedate <= ?")
+        parameters.append(duedate_to)
+
+    return conditions, parameters
+
+
+def _select_sql(after=None, status_id=None, duedate_from=None, duedate_to=None, sort="id", raw=False):
+    """ Build the SELECT statement for a filtered and sorted collection of tasks.
+
+    :return tuple: (SQL statement without terminating semicolon, list of parameters, sort key columns)
+    :raises: ValueError - unknown sort order or after does not match the sort key
+    """
+    descending = sort.startswith("-")
+    key = SORT_KEYS.get(sort.lstrip("-"))
+    if key is None:
+        raise ValueError(f"unknown sort order {sort}")
+
+    conditions, parameters = _filters(status_id, duedate_from, duedate_to)
+
+    if after is not None:
+        if len(after) != len(key):
+            raise ValueError(f"cursor does not match sort order {sort}")
+        # A cursor holds modified as ISO 8601 text with a 'T' (see RAW_COLUMNS), the column has a space
+        conditions.append("({}) {} ({})".format(", ".join(key), "<" if descending else ">",
+                                                ", ".join("replace(?, 'T', ' ')" if column == "modified" else "?"
+                                                          for column in key)))
+        parameters.extend(after)
+
+    sql = f"SELECT {RAW_COLUMNS if raw else COLUMNS} FROM task"
+
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+
+    # Qualified, as in ORDER BY an unqualified name refers to the raw mode text alias which has no index
+    sql += " ORDER BY " + ", ".join(f"task.{column} DESC" if descending else f"task.{column}" for column in key)
+
+    return sql, parameters, key
+
+
+def select_page(limit=None, after=None, status_id=None, duedate_from=None, duedate_to=None, sort="id", raw=False,
+                columnar=False):
+    """ Fetch a filtered and sorted page of tasks using keyset pagination.
+
+    :param int limit: maximum number of tasks to return, None for all tasks
+    :param tuple after: sort key of the last task of the previous page, None to start at the first task
+    :param str status_id: only return tasks with this status
+    :param str duedate_from: only return tasks due on or after this date (YYYY-MM-DD)
+    :param str duedate_to: only return tasks due on or before this date (YYYY-MM-DD)
+    :param str sort: sort order, one of SORT_KEYS optionally prefixed with '-' for descending
+    :param bool raw: return dates as ISO 8601 text instead of date and datetime objects
+    :param bool columnar: return the tasks as a dictionary with a list of values per column instead of a
+                          list of Task records, which needs only one list per column instead of an object
+                          per task
+    :return tuple: (list of tasks, sort key of the last task or None if there are no more tasks)
+    :raises: ValueError - unknown sort order or after does not match the sort key
+    """
+    sql, parameters, key = _select_sql(after, status_id, duedate_from, duedate_to, sort, raw)
+
+    if limit is not None:
+        sql += " LIMIT ?"
+        parameters.append(limit + 1)  # fetch one extra row to find out if there is a next page
+
+    sql += ";"
+
+    logger.debug("%s - parameters%s", sql, tuple(parameters))
+
+    cursor = db.execute(sql, tuple(parameters))
+    cursor.row_factory = None if columnar else _task_factory
+    result = cursor.fetchall()
+
+    next_key = None
+    if limit is not None and len(result) > limit:
+        del result[limit:]
+        if columnar:
+            next_key = tuple(result[-1][Task.__slots__.index(column)] for column in key)
+        else:
+            next_key = tuple(result[-1][column] for column in key)
+
+    if columnar:
+        columns = zip(*result) if result else [()] * len(Task.__slots__)
+        result = {column: list(values) for column, values in zip(Task.__slots__, columns)}
+
+    return result, next_key
+
+
+def count(status_id=None, duedate_from=None, duedate_to=None):
+    """ Return the number of tasks in a filtered collection, see select_page() for the filters. """
+    conditions, parameters = _filters(status_id, duedate_from, duedate_to)
+
+    sql = "SELECT count(*) FROM task"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += ";"
+
+    logger.debug("%s - parameters%s", sql, tuple(parameters))
+
+    return db.execute(sql, tuple(parameters)).fetchone()[0]
+
+
+def iterate(status_id=None, duedate_from=None, duedate_to=None, sort="id", arraysize=1000, raw=False):
+    """ Fetch a filtered and sorted collection of tasks row by row.
+
+    The query is executed immediately, the rows are fetched from the database in chunks
+    of arraysize rows while the caller iterates so memory use does not depend on the
+    number of tasks.
+
+    :return generator: yields one Task at a time
+    :raises: ValueError - unknown sort order
+    """
+    sql, parameters, _ = _select_sql(None, status_id, duedate_from, duedate_to, sort, raw)
+
+    sql += ";"
+
+    logger.debug("%s - parameters%s", sql, tuple(parameters))
+
+    cursor = db.execute(sql, tuple(parameters))
+    cursor.row_factory = _task_factory
+    return db.iterate(cursor, arraysize)
+
+
+# Indexes for the access paths of select_page() and the change log, see create_indexes(). Every index
+# implicitly ends with the id, so they also supply the order of the keyset in SORT_KEYS. The foreign
+# key check on deleting a status uses task_status_duedate.
+_INDEX_DDL = (
+    "CREATE INDEX IF NOT EXISTS task_duedate ON task (duedate);",
+    "CREATE INDEX IF NOT EXISTS task_status_duedate ON task (status_id, duedate);",
+    "CREATE INDEX IF NOT EXISTS task_modified ON task (modified);",
+    "CREATE INDEX IF NOT EXISTS task_change_changed ON task_change (changed);")
+
+
+def create_indexes():
+    """ Create the indexes on task and task_change when missing, for an existing database. """
+    with db.transaction():
+        for sql in _INDEX_DDL:
+            db.execute(sql)
+
+
+# Full-text search via FTS5 table task_fts, which indexes summary and description of table task.
+# Matches in the summary weigh twice as much as matches in the description. Lower ranks are better.
+HIGHLIGHT = ("<mark>", "</mark>")  # markers around matched terms in the highlighted fields
+SNIPPET_TOKENS = 16  # maximum number of tokens in the description snippet
+
+_RANK = "bm25(task_fts, 2.0, 1.0)"
+_SEARCH_COLUMNS = "task.id, task.summary, task.description, task.duedate, task.status_id, task.modified, task.version"
+_SEARCH_RAW_COLUMNS = ("task.id, task.summary, task.description, CAST(task.duedate AS TEXT) AS duedate, "
+                       "task.status_id, replace(task.modified, ' ', 'T') AS modified, task.version")
+
+
+def _search_sql(columns, after=False):
+    sql = f"""SELECT {columns},
+       {_RANK} AS rank,
+       highlight(task_fts, 0, ?2, ?3) AS summary_highlight,
+       snippet(task_fts, 1, ?2, ?3, '...', {SNIPPET_TOKENS}) AS description_snippet
+  FROM task_fts JOIN task ON task.id = task_fts.rowid
+ WHERE task_fts MATCH ?1"""
+    if after:
+        sql += f" AND ({_RANK}, task.id) > (?5, ?6)"
+    return sql + " ORDER BY rank, task.id LIMIT ?4;"
+
+
+_SEARCH = {(raw, after): _search_sql(_SEARCH_RAW_COLUMNS if raw else _SEARCH_COLUMNS, after)
+           for raw in (False, True) for after in (False, True)}
+
+_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(summary, description, content = task, "
+    "content_rowid = id);",
+    """CREATE TRIGGER IF NOT EXISTS [index task insert] AFTER INSERT ON task FOR EACH ROW
+BEGIN
+    INSERT INTO task_fts (rowid, summary, description) VALUES (NEW.id, NEW.summary, NEW.description);
+END;""",
+    """CREATE TRIGGER IF NOT EXISTS [index task delete] AFTER DELETE ON task FOR EACH ROW
+BEGIN
+    INSERT INTO task_fts (task_fts, rowid, summary, description)
+        SELECT 'delete', OLD.id, OLD.summary, OLD.description
+         WHERE EXISTS (SELECT 1 FROM task_fts_docsize WHERE id = OLD.id);
+END;""",
+    """CREATE TRIGGER IF NOT EXISTS [index task update] AFTER UPDATE OF summary, description ON task FOR EACH ROW
+BEGIN
+    INSERT INTO task_fts (task_fts, rowid, summary, description)
+        SELECT 'delete', OLD.id, OLD.summary, OLD.description
+         WHERE EXISTS (SELECT 1 FROM task_fts_docsize WHERE id = OLD.id);
+    INSERT INTO task_fts (rowid, summary, description) VALUES (NEW.id, NEW.summary, NEW.description);
+END;""")
+
+# Tasks which are not in the index yet (the triggers only index tasks which change)
+_UNINDEXED = "NOT EXISTS (SELECT 1 FROM task_fts_docsize WHERE task_fts_docsize.id = task.id)"
+_INDEX_NEXT = f"SELECT max(id) FROM (SELECT id FROM task WHERE id > ?1 AND {_UNINDEXED} ORDER BY id LIMIT ?2);"
+_INDEX_BATCH = f"""INSERT INTO task_fts (rowid, summary, description)
+    SELECT id, summary, description FROM task WHERE id > ?1 AND id <= ?2 AND {_UNINDEXED};"""
+
+
+def search(query, limit=DEFAULT_SEARCH_LIMIT, after=None, raw=False):
+    """ Find tasks whose summary or description match a full-text query, best match first.
+
+    Every task contains the extra fields rank, summary_highlight (the summary with the
+    matched terms between HIGHLIGHT markers) and description_snippet (the part of the
+    description around the best match).
+
+    :param str query: FTS5 query, e.g. python AND (book OR website), "rubber duck", pyth*
+    :param int limit: maximum number of tasks to return
+    :param tuple after: (rank, id) of the last task of the previous page, None to start at the best match
+    :param bool raw: return dates as ISO 8601 text instead of date and datetime objects
+    :return tuple: (list of tasks, (rank, id) of the last task or None if there are no more tasks)
+    :raises: ValueError - invalid query or after
+    """
+    if after is None:
+        sql, parameters = _SEARCH[raw, False], (query, *HIGHLIGHT, limit + 1)
+    elif len(after) != 2:
+        raise ValueError("cursor does not match search")
+    else:
+        sql, parameters = _SEARCH[raw, True], (query, *HIGHLIGHT, limit + 1, *after)
+
+    logger.debug("%s - parameters%s", sql, parameters)
+
+    try:
+        result = db.execute(sql, parameters).fetchall()
+    except sqlite3.OperationalError as e:
+        # The query is the only input which can make a valid statement fail, unless the database was locked
+        if db.is_busy(e):
+            raise
+        raise ValueError(f"invalid search query: {e}")
+
+    if len(result) > limit:
+        del result[limit:]
+        return result, (result[-1]["rank"], result[-1]["id"])
+
+    return result, None
+
+
+def create_search_index(batch_size=10000):
+    """ Create and fill the full-text index for an existing database.
+
+    Tasks are indexed in batches of batch_size, each in its own transaction, so other
+    connections can continue to read and write in between. If building is interrupted
+    a next call continues with the tasks which are not yet indexed. Tasks which are
+    inserted, updated or deleted meanwhile are kept up to date by triggers.
+
+    :return int: number of tasks which were added to the index
+    """
+    with db.transaction():
+        for sql in _SEARCH_DDL:
+            db.execute(sql)
+
+    indexed = 0
+    last = 0
+    while True:
+        with db.transaction():
+            upto = db.execute(_INDEX_NEXT, (last, batch_size)).fetchone()[0]
+            if upto is None:
+                break
+            indexed += db.execute(_INDEX_BATCH, (last, upto)).rowcount
+        last = upto
+        logger.info("indexed %d tasks for full-text search", indexed)
+
+    return indexed
+
+
+# Change log in table task_change: a row with an increasing sequence number is added by triggers
+# for every insert, update and delete of a task. Entries older than a maximum age can be compacted;
+# the highest compacted sequence number is kept in table revision under name 'task_change'.
+DEFAULT_CHANGES_LIMIT = 1000
+
+_CHANGES = """SELECT task_change.seq, task_change.task_id, task_change.operation,
+       replace(task_change.changed, ' ', 'T') AS changed,
+       task.id, task.summary, task.description, CAST(task.duedate AS TEXT) AS duedate, task.status_id,
+       replace(task.modified, ' ', 'T') AS modified, task.version
+  FROM task_change LEFT JOIN task ON task.id = task_change.task_id
+ WHERE task_change.seq > ?1
+ ORDER BY task_change.seq
+ LIMIT ?2;"""
+_LAST_CHANGE = "SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'task_change'), 0);"
+_COMPACTED = "SELECT value FROM revision WHERE name = 'task_change';"
+# max(+seq) instead of max(seq): else SQLite walks back from the newest change through the entire retention
+# period, now it only reads the old changes from the covering index task_change_changed
+_COMPACT_UPTO = "SELECT max(+seq) FROM task_change WHERE changed < DATETIME('now', 'localtime', ?1);"
+_COMPACT = "DELETE FROM task_change WHERE seq <= ?1;"
+_SET_COMPACTED = "UPDATE revision SET value = max(value, ?1) WHERE name = 'task_change';"
+
+_CHANGES_DDL = (
+    """CREATE TABLE IF NOT EXISTS task_change (
+    seq       INTEGER   PRIMARY KEY AUTOINCREMENT,
+    task_id   INTEGER   NOT NULL,
+    operation TEXT      NOT NULL CHECK (operation IN ('insert', 'update', 'delete') ),
+    changed   TIMESTAMP NOT NULL DEFAULT (DATETIME('now', 'localtime') ) );""",
+    "INSERT OR IGNORE INTO revision (name, value) VALUES ('task_change', 0);",
+    """CREATE TRIGGER IF NOT EXISTS [log task delete] AFTER DELETE ON task FOR EACH ROW
+BEGIN
+    INSERT INTO task_change (task_id, operation) VALUES (OLD.id, 'delete');
+END;""",
+    """CREATE TRIGGER IF NOT EXISTS [log task insert] AFTER INSERT ON task FOR EACH ROW
+BEGIN
+    INSERT INTO task_change (task_id, operation) VALUES (NEW.id, 'insert');
+END;""",
+    'DROP TRIGGER IF EXISTS "log task update";',
+    """CREATE TRIGGER [log task update] AFTER UPDATE ON task FOR EACH ROW
+WHEN NEW.version <> OLD.version OR NEW.modified IS NOT OLD.modified
+BEGIN
+    INSERT INTO task_change (task_id, operation) VALUES (NEW.id, 'update');
+END;""")
+
+
+class ErrorChangesCompacted(Exception):
+    """ The requested changes were removed from the change log by compact_changes(). """
+
+    def __init__(self, since, compacted):
+        super().__init__(f"changes after {since} are no longer available, oldest available change is "
+                         f"{compacted + 1}")
+        self.since = since
+        self.compacted = compacted
+
+
+def changes(since, limit=DEFAULT_CHANGES_LIMIT):
+    """ Fetch the changes to tasks after sequence number since, oldest first.
+
+    Every change is a dictionary with the sequence number (seq), task_id, operation (insert,
+    update or delete), the time it was changed and the current content of the task (None
+    if it has been deleted meanwhile). Dates are returned as ISO 8601 text.
+
+    :param int since: sequence number of the last change the caller has seen, 0 for all
+    :param int limit: maximum number of changes to return
+    :return list: changes
+    :raises: ErrorChangesCompacted - changes after since were compacted, the caller has to re-read all tasks
+    """
+    logger.debug("%s - parameters%s", _CHANGES, (since, limit))
+
+    cursor = db.execute(_CHANGES, (since, limit))
+    cursor.row_factory = None
+    result = [{"seq": seq, "task_id": task_id, "operation": operation, "changed": changed,
+               "task": None if task[0] is None else Task(*task)}
+              for seq, task_id, operation, changed, *task in cursor]
+
+    if not result or result[0]["seq"] != since + 1:  # a gap at the start can only be caused by compaction
+        compacted = db.execute(_COMPACTED).fetchone()[0]
+        if since < compacted:
+            raise ErrorChangesCompacted(since, compacted)
+
+    return result
+
+
+def last_change():
+    """ Return the sequence number of the most recent change, the starting point to follow changes. """
+    logger.debug("%s", _LAST_CHANGE)
+
+    return db.execute(_LAST_CHANGE).fetchone()[0]
+
+
+def compact_changes(max_age=7 * 24 * 3600):
+    """ Remove changes older than max_age seconds from the change log.
+
+    :return int: number of removed changes
+    """
+    with db.transaction():
+        upto = db.execute(_COMPACT_UPTO, (f"-{max_age} seconds",)).fetchone()[0]
+        if upto is None:
+            return 0
+        logger.debug("%s - parameters%s", _COMPACT, (upto,))
+        removed = db.execute(_COMPACT, (upto,)).rowcount
+        db.execute(_SET_COMPACTED, (upto,))
+
+    return removed
+
+
+# Version of every task and revision of the table, which make up the ETags (see server.task_etag()). The
+# version and modified are updated by trigger [update modified], unless the UPDATE sets the version itself.
+_ADD_VERSION = "ALTER TABLE task ADD COLUMN version INTEGER NOT NULL DEFAULT 1;"
+
+_VERSION_DDL = (
+    "CREATE TABLE IF NOT EXISTS revision (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID;",
+    "INSERT OR IGNORE INTO revision (name, value) VALUES ('task', 0);",
+    """CREATE TRIGGER IF NOT EXISTS [revise task delete] AFTER DELETE ON task FOR EACH ROW
+BEGIN
+    UPDATE revision SET value = value + 1 WHERE name = 'task';
+END;""",
+    """CREATE TRIGGER IF NOT EXISTS [revise task insert] AFTER INSERT ON task FOR EACH ROW
+BEGIN
+    UPDATE revision SET value = value + 1 WHERE name = 'task';
+END;""",
+    # An update counts once: either it sets the version or modified itself, or trigger [update modified] does
+    'DROP TRIGGER IF EXISTS "revise task update";',
+    """CREATE TRIGGER [revise task update] AFTER UPDATE ON task FOR EACH ROW
+WHEN NEW.version <> OLD.version OR NEW.modified IS NOT OLD.modified
+BEGIN
+    UPDATE revision SET value = value + 1 WHERE name = 'task';
+END;""",
+    # Replaces the trigger of an unversioned database, which only updated modified. An update which sets
+    # modified itself, like an import, keeps the version and modified it specifies.
+    'DROP TRIGGER IF EXISTS "update modified";',
+    """CREATE TRIGGER [update modified] AFTER UPDATE ON task FOR EACH ROW
+WHEN NEW.version = OLD.version AND NEW.modified IS OLD.modified
+BEGIN
+    UPDATE task SET modified = DATETIME('now', 'localtime'), version = OLD.version + 1 WHERE id = OLD.id;
+END;""")
+
+
+def create_versioning():
+    """ Add the version column, the revision table and their triggers when missing, for an existing database. """
+    with db.transaction():
+        if "version" not in (row["name"] for row in db.execute("PRAGMA table_info(task);")):
+            db.execute(_ADD_VERSION)
+        for sql in _VERSION_DDL:
+            db.execute(sql)
+
+
+def create_change_log():
+    """ Create the change log table and triggers when missing, for an existing database. """
+    with db.transaction():
+        for sql in _CHANGES_DDL:
+            db.execute(sql)
+
+
+def _lastrowid(sql, parameters):
+    return db.execute(sql, parameters).lastrowid
+
+
+def _rowcount(sql, parameters):
+    return db.execute(sql, parameters).rowcount
+
+
+def _returned(sql, parameters):
+    """ Execute a statement with RETURNING for a single task, return the task or None. """
+    cursor = db.execute(sql, parameters)
+    cursor.row_factory = _task_factory
+    rows = cursor.fetchall()  # the change is only complete once all rows were returned
+    return rows[0] if rows else None
+
+
+def _update_then_select(sql, parameters):
+    """ Without RETURNING: execute an UPDATE for task id parameters[0], return the updated task or None. """
+    if db.execute(sql, parameters).rowcount == 0:
+        return None
+    return select(parameters[0], raw=True)
+
+
+def _select_then_delete(sql, parameters):
+    """ Without RETURNING: execute a DELETE for task id parameters[0], return the deleted task or None. """
+    task = select(parameters[0], raw=True)
+    if task is None or db.execute(sql, parameters).rowcount == 0:
+        return None
+    return task
+
+
+def _insert_values(task):
+    """ Return the statement mask and the values to insert for a task.
+
+    An empty description is stored as "", an empty duedate or status_id gets the database default.
+    """
+    mask = _SUMMARY | _DESCRIPTION
+    values = [task.get("summary"), task.get("description") or ""]
+    for bit, column in _FIELDS[2:]:
+        if task.get(column):
+            mask |= bit
+            values.append(task[column])
+    return mask, tuple(values)
+
+
+def insert(summary, description=None, duedate=None, status_id=None):
+    mask, parameters = _insert_values(dict(summary=summary, description=description, duedate=duedate,
+                                           status_id=status_id))
+    sql = _INSERT[mask]
+
+    logger.debug("%s - parameters%s", sql, parameters)
+
+    task_id = db.write(_lastrowid, sql, parameters)  # group committed when enabled
+
+    _changed(task_id)
+
+    return task_id
+
+
+def _update_values(task):
+    """ Return the statement mask and the values (id first) to update for a task.
+
+    Empty fields are not updated, the mask is 0 if there is nothing to update.
+    """
+    mask = 0
+    values = [task["id"]]
+    for bit, column in _FIELDS:
+        if task.get(column):
+            mask |= bit
+            values.append(task[column])
+    return mask, tuple(values)
+
+
+def update(task_id, summary=None, description=None, duedate=None, status_id=None, version=None, returning=False):
+    """ Update the specified fields of a task.
+
+    :param int version: if specified only update the task if it still has this version
+    :param bool returning: return the updated task in raw mode (see select()) instead of the number of updated
+                           tasks, or None if the task was not found or does not have this version. Takes a
+                           single statement, so the task cannot change between the update and the read.
+    :return int: number of updated tasks (0 or 1), None if no fields were specified
+    """
+    mask, parameters = _update_values(dict(id=task_id, summary=summary, description=description, duedate=duedate,
+                                           status_id=status_id))
+
+    if mask == 0:
+        logger.warning("UPDATE task %s without values", task_id)
+        if returning:  # nothing changes, so only read the task
+            task = select(task_id, raw=True)
+            return task if task is not None and version in (None, task["version"]) else None
+        return None
+
+    if returning:
+        if RETURNING:
+            sql = _UPDATE_RETURNING[mask, version is not None]
+        else:
+            sql = _UPDATE[mask] if version is None else _UPDATE_VERSION[mask]
+        if version is not None:
+            parameters += (version,)
+
+        logger.debug("%s - parameters%s", sql, parameters)
+
+        task = db.write(_returned if RETURNING else _update_then_select, sql, parameters)
+
+        if task is not None:
+            _changed(task_id)
+
+        return task
+
+    if version is None:
+        sql = _UPDATE[mask]
+    else:
+        sql = _UPDATE_VERSION[mask]
+        parameters += (version,)
+
+    logger.debug("%s - parameters%s", sql, parameters)
+
+    rowcount = db.write(_rowcount, sql, parameters)
+
+    _changed(task_id)
+
+    return rowcount
+
+
+def delete(task_id=None, version=None, returning=False):
+    """ Delete a single task or all tasks.
+
+    :param int version: if specified only delete task task_id if it still has this version
+    :param bool returning: return the deleted task in raw mode (see select()) instead of the number of deleted
+                           tasks, or None if the task was not found or does not have this version. Takes a
+                           single statement. Only for a single task.
+    :return int: number of deleted tasks
+    """
+    if returning:
+        if task_id is None:
+            raise ValueError("returning needs a task_id")
+        if version is None:
+            sql, parameters = _DELETE_ONE_RETURNING if RETURNING else _DELETE_ONE, (task_id,)
+        else:
+            sql, parameters = _DELETE_VERSION_RETURNING if RETURNING else _DELETE_VERSION, (task_id, version)
+
+        logger.debug("%s - parameters%s", sql, parameters)
+
+        task = db.write(_returned if RETURNING else _select_then_delete, sql, parameters)
+
+        if task is not None:
+            _changed(task_id)
+
+        return task
+
+    if task_id is None:
+        sql, parameters = _DELETE_ALL, ()
+    elif version is None:
+        sql, parameters = _DELETE_ONE, (task_id,)
+    else:
+        sql, parameters = _DELETE_VERSION, (task_id, version)
+
+    logger.debug("%s - parameters%s", sql, parameters)
+
+    rowcount = db.write(_rowcount, sql, parameters)
+
+    _changed(task_id)
+
+    return rowcount
+
+
+def _batches(iterable, batch_size):
+    """ Split iterable into lists of at most batch_size items without reading it completely. """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _apply(connection, sql, rows):
+    """ Execute sql for all rows within the current transaction.
+
+    The rows are executed via a single executemany() call. If this fails the changes are
+    undone and the rows are executed one by one, to find out which rows fail.
+
+    :return list: None if all rows succeeded, else per row the sqlite3.Error or the row id on success
+    """
+    logger.debug("%s - %d rows", sql, len(rows))
+
+    connection.execute("SAVEPOINT bulk;")
+    try:
+        connection.executemany(sql, rows)
+    except sqlite3.Error as e:
+        logger.warning("%s failed for a batch of %d rows (%s), retrying row by row", sql, len(rows), e)
+        connection.execute("ROLLBACK TO bulk;")
+        connection.execute("RELEASE bulk;")
+        results = []
+        for row in rows:
+            try:
+                results.append(connection.execute(sql, row).lastrowid)
+            except sqlite3.Error as e:
+                results.append(e)
+        return results
+    connection.execute("RELEASE bulk;")
+    return None
+
+
+def _existing(connection, task_ids):
+    """ Return the subset of task_ids which exist. """
+    existing = set()
+    for chunk in _batches(task_ids, 500):  # stay below the maximum number of SQL variables
+        sql = "SELECT id FROM task WHERE id IN ({});".format(", ".join("?" * len(chunk)))
+        existing.update(row["id"] for row in connection.execute(sql, chunk))
+    return existing
+
+
+def insert_many(tasks, batch_size=BATCH_SIZE):
+    """ Insert many tasks in a single transaction.
+
+    Consecutive tasks with the same set of fields are inserted via one executemany() call.
+    A task which fails to insert does not prevent the other tasks from being inserted.
+
+    :param iterable tasks: dicts with key summary and optionally description, duedate and status_id
+    :param int batch_size: maximum number of tasks per executemany() call
+    :return list: for every task in order the new task id, or the sqlite3.Error raised while inserting it
+    """
+    results = []
+
+    with db.transaction() as connection:
+        for batch in _batches(tasks, batch_size):
+            for mask, group in itertools.groupby(map(_insert_values, batch), key=lambda item: item[0]):
+                rows = [values for _, values in group]
+                outcome = _apply(connection, _INSERT[mask], rows)
+                if outcome is None:
+                    # with AUTOINCREMENT the rows of a single statement get consecutive ids
+                    last = connection.execute("SELECT last_insert_rowid();").fetchone()[0]
+                    results.extend(range(last - len(rows) + 1, last + 1))
+                else:
+                    results.extend(outcome)
+
+    for task_id in results:
+        if not isinstance(task_id, sqlite3.Error):
+            _changed(task_id)
+
+    return results
+
+
+def update_many(tasks, batch_size=BATCH_SIZE):
+    """ Update many tasks in a single transaction.
+
+    Consecutive tasks with the same set of fields are updated via one executemany() call.
+
+    :param iterable tasks: dicts with key id and the fields to update as in update()
+    :param int batch_size: maximum number of tasks per executemany() call
+    :return list: for every task in order True if updated, False if not found, or the sqlite3.Error
+    """
+    results = []
+    changed = []
+
+    with db.transaction() as connection:
+        for batch in _batches(tasks, batch_size):
+            existing = _existing(connection, [task["id"] for task in batch])
+            pending = [(index, *_update_values(task)) for index, task in enumerate(batch) if task["id"] in existing]
+            errors = {}
+            for mask, group in itertools.groupby(pending, key=lambda item: item[1]):
+                group = list(group)
+                if mask == 0:
+                    continue  # nothing to update, like update() without values
+                outcome = _apply(connection, _UPDATE[mask], [values for _, _, values in group])
+                if outcome is not None:
+                    errors.update((index, error) for (index, _, _), error in zip(group, outcome)
+                                  if isinstance(error, sqlite3.Error))
+            for index, task in enumerate(batch):
+                results.append(errors.get(index, task["id"] in existing))
+                if results[-1] is True:
+                    changed.append(task["id"])
+
+    for task_id in changed:
+        _changed(task_id)
+
+    return results
+
+
+def delete_many(task_ids, batch_size=BATCH_SIZE):
+    """ Delete many tasks in a single transaction.
+
+    :param iterable task_ids: ids of the tasks to delete
+    :param int batch_size: maximum number of tasks per executemany() call
+    :return list: for every task id in order True if deleted, False if not found, or the sqlite3.Error
+    """
+    results = []
+    changed = []
+
+    with db.transaction() as connection:
+        for batch in _batches(task_ids, batch_size):
+            existing = _existing(connection, batch)
+            pending = [task_id for task_id in batch if task_id in existing]
+            outcome = _apply(connection, _DELETE_ONE, [(task_id,) for task_id in pending]) if pending else None
+            errors = {} if outcome is None else {task_id: error for task_id, error in zip(pending, outcome)
+                                                 if isinstance(error, sqlite3.Error)}
+            for task_id in batch:
+                results.append(errors.get(task_id, task_id in existing))
+                if results[-1] is True:
+                    changed.append(task_id)
+                    existing.discard(task_id)  # a duplicate id in the same batch is reported as not found
+
+    for task_id in changed:
+        _changed(task_id)
+
+    return results
+
+
+# Import of exported tasks: a task with an id replaces the task with that id, or is inserted with that
+# id. Missing fields get their default, like in insert(). The update fires the triggers of a normal
+# update (search index, change log), unlike INSERT OR REPLACE which deletes the existing row without
+# firing them.
+_IMPORT = """INSERT INTO task (id, summary, description, duedate, status_id, modified, version)
+VALUES (?1, ?2, coalesce(?3, ''), coalesce(?4, DATE('now', 'localtime')), coalesce(?5, 'O'),
+        coalesce(replace(?6, 'T', ' '), DATETIME('now', 'localtime')), coalesce(?7, 1))
+ON CONFLICT (id) DO UPDATE SET summary = excluded.summary, description = excluded.description,
+    duedate = excluded.duedate, status_id = excluded.status_id, modified = excluded.modified,
+    version = excluded.version
+WHERE (task.summary, task.description, task.duedate, task.status_id, task.modified, task.version)
+      IS NOT (excluded.summary, excluded.description, excluded.duedate, excluded.status_id, excluded.modified,
+              excluded.version);"""
+
+
+def _import_values(task):
+    """ Return the parameters of _IMPORT for a task dict, raise ValueError if it is not a valid task. """
+    if not isinstance(task, dict):
+        raise ValueError("task must be an object")
+    for field in ("id", "version"):
+        if task.get(field) is not None and type(task[field]) is not int:
+            raise ValueError(f"{field} must be an integer")
+    return tuple(task.get(field) for field in Task.__slots__)
+
+
+def import_many(tasks, batch_size=BATCH_SIZE, on_error=None, progress=None):
+    """ Import tasks, as exported, in batches with a transaction per batch.
+
+    Tasks are read from the iterable while importing and every batch is committed, so memory
+    use does not depend on the number of tasks, but an interrupted import is not undone.
+    A task which fails to import does not prevent the other tasks from being imported.
+
+    :param iterable tasks: dicts with the fields of Task, all optional except summary, or an Exception
+                           for an item which could not be parsed (is reported as failed)
+    :param int batch_size: number of tasks per transaction and executemany() call
+    :param function on_error: on_error(index, exception) is called for every task which failed
+    :param function progress: progress(count) is called with the number of tasks processed after every batch
+    :return int: number of tasks imported
+    """
+    imported = 0
+    processed = 0
+
+    def failed(index, error):
+        if on_error is not None:
+            on_error(index, error)
+
+    for batch in _batches(enumerate(tasks), batch_size):
+        rows = []
+        for index, task in batch:
+            try:
+                if isinstance(task, Exception):
+                    raise task
+                rows.append((index, _import_values(task)))
+            except ValueError as e:
+                failed(index, e)
+        if rows:
+            with db.transaction() as connection:
+                outcome = _apply(connection, _IMPORT, [values for _, values in rows])
+            imported += len(rows)
+            for (index, _), error in zip(rows, outcome or ()):
+                if isinstance(error, sqlite3.Error):
+                    failed(index, error)
+                    imported -= 1
+        processed += len(batch)
+        if progress is not None:
+            progress(processed)
+
+    if imported:
+        _changed()
+
+    return imported
@@ -1,60 +1,154 @@
-""" Build jsend compliant JSON strings.
-
-Follows standards from:
-    https://github.com/omniti-labs/jsend
-
-Usage when sending a response (using Bottle):
-
-    @route("/something", GET)
-    def ...
-        return jsend.success(data="Some data")
-
-Usage when receiving a response (using requests):
-
-    response = requests.get("http://something")
-    if response.json()["status"] == jsend.SUCCESS:
-        ...
-"""
-import json
-from datetime import date, datetime, time
-
-SUCCESS = "success"
-FAIL = "fail"
-ERROR = "error"
-
-
-def success(data=None):
-    r = {"status": SUCCESS, "data": data}
-    return json.dumps(r, default=json_serialize)
-
-
-def fail(data=None):
-    r = {"status": FAIL, "data": data}
-    return json.dumps(r, default=json_serialize)
-
-
-def error(message=None, code=None, data=None):
-    if code is None and data is None:
-        r = {"status": ERROR, "message": message}
-    elif code is None:
-        r = {"status": ERROR, "message": message, "data": data}
-    elif data is None:
-        r = {"status": ERROR, "message": message, "code": code}
-    else:
-        r = {"status": ERROR, "message": message, "code": code, "data": data}
-    return json.dumps(r, default=json_serialize)
-
-
-def json_serialize(obj):
-    """ JSON serializer for objects not serializable by default by json.dumps """
-
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-
-    if isinstance(obj, date):
-        return obj.isoformat()
-
-    if isinstance(obj, time):
-        return obj.isoformat()
-
-    raise TypeError("Type {} not serializable".format(type(obj)))
+""" Build jsend compliant JSON strings.
+
+Follows standards from:
+    https://github.com/omniti-labs/jsend
+
+The JSON is returned as UTF-8 encoded bytes which Bottle sends as is. When the
+orjson package is installed it is used for encoding, otherwise the standard json
+module. Both produce identical, compact JSON. See use() to select an encoder.
+
+Usage when sending a response (using Bottle):
+
+    @route("/something", GET)
+    def ...
+        return jsend.success(data="Some data")
+
+Usage when receiving a response (using requests):
+
+    response = requests.get("http://something")
+    if response.json()["status"] == jsend.SUCCESS:
+        ...
+"""
+import json
+import time as timer
+from datetime import date, time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SUCCESS = "success"
+FAIL = "fail"
+ERROR = "error"
+
+observer = None  # function(seconds) called after serializing a response, used for collecting timings
+
+# Constant start of the responses, so only the data has to be encoded
+_SUCCESS_PREFIX = b'{"status":"success","data":'
+_FAIL_PREFIX = b'{"status":"fail","data":'
+
+
+def json_serialize(obj):
+    """ JSON serializer for objects not serializable by default by json.dumps """
+
+    if isinstance(obj, (date, time)):  # datetime is a subclass of date
+        return obj.isoformat()
+
+    if hasattr(obj, "keys"):  # records like sqlite3.Row or db.task.Task
+        return dict(obj)
+
+    raise TypeError("Type {} not serializable".format(type(obj)))
+
+
+_json_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=json_serialize)
+
+
+def _encode_json(obj):
+    return _json_encoder.encode(obj).encode("utf-8")
+
+
+def _encode_orjson(obj):
+    # Dates, times and datetimes are converted natively by orjson in the same ISO 8601
+    # format as json_serialize, the hook is only called for other unsupported types.
+    return orjson.dumps(obj, default=json_serialize)
+
+
+ENCODERS = {"json": _encode_json}
+if orjson is not None:
+    ENCODERS["orjson"] = _encode_orjson
+
+_encode = _encode_orjson if orjson is not None else _encode_json
+
+
+def use(name):
+    """ Select the encoder for all responses.
+
+    :param str name: "orjson" (default when installed) or "json"
+    :raises: KeyError - encoder not available
+    """
+    global _encode
+
+    _encode = ENCODERS[name]
+
+
+def encoder():
+    """ Return the name of the encoder in use. """
+    return next(name for name, function in ENCODERS.items() if function is _encode)
+
+
+def dumps(obj):
+    """ Serialize obj to JSON as UTF-8 encoded bytes. """
+    if observer is None:
+        return _encode(obj)
+    start = timer.perf_counter()
+    try:
+        return _encode(obj)
+    finally:
+        observer(timer.perf_counter() - start)
+
+
+def ndjson(rows):
+    """ Serialize rows to newline delimited JSON, one line per row, as UTF-8 encoded bytes.
+
+    :param iterable rows: dictionaries or records like sqlite3.Row and db.task.Task
+    """
+    start = timer.perf_counter()
+    lines = b"".join([_encode(row) + b"\n" for row in rows])
+    if observer is not None:
+        observer(timer.perf_counter() - start)
+    return lines
+
+
+def success(data=None):
+    return _SUCCESS_PREFIX + dumps(data) + b"}"
+
+
+def success_stream(rows, chunksize=1000):
+    """ Incrementally build a success response with a list of rows as data.
+
+    Yields the JSON in pieces of (at most) chunksize rows, so the complete response
+    never has to be in memory. The concatenated pieces are identical to
+    success(data=list(rows)).
+
+    :param iterable rows: dictionaries or records like sqlite3.Row and db.task.Task
+    :param int chunksize: number of rows per yielded piece
+    """
+    yield _SUCCESS_PREFIX + b"["
+    separator = b""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunksize:
+            yield separator + dumps(chunk)[1:-1]  # encode the whole chunk at once, without the brackets
+            separator = b","
+            chunk.clear()
+    if chunk:
+        yield separator + dumps(chunk)[1:-1]
+    yield b"]}"
+
+
+def fail(data=None):
+    return _FAIL_PREFIX + dumps(data) + b"}"
+
+
+def error(message=None, code=None, data=None):
+    if code is None and data is None:
+        r = {"status": ERROR, "message": message}
+    elif code is None:
+        r = {"status": ERROR, "message": message, "data": data}
+    elif data is None:
+        r = {"status": ERROR, "message": message, "code": code}
+    else:
+        r = {"status": ERROR, "message": message, "code": code, "data": data}
+    return dumps(r)
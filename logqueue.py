@@ -0,0 +1,107 @@
+""" Non-blocking logging via a bounded queue.
+
+Request threads only put log records on a queue. A single background thread (a
+QueueListener) formats the records and writes them to the actual handlers, so disk
+I/O and log file rotation never add to the latency of a request.
+
+When the queue is full new records are dropped instead of blocking the caller. The
+number of dropped records is reported in a warning as soon as there is room again.
+
+Usage:
+
+    listener = logqueue.start([logging.handlers.RotatingFileHandler("server.log")])
+    ...
+    listener.stop()  # also done automatically at exit
+
+Records are formatted by the listener thread, so objects passed as arguments to a
+logging call must not be modified afterwards.
+"""
+import atexit
+import json
+import logging.handlers
+import queue
+import threading
+
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler which drops records when the queue is full. """
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0  # records dropped since the last report
+        self.dropped_total = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        """ Pass the record as is, formatting is left to the listener thread. """
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                with self._lock:
+                    dropped, self.dropped = self.dropped, 0
+                if dropped:
+                    try:
+                        self.queue.put_nowait(logging.makeLogRecord(
+                            dict(name=__name__, levelno=logging.WARNING, levelname="WARNING",
+                                 msg="%d log records dropped, queue full", args=(dropped,))))
+                    except queue.Full:
+                        with self._lock:
+                            self.dropped += dropped  # report them next time
+                        raise
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self.dropped_total += 1
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """ QueueListener which waits for room in a full queue when stopping, and can be stopped more than once. """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+class JSONFormatter(logging.Formatter):
+    """ Format a record as a single line JSON object.
+
+    Keys are time, level, logger and message, plus the items of the dictionary passed
+    as extra={"fields": {...}} in the logging call.
+    """
+
+    def format(self, record):
+        entry = dict(time=self.formatTime(record, "%Y-%m-%dT%H:%M:%S"), level=record.levelname, logger=record.name,
+                     message=record.getMessage())
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def start(handlers, queue_size=DEFAULT_QUEUE_SIZE, level=logging.NOTSET):
+    """ Route all logging of the root logger via a bounded queue to handlers.
+
+    :param list handlers: handlers which write the records, called by the listener thread
+    :param int queue_size: maximum number of records waiting to be written
+    :param int level: level of the root logger
+    :return QueueListener: the started listener
+    """
+    records = queue.Queue(queue_size)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(records))
+    root.setLevel(level)
+
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
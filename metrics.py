@@ -0,0 +1,205 @@
+""" Request metrics for the web service, exposed in Prometheus text format.
+
+Collected are:
+    - the number of requests per route, method and response status code
+    - a latency histogram per route and method
+    - the number of executions and total execution time per SQL statement
+    - the number of JSend responses serialized and the total serialization time
+    - the state of the database connection pool
+    - hits, misses, evictions and size of the response caches
+
+Nothing is measured until install() is called, so without it the only overhead on
+the hot path is a single comparison per SQL statement and JSend response.
+
+Usage:
+
+    metrics.install(server.app, caches={"task": server.task_cache, "page": server.page_cache})
+
+after which the metrics can be fetched via GET /metrics.
+"""
+import bisect
+import threading
+import time
+
+from bottle import HTTPResponse, response
+
+import db
+import jsend
+
+PREFIX = "todo"
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+MAX_STATEMENTS = 100  # distinct SQL statements tracked, any others are counted as "other"
+MAX_LABEL_LENGTH = 200  # longer SQL statements are truncated in the label
+
+_lock = threading.Lock()
+_requests = {}  # (method, route, status): number of requests
+_latency = {}  # (method, route): [count per bucket (last is +Inf), sum of seconds]
+_statements = {}  # sql: [count, sum of seconds]
+_serialization = [0, 0.0]  # count, sum of seconds
+_caches = {}  # name: cache.LRUCache
+
+
+def record_request(method, route, status, seconds):
+    with _lock:
+        key = (method, route, status)
+        _requests[key] = _requests.get(key, 0) + 1
+        histogram = _latency.get((method, route))
+        if histogram is None:
+            histogram = _latency[(method, route)] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+
+
+def record_statement(sql, seconds):
+    with _lock:
+        statement = _statements.get(sql)
+        if statement is None:
+            if len(_statements) >= MAX_STATEMENTS:
+                sql = "other"
+            statement = _statements.setdefault(sql, [0, 0.0])
+        statement[0] += 1
+        statement[1] += seconds
+
+
+def record_serialization(seconds):
+    with _lock:
+        _serialization[0] += 1
+        _serialization[1] += seconds
+
+
+class MetricsPlugin:
+    """ Bottle plugin which records the status code and duration of every request per route.
+
+    install() makes it the outermost plugin, so it also measures the plugins installed before it,
+    like the commit of server.TransactionPlugin and the 500 response when that commit fails. The
+    duration of a streamed response only covers the request handler, not the sending of the body.
+    """
+    name = "metrics"
+    api = 2
+
+    def apply(self, callback, route):
+        method, rule = route.method, route.rule
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = 500
+            try:
+                result = callback(*args, **kwargs)
+                status = response.status_code
+                return result
+            except HTTPResponse as e:
+                status = e.status_code
+                raise
+            finally:
+                record_request(method, rule, status, time.perf_counter() - start)
+
+        return wrapper
+
+
+def label(value):
+    """ Escape a label value for the Prometheus text format. """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def statement_label(sql):
+    """ Shorten an SQL statement to a single line label. """
+    sql = " ".join(sql.split())
+    if len(sql) > MAX_LABEL_LENGTH:
+        sql = sql[:MAX_LABEL_LENGTH - 3] + "..."
+    return sql
+
+
+def render():
+    """ Return all metrics in Prometheus text format. """
+    with _lock:
+        requests = dict(_requests)
+        latency = {key: (list(counts), total) for key, (counts, total) in _latency.items()}
+        statements = {}
+        for sql, (count, total) in _statements.items():  # statements may share a truncated label
+            statement = statements.setdefault(statement_label(sql), [0, 0.0])
+            statement[0] += count
+            statement[1] += total
+        serialization = tuple(_serialization)
+
+    lines = []
+
+    def metric(name, kind, description):
+        lines.append(f"# HELP {PREFIX}_{name} {description}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+    metric("http_requests_total", "counter", "Number of HTTP requests by route and status code.")
+    for (method, route, status), count in sorted(requests.items()):
+        lines.append(f'{PREFIX}_http_requests_total{{method="{method}",route="{label(route)}",status="{status}"}} '
+                     f'{count}')
+
+    metric("http_request_duration_seconds", "histogram", "Time spent handling the request.")
+    for (method, route), (counts, total) in sorted(latency.items()):
+        labels = f'method="{method}",route="{label(route)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f'{PREFIX}_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{PREFIX}_http_request_duration_seconds_sum{{{labels}}} {total:.6f}")
+        lines.append(f"{PREFIX}_http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+    metric("sql_statement_duration_seconds", "summary", "Time spent executing SQL statements.")
+    for sql, (count, total) in sorted(statements.items()):
+        lines.append(f'{PREFIX}_sql_statement_duration_seconds_sum{{statement="{label(sql)}"}} {total:.6f}')
+        lines.append(f'{PREFIX}_sql_statement_duration_seconds_count{{statement="{label(sql)}"}} {count}')
+
+    metric("json_serialization_duration_seconds", "summary", "Time spent serializing JSend responses.")
+    lines.append(f"{PREFIX}_json_serialization_duration_seconds_sum {serialization[1]:.6f}")
+    lines.append(f"{PREFIX}_json_serialization_duration_seconds_count {serialization[0]}")
+
+    pool = db.pool_status()
+    metric("db_pool_size", "gauge", "Maximum number of database connections.")
+    lines.append(f"{PREFIX}_db_pool_size {pool['size']}")
+    metric("db_pool_connections", "gauge", "Number of database connections by state.")
+    for state in ("open", "idle", "in_use"):
+        lines.append(f'{PREFIX}_db_pool_connections{{state="{state}"}} {pool[state]}')
+
+    stats = {name: cache.stats() for name, cache in sorted(_caches.items())}
+    for key, kind, description in (("hits", "counter", "Number of cache hits."),
+                                   ("misses", "counter", "Number of cache misses."),
+                                   ("evictions", "counter", "Number of entries evicted from the cache."),
+                                   ("entries", "gauge", "Number of entries in the cache."),
+                                   ("bytes", "gauge", "Total size of the entries in the cache.")):
+        name = f"cache_{key}_total" if kind == "counter" else f"cache_{key}"
+        metric(name, kind, description)
+        for cache, values in stats.items():
+            lines.append(f'{PREFIX}_{name}{{cache="{label(cache)}"}} {values[key]}')
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_get():
+    """ Return all metrics in Prometheus text format.
+
+    response status code:
+        200 OK
+    """
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return render()
+
+
+def reset():
+    """ Clear all recorded metrics. """
+    with _lock:
+        _requests.clear()
+        _latency.clear()
+        _statements.clear()
+        _serialization[:] = [0, 0.0]
+
+
+def install(app, caches=None):
+    """ Start collecting metrics for app and add route GET /metrics.
+
+    :param bottle.Bottle app: application to measure
+    :param dict caches: name: cache.LRUCache, caches to report
+    """
+    _caches.update(caches or {})
+    app.plugins.insert(0, MetricsPlugin())  # Bottle applies the first plugin last, so it wraps all others
+    app.reset()
+    app.route("/metrics", "GET", metrics_get)
+    db.observe(record_statement)
+    jsend.observer = record_serialization
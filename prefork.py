@@ -0,0 +1,163 @@
+""" Pre-fork launcher which serves a WSGI app from several worker processes.
+
+The master process opens the listening socket and forks the workers, which all accept
+connections on this socket, so the operating system spreads the connections over the
+workers. A worker handles every connection in a thread of its own. Workers share nothing
+but the socket and the files they open, so every worker must open its own resources, like
+database connections, in worker_start. The master only supervises: a worker which dies
+is replaced.
+
+SIGTERM or SIGINT (Ctrl-C) stops the server gracefully: the workers stop accepting
+connections, finish the requests in progress and call worker_stop (e.g. to close their
+database connections). Workers which did not finish within shutdown_timeout seconds are
+killed.
+
+Requires os.fork, so it is not available on Windows.
+
+Usage:
+
+    prefork.run(app, "127.0.0.10", 8080, workers=4, worker_start=connect, worker_stop=disconnect)
+"""
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_TIMEOUT = 30  # seconds the workers get to finish the requests in progress
+RESTART_DELAY = 1  # seconds before a worker which died is replaced
+
+_SIGNALS = {signal.SIGTERM, signal.SIGINT}  # signals which stop the server
+
+
+class Server(socketserver.ThreadingMixIn, WSGIServer):
+    """ Threaded WSGI server accepting connections on a socket shared with other processes. """
+
+    daemon_threads = False  # so server_close() waits for the requests in progress
+
+    def server_activate(self):
+        super().server_activate()
+        # A new connection wakes up every worker, the ones which lose the race must not block in accept()
+        self.socket.setblocking(False)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):  # requests are logged by the app
+        pass
+
+
+def run(app, host, port, workers, worker_start=None, worker_stop=None, shutdown_timeout=SHUTDOWN_TIMEOUT):
+    """ Serve app from workers processes until SIGTERM or SIGINT, returns when all workers stopped.
+
+    :param app: WSGI application
+    :param str host: address to listen on
+    :param int port: port to listen on
+    :param int workers: number of worker processes
+    :param function worker_start: worker_start(number) is called in every worker (numbered from 1) before
+                                  it serves requests, also in a worker which replaces one which died
+    :param function worker_stop: worker_stop(number) is called in every worker after it served its last request
+    :param float shutdown_timeout: seconds the workers get to finish the requests in progress when stopping
+    :raises: OSError - cannot listen on host:port
+    """
+    if not hasattr(os, "fork"):
+        raise NotImplementedError("multiple worker processes need os.fork, which is not available on this platform")
+
+    httpd = make_server(host, port, app, server_class=Server, handler_class=QuietHandler)
+    children = {}  # pid: worker number
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if not stopping:
+            logger.info("received signal %s, stopping %d workers", signal.Signals(signum).name, len(children))
+            stopping = True
+            for pid in children:
+                _kill(pid, signal.SIGTERM)
+
+    def spawn(number):
+        # A stop signal must not reach a new worker before it installed its own handlers
+        signal.pthread_sigmask(signal.SIG_BLOCK, _SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                _worker(httpd, number, worker_start, worker_stop)  # never returns
+            children[pid] = number
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+        logger.info("started worker %d (pid %d)", number, pid)
+
+    previous = {signum: signal.signal(signum, stop) for signum in _SIGNALS}
+    try:
+        logger.info("listening on http://%s:%d/ with %d workers", host, port, workers)
+        for number in range(1, workers + 1):
+            spawn(number)
+
+        deadline = None
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:  # no worker exited
+                if stopping:
+                    deadline = deadline or time.monotonic() + shutdown_timeout
+                    if time.monotonic() > deadline:
+                        logger.warning("killing %d workers which did not stop within %s seconds", len(children),
+                                       shutdown_timeout)
+                        for pid in children:
+                            _kill(pid, signal.SIGKILL)
+                        deadline = float("inf")
+                time.sleep(0.1)
+                continue
+            number = children.pop(pid, None)
+            if number is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if stopping:
+                logger.info("worker %d (pid %d) stopped", number, pid)
+            else:
+                logger.error("worker %d (pid %d) exited with code %d, replacing it", number, pid, code)
+                time.sleep(RESTART_DELAY)
+                if not stopping:
+                    spawn(number)
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        httpd.server_close()
+
+    logger.info("all workers stopped")
+
+
+def _kill(pid, signum):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:  # already exited
+        pass
+
+
+def _worker(httpd, number, worker_start, worker_stop):
+    """ Main function of a worker process, never returns. """
+    stopping = threading.Event()
+    for signum in _SIGNALS:
+        signal.signal(signum, lambda signum, frame: stopping.set())
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+
+    code = 0
+    try:
+        if worker_start is not None:
+            worker_start(number)
+        serving = threading.Thread(target=httpd.serve_forever, args=(0.5,), name="serve", daemon=True)
+        serving.start()
+        while not stopping.wait(1):
+            if not serving.is_alive():
+                raise RuntimeError("server thread stopped")
+        httpd.shutdown()  # stop accepting connections
+        httpd.server_close()  # wait for the requests in progress
+        if worker_stop is not None:
+            worker_stop(number)
+    except BaseException as e:
+        logger.exception("exception %s in worker %d", type(e).__name__, number)
+        code = 1
+    finally:
+        os._exit(code)  # skip the exit handlers of the master
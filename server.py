@@ -1,233 +1,1232 @@
-""" Web service for a manipulating tasks in a todo-list.
-
-For every possible request a handler is defined. The task id (if relevant) is part
-of the request URL. Additional data is sent as JSON in the request message body.
-Data is returned to the caller as part of the 'data' key in a JSend compliant JSON
-structure.
-
-The database with the todo tasks is accessed via calls to db.task.py
-Before starting the server a connection to a database must be opened.
-In the implementation below an in-memory database is used which is
-initialized every time the server is started.
-
-Start the server via the terminal: > start python server.py
-"""
-import logging.handlers
-import sqlite3
-
-from bottle import Bottle, request, response
-
-import db
-import jsend
-
-logger = logging.getLogger(__name__)
-
-app = Bottle()
-
-
-@app.get("/task")
-@app.get("/task/<task_id:int>")
-def task_get(task_id=None):
-    """ Fetch a single task or fetch all tasks.
-
-    :return: JSend compliant object with key 'data' containing a single or a list of tasks
-
-    response status code:
-        200 OK - response JSend object  contains task(s) content
-        404 Not Found - task task_id not found, response JSend object contains error
-        500 Server Internal Error - most likely database error, detailed error information in response JSend object
-    """
-    logger.info(f"request {request.method} {request.fullpath}")
-
-    response.headers["Content-Type"] = "application/json"
-    response.headers["Cache-Control"] = "no-cache"
-    try:
-        if task_id is None:
-            tasks = db.task.select()
-            response.status = 200
-            return jsend.success(data=[dict(task) for task in tasks])
-        else:
-            task = db.task.select(task_id)
-            if task is None:
-                response.status = 404
-                return jsend.fail(data=f"task {task_id} not found")
-            else:
-                response.status = 200
-                return jsend.success(data=dict(task))
-    except sqlite3.Error as e:
-        logger.error(f"exception {type(e).__name__} in task_get({task_id})")
-        response.status = 500
-        return jsend.error(message="GET task failed", code=type(e).__name__, data=str(e))
-
-
-@app.put("/task")
-@app.put("/task/<task_id:int>")
-def task_put(task_id=None):
-    """ Update a single task. Updating all tasks not supported.
-
-    :return: JSend compliant object with key 'data' containing the task_id of the updated task
-
-    response status code:
-        200 OK - task updated successfully, response JSend object contains task_id
-        400 Bad Request - no JSON content in request
-        404 Not Found - task task_id not found, response JSend object contains error
-        405 Method Not Allowed - PUT on collection not supported
-        500 Server Internal Error - most likely database error, detailed error information in response JSend object
-    """
-    logger.info(f"request {request.method} {request.fullpath}")
-    logger.info(f"JSON {request.json}")
-
-    response.headers["Content-Type"] = "application/json"
-    try:
-        if task_id is None:
-            response.status = 405
-            return jsend.error(message="PUT on collection not supported")
-        else:
-            task = db.task.select(task_id)
-            if task is None:
-                response.status = 404
-                return jsend.fail(data=f"task {task_id} not found")
-            else:
-                data = request.json
-                if data is None:
-                    response.status = 400
-                    return jsend.fail(data="no JSON content")
-                else:
-                    summary = data["summary"] if "summary" in data else None
-                    description = data["description"] if "description" in data else None
-                    duedate = data["duedate"] if "duedate" in data else None
-                    status_id = data["status_id"] if "status_id" in data else None
-                    db.task.update(task_id, summary, description, duedate, status_id)
-                    response.status = 200
-                    return jsend.success(data={"id": task_id})
-    except sqlite3.Error as e:
-        logger.error(f"exception {type(e).__name__} in task_get({task_id})")
-        response.status = 500
-        return jsend.error(message="GET task failed", code=type(e).__name__, data=str(e))
-
-
-@app.post("/task")
-@app.post("/task/<task_id:int>")
-def task_post(task_id=None):
-    """ Insert a new task.
-
-    :return: JSend compliant object with key 'data' containing the task_id of newly created task
-
-    response status code:
-        201 Created - task inserted, response JSend object contains new task task_id
-        400 Bad Request - no JSON content in request
-        405 Method Not Allowed - insert with predefined task_id not possible
-        500 Server Internal Error - most likely database error, detailed error information in response JSend object
-    """
-    logger.info(f"request {request.method} {request.fullpath}")
-    logger.info(f"JSON {request.json}")
-
-    response.headers["Content-Type"] = "application/json"
-    try:
-        if task_id is None:
-            data = request.json
-            if data is None:
-                response.status = 400
-                return jsend.fail(data="no JSON content")
-            else:
-                summary = data["summary"] if "summary" in data else None
-                description = data["description"] if "description" in data else None
-                duedate = data["duedate"] if "duedate" in data else None
-                status_id = data["status_id"] if "status_id" in data else None
-                task_id = db.task.insert(summary, description, duedate, status_id)
-                response.status = 201
-                return jsend.success(data={"id": task_id})
-        else:
-            response.status = 405
-            return jsend.error(message="POST on task_id not possible")
-    except sqlite3.Error as e:
-        logger.error(f"exception {type(e).__name__} in task_post({task_id})")
-        response.status = 500
-        return jsend.error(message="POST task failed", code=type(e).__name__, data=str(e))
-
-
-@app.delete("/task")
-@app.delete("/task/<task_id:int>")
-def task_delete(task_id=None):
-    """ Delete a single task. Deleting all tasks is not supported.
-
-    :return: JSend compliant object with key 'data' containing the content of the deleted task
-
-    response status code:
-        200 OK - task deleted successfully, response JSend object contains deleted tasks content
-        404 Not Found - task task_id not found, response message contains error
-        405 Method Not Allowed - delete on collection not supported
-        500 Server Internal Error - most likely database error, detailed error information in response JSend object
-    """
-    logger.info(f"request {request.method} {request.fullpath}")
-
-    response.headers["Content-Type"] = "application/json"
-    try:
-        if task_id is None:
-            response.status = 405
-            return jsend.error(message="DELETE on collection not supported")
-        else:
-            task = db.task.select(task_id)
-            if task is None:
-                response.status = 404
-                return jsend.fail(data=f"task {task_id} not found")
-            else:
-                db.task.delete(task_id)
-                response.status = 200
-                return jsend.success(data=dict(task))
-    except sqlite3.Error as e:
-        logger.error(f"exception {type(e).__name__} in task_delete({task_id})")
-        response.status = 500
-        return jsend.error(message="DELETE task failed", code=type(e).__name__, data=str(e))
-
-
-HOST = "127.0.0.10"
-PORT = 8080
-
-if __name__ == "__main__":
-    import os
-    import sys
-
-    logFile = os.path.splitext(os.path.basename(sys.argv[0]))[0] + ".log"
-
-    logHandler = logging.handlers.RotatingFileHandler(logFile,
-                                                      maxBytes=10000,
-                                                      backupCount=1)  # keeps 1 old file
-
-    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-                        datefmt="%Y-%m-%d %H:%M:%S",
-                        level=logging.NOTSET,
-                        handlers=[logHandler])
-
-    logging.disable(logging.DEBUG)  # Only show messages *above* this level
-
-    DBNAME = ":memory:"  # For persistent storage change to "todo.db"
-    SCRIPT = "todo.sql"
-
-    logger.info("start server")
-
-    try:
-        is_new_database = False
-        logger.info(f"connect to database {DBNAME}")
-        db.connect(DBNAME)
-        if db.name() == ":memory:":
-            is_new_database = True
-    except FileNotFoundError as e:
-        logger.info(f"database {DBNAME} does not exist, creating new one")
-        try:
-            db.create(DBNAME)
-            is_new_database = True
-        except Exception as e:
-            logger.exception(f"exception {type(e).__name__} while creating database {DBNAME}")
-    except Exception as e:
-        logger.exception(f"exception {type(e).__name__} while connecting to database {DBNAME}")
-    else:
-        if is_new_database:
-            logger.info(f"initializing database {DBNAME} using DDL script {SCRIPT}")
-            try:
-                with open(SCRIPT) as file:
-                    db.executescript(file.read())
-            except Exception as e:
-                logger.exception(f"exception {type(e).__name__} while initializing database {DBNAME}")
-
-        app.run(host=HOST, port=PORT)
+""" Web service for a manipulating tasks in a todo-list.
+
+For every possible request a handler is defined. The task id (if relevant) is part
+of the request URL. Additional data is sent as JSON in the request message body.
+Data is returned to the caller as part of the 'data' key in a JSend compliant JSON
+structure.
+
+The database with the todo tasks is accessed via calls to db.task.py
+Before starting the server a connection to a database must be opened.
+By default an in-memory database is used which is initialized every time
+the server is started, use --db for a database file. Database connections
+come from a pool in db.sqlite and are returned after every request, so the
+requests can run in threads of their own (see ThreadingWSGIServer), which
+long-poll and streaming requests for changes need.
+
+To use more than one processor core start several worker processes (see prefork.py,
+not on Windows), which all serve the same database file: > python server.py --db todo.db --workers 4
+Every worker has its own connections and response caches. A worker finds out that another
+one changed the tasks via PRAGMA data_version, see check_external_changes().
+
+Start the server via the terminal: > start python server.py [--db todo.db]
+"""
+import base64
+import json
+import logging.handlers
+import os
+import random
+import socketserver
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from wsgiref.simple_server import WSGIServer
+
+from bottle import Bottle, http_date, parse_date, request, response
+
+import cache
+import db
+import jsend
+import logqueue
+import metrics
+import transfer
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger(f"{__name__}.access")  # one record per request, see log_access()
+
+app = Bottle()
+
+DEFAULT_LIMIT = 100  # page size when paging through tasks without an explicit limit
+MAX_LIMIT = 1000
+STREAM_CHUNKSIZE = 500  # number of tasks fetched from the database and sent per chunk when streaming
+BODY_SAMPLE_RATE = 0.01  # fraction of request bodies which is logged
+MAX_WAIT = 60  # maximum number of seconds a long-poll request for changes waits
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments on an idle change stream
+SSE_DURATION = 300  # seconds after which a change stream is closed, the client reconnects using Last-Event-ID
+CHANGE_LOG_MAX_AGE = 7 * 24 * 3600  # changes older than this number of seconds are compacted
+MAX_IMPORT_ERRORS = 100  # number of failed tasks reported in detail in the response of an import
+PRAGMAS = "default"  # database performance profile, a name in db.PROFILES or a dict with PRAGMA settings
+CHANGE_POLL_INTERVAL = 1  # seconds between checks for changes made by other worker processes
+
+# Serialized JSend responses of GET /task/<task_id> by task_id and of GET /task by query parameters
+task_cache = cache.LRUCache(max_entries=10000, max_bytes=32 * 1024 * 1024)
+page_cache = cache.LRUCache(max_entries=1000, max_bytes=32 * 1024 * 1024)
+
+
+def invalidate_cache(task_id):
+    """ Remove a changed task from the caches, task_id None means any task may have changed. """
+    if task_id is None:
+        task_cache.clear()
+    else:
+        task_cache.invalidate(task_id)
+    page_cache.clear()  # a change to a single task can affect any page
+
+
+db.task.listeners.append(invalidate_cache)
+
+# Requests waiting for changes sleep on change_condition, change_count is incremented on every change
+change_condition = threading.Condition()
+change_count = 0
+
+
+def notify_change(task_id):
+    """ Wake up the requests waiting for changes. """
+    global change_count
+
+    with change_condition:
+        change_count += 1
+        change_condition.notify_all()
+
+
+def wait_for_change(seen, timeout):
+    """ Wait until a change after change_count was seen, return False on timeout. """
+    with change_condition:
+        return change_condition.wait_for(lambda: change_count != seen, timeout)
+
+
+db.task.listeners.append(notify_change)
+
+revision_seen = None  # revision of table task when check_external_changes() last cleared the caches
+revision_lock = threading.Lock()
+
+
+def check_external_changes():
+    """ Clear the caches and wake up the requests waiting for changes when another process changed the tasks.
+
+    Only needed when several processes serve the same database. Checking PRAGMA data_version reads
+    nothing from the database, only when it changed the revision of table task is read. As changes
+    made via other connections of this process also change the data_version, the caches are only
+    cleared when the revision differs from the one at the previous clear.
+    """
+    global revision_seen
+
+    if not db.changed():
+        return
+    revision = db.task.revision()
+    with revision_lock:
+        if revision == revision_seen:
+            return
+        revision_seen = revision
+    invalidate_cache(None)
+    notify_change(None)
+
+
+def check_external_changes_hook():
+    """ Before every request: make sure the caches do not hold tasks changed by another process. """
+    try:
+        check_external_changes()
+    except sqlite3.Error as e:
+        logger.error("exception %s while checking for external changes: %s", type(e).__name__, e)
+        invalidate_cache(None)
+
+
+def watch_external_changes(interval=CHANGE_POLL_INTERVAL):
+    """ Check for changes made by other processes every interval seconds, runs in a daemon thread.
+
+    Wakes up the requests waiting for changes also when this process receives no other requests.
+    """
+    while True:
+        time.sleep(interval)
+        try:
+            with db.pooled():
+                check_external_changes()
+        except Exception as e:
+            logger.exception("exception %s while watching for external changes", type(e).__name__)
+
+
+def encode_cursor(sort, key):
+    """ Convert the sort key of the last task on a page to an opaque cursor string. """
+    cursor = json.dumps([sort, *key], default=jsend.json_serialize, separators=(",", ":"))
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(sort, cursor, length):
+    """ Convert an opaque cursor string back to a sort key.
+
+    :param int length: number of values in the sort key
+    :raises: ValueError - cursor is invalid or was created for a different sort order
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(key, list) or not key or key[0] != sort:
+        raise ValueError("cursor does not match sort order")
+    if len(key) != length + 1 or not all(isinstance(value, (str, int, float)) for value in key[1:]):
+        raise ValueError("invalid cursor")
+    return tuple(key[1:])
+
+
+def task_etag(task):
+    """ Return the strong entity tag for a task, which changes whenever the task is updated. """
+    return f'"{task["id"]}-{task["version"]}"'
+
+
+def collection_etag(revision):
+    """ Return the strong entity tag for the task collection at a revision of table task. """
+    return f'"r{revision}"'
+
+
+def parse_etags(header):
+    """ Split an If-Match or If-None-Match header into a list of (is_weak, entity tag) tuples. """
+    etags = []
+    for etag in header.split(","):
+        etag = etag.strip()
+        if etag.startswith("W/"):
+            etags.append((True, etag[2:]))
+        elif etag:
+            etags.append((False, etag))
+    return etags
+
+
+def not_modified(etag, last_modified=None):
+    """ Evaluate If-None-Match and If-Modified-Since of a GET request.
+
+    :param str etag: current entity tag of the resource
+    :param int last_modified: current modification time of the resource in seconds since the epoch
+    :return bool: True if the client's copy is still valid and 304 Not Modified can be returned
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:  # takes precedence over If-Modified-Since
+        return if_none_match.strip() == "*" or etag in (tag for _, tag in parse_etags(if_none_match))
+    if last_modified is not None:
+        if_modified_since = parse_date(request.headers.get("If-Modified-Since", ""))
+        return if_modified_since is not None and last_modified <= if_modified_since
+    return False
+
+
+def if_match_version(task_id):
+    """ Extract the task version from the If-Match header of a PUT or DELETE request.
+
+    :return: None if there is no If-Match header or it is *, False if none of the
+             entity tags refers to task_id, otherwise the version of the task
+    """
+    if_match = request.headers.get("If-Match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    for is_weak, etag in parse_etags(if_match):  # If-Match uses strong comparison
+        if not is_weak and etag.startswith(f'"{task_id}-'):
+            try:
+                return int(etag[len(f'"{task_id}-'):-1])
+            except ValueError:
+                pass
+    return False
+
+
+def page_parameters(query):
+    """ Extract and validate the paging, filter and sort parameters for GET /task.
+
+    :param bottle.FormsDict query: request query parameters
+    :return dict: keyword arguments for db.task.select_page()
+    :raises: ValueError - invalid parameter value
+    """
+    parameters = dict(sort=query.get("sort", "id"))
+
+    if parameters["sort"].lstrip("-") not in db.task.SORT_KEYS:
+        raise ValueError(f"invalid sort order {parameters['sort']}")
+
+    if "limit" in query:
+        try:
+            limit = int(query.limit)
+        except ValueError:
+            raise ValueError(f"invalid limit {query.limit}")
+        if not 0 < limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+        parameters["limit"] = limit
+
+    if "after" in query:
+        parameters["after"] = decode_cursor(parameters["sort"], query.after,
+                                            len(db.task.SORT_KEYS[parameters["sort"].lstrip("-")]))
+        parameters.setdefault("limit", DEFAULT_LIMIT)
+
+    if "status_id" in query:
+        parameters["status_id"] = query.status_id
+
+    if "format" in query:
+        if query.format not in ("rows", "columns"):
+            raise ValueError(f"invalid format {query.format}, use rows or columns")
+        if query.format == "columns":
+            parameters["columnar"] = True
+
+    for name in ("duedate_from", "duedate_to"):
+        if name in query:
+            try:
+                datetime.strptime(query[name], "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"invalid {name} {query[name]}, use YYYY-MM-DD")
+            parameters[name] = query[name]
+
+    return parameters
+
+
+class TransactionPlugin:
+    """ Bottle plugin which runs a request handler in a single database transaction.
+
+    Applies to the routes declared with transaction=True. All statements of the handler are committed
+    together when it returns, and rolled back on an exception or a 5xx response, which the handlers
+    return on a sqlite3.Error. The request body is read before the transaction starts, so a slow client
+    does not hold the write lock. A request which found the database locked is retried.
+    """
+    name = "transaction"
+    api = 2
+
+    def apply(self, callback, route):
+        if not route.config.get("transaction"):
+            return callback
+
+        def transact(args, kwargs):
+            with db.transaction():
+                result = callback(*args, **kwargs)
+                if response.status_code >= 500:
+                    db.rollback()
+            return result
+
+        def wrapper(*args, **kwargs):
+            request.body  # noqa - reads and buffers the body
+            try:
+                return db.retry_busy(transact, args, kwargs)
+            except sqlite3.Error as e:
+                logger.error("exception %s in transaction of %s %s", type(e).__name__, request.method, request.fullpath)
+                response.status = 500
+                response.headers["Content-Type"] = "application/json"
+                return jsend.error(message=f"{request.method} failed", code=type(e).__name__, data=str(e))
+
+        return wrapper
+
+
+app.install(TransactionPlugin())
+
+
+@app.hook("after_request")
+def release_connection():
+    """ Return the database connection used by the request to the pool. """
+    db.release()
+
+
+@app.hook("before_request")
+def start_timer():
+    request.environ["todo.start"] = time.perf_counter()
+
+
+@app.hook("after_request")
+def log_access():
+    """ Log method, path, status and duration of the request via access_logger. """
+    if access_logger.isEnabledFor(logging.INFO):
+        milliseconds = (time.perf_counter() - request.environ["todo.start"]) * 1000
+        access_logger.info("%s %s %d", request.method, request.fullpath, response.status_code,
+                           extra={"fields": {"method": request.method, "path": request.fullpath,
+                                             "query": request.query_string, "status": response.status_code,
+                                             "duration_ms": round(milliseconds, 3),
+                                             "remote_addr": request.remote_addr}})
+
+
+def log_body():
+    """ Log the JSON body of a sample of the requests. """
+    if BODY_SAMPLE_RATE and random.random() < BODY_SAMPLE_RATE and logger.isEnabledFor(logging.INFO):
+        logger.info("JSON %s", request.json)
+
+
+def stream_tasks(parameters):
+    """ Generate the JSend response for a streamed task collection.
+
+    Runs after the request handler returned, so it checks out its own connection.
+    """
+    with db.pooled():
+        yield from jsend.success_stream(db.task.iterate(**parameters, arraysize=STREAM_CHUNKSIZE, raw=True),
+                                        chunksize=STREAM_CHUNKSIZE)
+
+
+@app.get("/task")
+@app.get("/task/<task_id:int>")
+def task_get(task_id=None):
+    """ Fetch a single task or fetch all tasks.
+
+    Responses carry an ETag (and for a single task a Last-Modified) header. Conditional
+    requests using If-None-Match or If-Modified-Since are answered with 304 Not Modified
+    without serializing the task(s) when the client's copy is still current. The
+    collection has no Last-Modified header as deleting a task does not change the
+    highest modification time.
+
+    The collection can be filtered, sorted and paged via query parameters:
+        status_id - only tasks with this status
+        duedate_from, duedate_to - only tasks due within this date range (YYYY-MM-DD, inclusive)
+        sort - id, -id, duedate, -duedate, modified or -modified (default id)
+        limit - maximum number of tasks per page (1..MAX_LIMIT)
+        after - cursor as returned in 'next' by the previous page
+        total - when 1 and paging 'data' also contains the 'total' number of tasks matching the filters
+        format - rows (default) for a list of task objects, or columns for a single object
+                 with a list of values per field: {"id": [1, 2], "summary": ["a", "b"], ...}
+                 which is smaller and faster to produce for large collections
+        stream - when 1 and not paging the list of tasks is streamed to the client while it
+                 is read from the database; errors which occur after the first byte has
+                 been sent result in a truncated (invalid) JSON document (not for format columns)
+
+    :return: JSend compliant object with key 'data' containing a single or a list of tasks,
+             when paging (limit or after specified) 'data' contains an object with a list
+             of 'tasks' and the cursor for the 'next' page (null on the last page), and when
+             requested the 'total' number of tasks
+
+    response status code:
+        200 OK - response JSend object  contains task(s) content
+        304 Not Modified - task(s) not changed since the client fetched them
+        400 Bad Request - invalid query parameter
+        404 Not Found - task task_id not found, response JSend object contains error
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    response.headers["Cache-Control"] = "no-cache"
+    try:
+        if task_id is None:
+            try:
+                parameters = page_parameters(request.query)
+            except ValueError as e:
+                response.status = 400
+                return jsend.fail(data=str(e))
+            etag = collection_etag(db.task.revision())
+            response.headers["ETag"] = etag
+            if not_modified(etag):
+                response.status = 304
+                return ""
+            if "limit" not in parameters and "columnar" not in parameters and request.query.get("stream") == "1":
+                response.status = 200
+                return stream_tasks(parameters)
+            total = "limit" in parameters and request.query.get("total") == "1"
+            cache_key = tuple(sorted(parameters.items())) + (("total", total),)
+            generation = page_cache.generation
+            body = page_cache.get(cache_key)
+            if body is None:
+                tasks, key = db.task.select_page(**parameters, raw=True)
+                if "limit" in parameters:
+                    next_cursor = None if key is None else encode_cursor(parameters["sort"], key)
+                    data = {"tasks": tasks, "next": next_cursor}
+                    if total:
+                        data["total"] = db.task.count(parameters.get("status_id"), parameters.get("duedate_from"),
+                                                      parameters.get("duedate_to"))
+                    body = jsend.success(data=data)
+                else:
+                    body = jsend.success(data=tasks)
+                page_cache.put(cache_key, body, generation=generation)
+            response.status = 200
+            return body
+        else:
+            generation = task_cache.generation
+            entry = task_cache.get(task_id)
+            if entry is None:
+                task = db.task.select(task_id, raw=True)
+                if task is None:
+                    response.status = 404
+                    return jsend.fail(data=f"task {task_id} not found")
+                etag = task_etag(task)
+                last_modified = None
+                if task["modified"] is not None:
+                    last_modified = int(datetime.fromisoformat(task["modified"]).timestamp())
+                body = None  # only serialize when the client's copy turns out to be outdated
+            else:
+                body, etag, last_modified = entry
+            response.headers["ETag"] = etag
+            if last_modified is not None:
+                response.headers["Last-Modified"] = http_date(last_modified)
+            if not_modified(etag, last_modified):
+                response.status = 304
+                return ""
+            if body is None:
+                body = jsend.success(data=task)
+                task_cache.put(task_id, (body, etag, last_modified), size=len(body), generation=generation)
+            response.status = 200
+            return body
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_get(%s)", type(e).__name__, task_id)
+        response.status = 500
+        return jsend.error(message="GET task failed", code=type(e).__name__, data=str(e))
+
+
+@app.get("/task/_search")
+def task_search():
+    """ Full-text search in the summary and description of the tasks, best match first.
+
+    Query parameters:
+        q - FTS5 query, e.g. python, "rubber duck", pyth*, python AND (book OR website)
+        limit - maximum number of tasks per page (1..MAX_LIMIT, default db.task.DEFAULT_SEARCH_LIMIT)
+        after - cursor as returned in 'next' by the previous page
+
+    :return: JSend compliant object with key 'data' containing an object with a list of 'tasks'
+             and the cursor for the 'next' page (null on the last page). Every task has the
+             extra fields rank, summary_highlight and description_snippet in which the matched
+             terms are marked with db.task.HIGHLIGHT.
+
+    response status code:
+        200 OK - response JSend object contains the matching tasks
+        400 Bad Request - missing or invalid query parameter
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        try:
+            query = request.query.getunicode("q", "").strip()
+            if not query:
+                raise ValueError("missing search query q")
+            limit = int(request.query.get("limit", db.task.DEFAULT_SEARCH_LIMIT))
+            if not 0 < limit <= MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+            after = decode_cursor("search", request.query.after, 2) if "after" in request.query else None
+            tasks, key = db.task.search(query, limit, after, raw=True)
+        except ValueError as e:
+            response.status = 400
+            return jsend.fail(data=str(e))
+        next_cursor = None if key is None else encode_cursor("search", key)
+        response.status = 200
+        return jsend.success(data={"tasks": tasks, "next": next_cursor})
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_search()", type(e).__name__)
+        response.status = 500
+        return jsend.error(message="search task failed", code=type(e).__name__, data=str(e))
+
+
+def sse_event(change):
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (change["seq"], jsend.dumps(change))
+
+
+def stream_changes(since, limit):
+    """ Generate a Server-Sent Events stream with an event per change after sequence number since.
+
+    Runs after the request handler returned, so it checks out its own connection when reading
+    changes. The stream ends after SSE_DURATION seconds or when the changes were compacted.
+    """
+    deadline = time.monotonic() + SSE_DURATION
+    yield b"retry: 1000\n\n"
+    while True:
+        seen = change_count
+        try:
+            with db.pooled():
+                changes = db.task.changes(since, limit)
+        except db.task.ErrorChangesCompacted as e:
+            yield b"event: compacted\ndata: %s\n\n" % jsend.dumps(str(e))
+            return
+        for change in changes:
+            yield sse_event(change)
+        if changes:
+            since = changes[-1]["seq"]
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if len(changes) < limit and not wait_for_change(seen, min(SSE_HEARTBEAT, remaining)):
+            yield b": keep-alive\n\n"
+
+
+@app.get("/task/_changes")
+def task_changes():
+    """ Fetch the changes to tasks after a sequence number, to keep a copy of the tasks in sync.
+
+    Every insert, update and delete of a task is logged with an increasing sequence number.
+    To follow the changes first request the current sequence number (without since), then
+    fetch all tasks via GET /task, and from then on request the changes since the last seen
+    sequence number. Every change contains the current content of the task (null if it was
+    deleted), so applying a change twice does no harm.
+
+    Query parameters:
+        since - sequence number of the last change seen
+        limit - maximum number of changes per response (1..MAX_LIMIT, default db.task.DEFAULT_CHANGES_LIMIT)
+        wait - long-poll: when there are no changes wait at most this number of seconds (0..MAX_WAIT)
+               for the next change before responding
+        stream - when sse (or the Accept header is text/event-stream) respond with a stream of
+                 Server-Sent Events, one event 'change' per change with the sequence number as
+                 event id. A reconnecting client continues after its Last-Event-ID. The stream
+                 needs a thread of a multi-threaded server for its whole duration.
+
+    :return: JSend compliant object with key 'data' containing an object with the list of
+             'changes' and the sequence number of the 'last' change to pass as since next time
+
+    response status code:
+        200 OK - response JSend object contains the changes
+        400 Bad Request - invalid query parameter
+        410 Gone - the changes after since were compacted, fetch all tasks and follow the changes again
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    response.headers["Cache-Control"] = "no-cache"
+    try:
+        try:
+            since = request.headers.get("Last-Event-ID", request.query.get("since"))
+            if since is not None and (not since.isdigit() or int(since) < 0):
+                raise ValueError(f"invalid since {since}, must be a sequence number")
+            since = None if since is None else int(since)
+            limit = int(request.query.get("limit", db.task.DEFAULT_CHANGES_LIMIT))
+            if not 0 < limit <= MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+            wait = float(request.query.get("wait", 0))
+            if not 0 <= wait <= MAX_WAIT:
+                raise ValueError(f"wait must be between 0 and {MAX_WAIT}")
+        except ValueError as e:
+            response.status = 400
+            return jsend.fail(data=str(e))
+
+        if request.query.get("stream") == "sse" or "text/event-stream" in request.headers.get("Accept", ""):
+            response.headers["Content-Type"] = "text/event-stream"
+            response.headers["X-Accel-Buffering"] = "no"  # tell proxies not to buffer the stream
+            response.status = 200
+            return stream_changes(db.task.last_change() if since is None else since, limit)
+
+        if since is None:
+            response.status = 200
+            return jsend.success(data={"changes": [], "last": db.task.last_change()})
+
+        deadline = time.monotonic() + wait
+        seen = change_count
+        changes = db.task.changes(since, limit)
+        while not changes and time.monotonic() < deadline:
+            db.release()  # do not keep a connection while waiting
+            if not wait_for_change(seen, deadline - time.monotonic()):
+                break
+            seen = change_count
+            changes = db.task.changes(since, limit)
+
+        response.status = 200
+        return jsend.success(data={"changes": changes, "last": changes[-1]["seq"] if changes else since})
+    except db.task.ErrorChangesCompacted as e:
+        response.status = 410
+        return jsend.fail(data=str(e))
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_changes()", type(e).__name__)
+        response.status = 500
+        return jsend.error(message="GET changes failed", code=type(e).__name__, data=str(e))
+
+
+@app.put("/task")
+@app.put("/task/<task_id:int>", transaction=True)
+def task_put(task_id=None):
+    """ Update a single task. Updating all tasks not supported.
+
+    When an If-Match header with the task's ETag is sent the task is only updated if it
+    was not changed in the meantime. The task is updated and read back in one statement,
+    only when it was not updated the task is looked up to report the right error.
+
+    :return: JSend compliant object with key 'data' containing the updated task
+
+    response status code:
+        200 OK - task updated successfully, response JSend object contains the task, the ETag header its new ETag
+        400 Bad Request - no JSON content in request
+        404 Not Found - task task_id not found, response JSend object contains error
+        405 Method Not Allowed - PUT on collection not supported
+        412 Precondition Failed - task was changed since the ETag in If-Match was obtained
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+    log_body()
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        if task_id is None:
+            response.status = 405
+            return jsend.error(message="PUT on collection not supported")
+        version = if_match_version(task_id)
+        if version is False:
+            response.status = 412
+            return jsend.fail(data=f"task {task_id} does not match If-Match")
+        data = request.json
+        if data is None:
+            response.status = 400
+            return jsend.fail(data="no JSON content")
+        summary = data["summary"] if "summary" in data else None
+        description = data["description"] if "description" in data else None
+        duedate = data["duedate"] if "duedate" in data else None
+        status_id = data["status_id"] if "status_id" in data else None
+        task = db.task.update(task_id, summary, description, duedate, status_id, version=version, returning=True)
+        if task is None:
+            if version is not None and db.task.select(task_id, raw=True) is not None:
+                response.status = 412
+                return jsend.fail(data=f"task {task_id} does not match If-Match")
+            response.status = 404
+            return jsend.fail(data=f"task {task_id} not found")
+        response.status = 200
+        response.headers["ETag"] = task_etag(task)
+        return jsend.success(data=task)
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_put(%s)", type(e).__name__, task_id)
+        response.status = 500
+        return jsend.error(message="PUT task failed", code=type(e).__name__, data=str(e))
+
+
+@app.post("/task")
+@app.post("/task/<task_id:int>")
+def task_post(task_id=None):
+    """ Insert a new task.
+
+    :return: JSend compliant object with key 'data' containing the task_id of newly created task
+
+    response status code:
+        201 Created - task inserted, response JSend object contains new task task_id
+        400 Bad Request - no JSON content in request
+        405 Method Not Allowed - insert with predefined task_id not possible
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+    log_body()
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        if task_id is None:
+            data = request.json
+            if data is None:
+                response.status = 400
+                return jsend.fail(data="no JSON content")
+            else:
+                summary = data["summary"] if "summary" in data else None
+                description = data["description"] if "description" in data else None
+                duedate = data["duedate"] if "duedate" in data else None
+                status_id = data["status_id"] if "status_id" in data else None
+                task_id = db.task.insert(summary, description, duedate, status_id)
+                response.status = 201
+                return jsend.success(data={"id": task_id})
+        else:
+            response.status = 405
+            return jsend.error(message="POST on task_id not possible")
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_post(%s)", type(e).__name__, task_id)
+        response.status = 500
+        return jsend.error(message="POST task failed", code=type(e).__name__, data=str(e))
+
+
+@app.delete("/task")
+@app.delete("/task/<task_id:int>", transaction=True)
+def task_delete(task_id=None):
+    """ Delete a single task. Deleting all tasks is not supported.
+
+    When an If-Match header with the task's ETag is sent the task is only deleted if it
+    was not changed in the meantime. The task is deleted and read in one statement.
+
+    :return: JSend compliant object with key 'data' containing the content of the deleted task
+
+    response status code:
+        200 OK - task deleted successfully, response JSend object contains deleted tasks content
+        404 Not Found - task task_id not found, response message contains error
+        405 Method Not Allowed - delete on collection not supported
+        412 Precondition Failed - task was changed since the ETag in If-Match was obtained
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        if task_id is None:
+            response.status = 405
+            return jsend.error(message="DELETE on collection not supported")
+        version = if_match_version(task_id)
+        if version is False:
+            response.status = 412
+            return jsend.fail(data=f"task {task_id} does not match If-Match")
+        task = db.task.delete(task_id, version=version, returning=True)
+        if task is None:
+            if version is not None and db.task.select(task_id, raw=True) is not None:
+                response.status = 412
+                return jsend.fail(data=f"task {task_id} does not match If-Match")
+            response.status = 404
+            return jsend.fail(data=f"task {task_id} not found")
+        response.status = 200
+        return jsend.success(data=task)
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_delete(%s)", type(e).__name__, task_id)
+        response.status = 500
+        return jsend.error(message="DELETE task failed", code=type(e).__name__, data=str(e))
+
+
+def bulk_items():
+    """ Return an iterator over the (index, item) pairs in the body of a bulk request.
+
+    The body is either a JSON array or, when the Content-Type is application/x-ndjson,
+    one JSON value per line. NDJSON is parsed while it is being iterated, a line with
+    invalid JSON is returned as an item of type ValueError.
+
+    :raises: ValueError - body is not a valid JSON array
+    """
+    if request.content_type.startswith("application/x-ndjson"):
+        def ndjson():
+            index = 0
+            for line in request.body:
+                line = line.strip()
+                if line:
+                    try:
+                        yield index, json.loads(line)
+                    except ValueError as e:
+                        yield index, ValueError(f"invalid JSON: {e}")
+                    index += 1
+        return ndjson()
+
+    items = json.load(request.body)
+    if not isinstance(items, list):
+        raise ValueError("expected a JSON array or NDJSON")
+    return enumerate(items)
+
+
+def task_object(item):
+    if not isinstance(item, dict):
+        raise ValueError("task must be a JSON object")
+    return item
+
+
+def task_object_with_id(item):
+    if not isinstance(item, dict) or type(item.get("id")) is not int:
+        raise ValueError("task must be a JSON object with an integer id")
+    return item
+
+
+def task_id_of(item):
+    if isinstance(item, dict):
+        item = item.get("id")
+    if type(item) is not int:
+        raise ValueError("task must be an integer id or a JSON object with an integer id")
+    return item
+
+
+def bulk(operation, validate, description):
+    """ Apply a bulk operation on the tasks in the request body in a single transaction.
+
+    :param function operation: db.task.insert_many, update_many or delete_many
+    :param function validate: returns the value to pass to operation for a request item, raises ValueError if invalid
+    :param str description: operation name for error messages
+    :return: JSend compliant object with key 'data' containing a JSend object per item
+    """
+    try:
+        batch_size = int(request.query.get("batch_size", db.task.BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        items = bulk_items()
+    except ValueError as e:
+        response.status = 400
+        return jsend.fail(data=str(e))
+
+    invalid = {}  # index: error message, for items which are not passed to the database
+    keys = []  # value of every item passed to the database, in the same order as the results
+
+    def valid_items():
+        for index, item in items:
+            try:
+                if isinstance(item, ValueError):
+                    raise item
+                value = validate(item)
+            except ValueError as e:
+                invalid[index] = str(e)
+            else:
+                keys.append(value)
+                yield value
+
+    results = operation(valid_items(), batch_size)
+
+    data = []
+    values = iter(zip(keys, results))
+    for index in range(len(invalid) + len(results)):
+        if index in invalid:
+            data.append({"status": jsend.FAIL, "data": invalid[index]})
+            continue
+        value, result = next(values)
+        if isinstance(result, sqlite3.Error):
+            data.append({"status": jsend.ERROR, "message": f"{description} failed",
+                         "code": type(result).__name__, "data": str(result)})
+        elif result is False:
+            data.append({"status": jsend.FAIL, "data": f"task {task_id_of(value)} not found"})
+        elif result is True:
+            data.append({"status": jsend.SUCCESS, "data": {"id": task_id_of(value)}})
+        else:
+            data.append({"status": jsend.SUCCESS, "data": {"id": result}})
+
+    response.status = 200
+    return jsend.success(data=data)
+
+
+@app.post("/task/_bulk")
+def task_post_bulk():
+    """ Insert many tasks in a single transaction.
+
+    The request body is a JSON array of tasks, or NDJSON (Content-Type application/x-ndjson)
+    with one task per line. Query parameter batch_size sets the number of tasks per
+    database call (default db.task.BATCH_SIZE).
+
+    :return: JSend compliant object with key 'data' containing a JSend object per task, in
+             the order of the request, with the id of the new task when successful
+
+    response status code:
+        200 OK - request processed, see the result per task
+        400 Bad Request - body is not a JSON array or NDJSON, or invalid batch_size
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        return bulk(db.task.insert_many, task_object, "POST task")
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_post_bulk()", type(e).__name__)
+        response.status = 500
+        return jsend.error(message="POST task bulk failed", code=type(e).__name__, data=str(e))
+
+
+@app.put("/task/_bulk")
+def task_put_bulk():
+    """ Update many tasks in a single transaction.
+
+    Like POST /task/_bulk, every task must contain its id.
+
+    :return: JSend compliant object with key 'data' containing a JSend object per task
+
+    response status code:
+        200 OK - request processed, see the result per task
+        400 Bad Request - body is not a JSON array or NDJSON, or invalid batch_size
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        return bulk(db.task.update_many, task_object_with_id, "PUT task")
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_put_bulk()", type(e).__name__)
+        response.status = 500
+        return jsend.error(message="PUT task bulk failed", code=type(e).__name__, data=str(e))
+
+
+@app.delete("/task/_bulk")
+def task_delete_bulk():
+    """ Delete many tasks in a single transaction.
+
+    Like POST /task/_bulk, every item is a task id or a task object containing its id.
+
+    :return: JSend compliant object with key 'data' containing a JSend object per task
+
+    response status code:
+        200 OK - request processed, see the result per task
+        400 Bad Request - body is not a JSON array or NDJSON, or invalid batch_size
+        500 Server Internal Error - most likely database error, detailed error information in response JSend object
+    """
+    logger.debug("request %s %s", request.method, request.fullpath)
+
+    response.headers["Content-Type"] = "application/json"
+    try:
+        return bulk(db.task.delete_many, task_id_of, "DELETE task")
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_delete_bulk()", type(e).__name__)
+        response.status = 500
+        return jsend.error(message="DELETE task bulk failed", code=type(e).__name__, data=str(e))
+
+
+def stream_export(format_):
+    """ Generate the export of all tasks.
+
+    Runs after the request handler returned, so it checks out its own connection.
+    """
+    with db.pooled():
+        yield from transfer.export_tasks(format_, STREAM_CHUNKSIZE)
+
+
+@app.get("/task/_export")
+def task_export():
+    """ Export all tasks in id order, streamed in NDJSON or CSV format.
+
+    query parameters:
+        format - ndjson (default) or csv
+
+    response status code:
+        200 OK
+        400 Bad Request - unknown format
+    """
+    format_ = request.query.get("format", "ndjson")
+    if format_ not in transfer.FORMATS:
+        response.headers["Content-Type"] = "application/json"
+        response.status = 400
+        return jsend.fail(data=f"unknown format {format_}, use {' or '.join(transfer.FORMATS)}")
+
+    response.status = 200
+    response.content_type = transfer.FORMATS[format_]
+    response.headers["Content-Disposition"] = f'attachment; filename="tasks.{format_}"'
+    return stream_export(format_)
+
+
+@app.post("/task/_import")
+def task_import():
+    """ Import tasks from an NDJSON or CSV stream, as produced by GET /task/_export.
+
+    Tasks keep their id, an existing task with the same id is replaced. Missing fields get
+    their default value. The body is read and imported in batches of batch_size tasks, each
+    in its own transaction, so a failed import can leave the batches before it imported.
+
+    query parameters:
+        format - ndjson or csv, default from the Content-Type (text/csv is csv, else ndjson)
+        batch_size - number of tasks per transaction
+
+    response status code:
+        200 OK - data contains the number of tasks imported and failed, and the first
+                 MAX_IMPORT_ERRORS failures with the index of the task (line or record) in the body
+        400 Bad Request - unknown format, invalid batch_size or invalid CSV header
+        500 Internal Server Error - database error
+    """
+    response.headers["Content-Type"] = "application/json"
+
+    format_ = request.query.get("format", "csv" if request.content_type.startswith("text/csv") else "ndjson")
+    try:
+        batch_size = int(request.query.get("batch_size", db.task.BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+    except ValueError as e:
+        response.status = 400
+        return jsend.fail(data=str(e))
+
+    errors = []
+    failed = 0
+
+    def on_error(index, error):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_IMPORT_ERRORS:
+            errors.append({"index": index, "message": str(error)})
+
+    def progress(count):
+        logger.info("import: %d tasks processed", count)
+
+    try:
+        imported = transfer.import_tasks(request.body, format_, batch_size, on_error, progress)
+    except ValueError as e:
+        response.status = 400
+        return jsend.fail(data=str(e))
+    except sqlite3.Error as e:
+        logger.error("exception %s in task_import()", type(e).__name__)
+        response.status = 500
+        return jsend.error(message="import failed", code=type(e).__name__, data=str(e))
+
+    response.status = 200
+    return jsend.success(data={"imported": imported, "failed": failed, "errors": errors})
+
+
+def checkpoint_wal():
+    """ Copy the WAL to the database file without blocking, so the WAL does not grow under sustained load. """
+    busy, wal_pages, checkpointed = db.checkpoint("PASSIVE")
+    logger.debug("checkpointed %d of %d WAL pages%s", checkpointed, wal_pages, ", blocked" if busy else "")
+
+
+def compact_change_log():
+    """ Remove old entries from the change log. """
+    logger.info("compacted %d changes", db.task.compact_changes(CHANGE_LOG_MAX_AGE))
+
+
+MAINTENANCE = {  # database maintenance task: interval in seconds
+    checkpoint_wal: 60,
+    db.optimize: 3600,
+    compact_change_log: 3600,
+}
+
+
+def maintain_database(tasks=None):
+    """ Run every maintenance task at its interval, runs in a daemon thread.
+
+    :param dict tasks: function: interval in seconds, default MAINTENANCE
+    """
+    tasks = tasks or MAINTENANCE
+    due = {task: time.monotonic() + interval for task, interval in tasks.items()}
+    while True:
+        task = min(due, key=due.get)
+        time.sleep(max(0.0, due[task] - time.monotonic()))
+        try:
+            with db.pooled():
+                task()
+        except Exception as e:
+            logger.exception("exception %s in database maintenance task %s", type(e).__name__, task.__name__)
+        due[task] = time.monotonic() + tasks[task]
+
+
+def open_database(dbname, script, pragmas=PRAGMAS, snapshot=None):
+    """ Connect to database dbname. An empty database is initialized using DDL script.
+
+    The schema of an existing database is only upgraded when its version (see db.schema) is
+    older than the current one, so opening a database with a current schema executes no DDL.
+
+    :param str dbname: database filename (created if it does not exist) or ":memory:"
+    :param str script: filename of the DDL script for a new database
+    :param pragmas: database performance profile, a name in db.PROFILES or a dict with PRAGMA settings
+    :param str snapshot: for ":memory:" restore the database from this snapshot file if it exists
+    :return bool: True if connected to the database
+    """
+    try:
+        logger.info("connect to database %s", dbname)
+        db.connect(dbname, pragmas=pragmas, create=True)
+    except Exception as e:
+        logger.exception("exception %s while connecting to database %s", type(e).__name__, dbname)
+        return False
+
+    try:
+        if dbname == ":memory:" and snapshot is not None and os.path.exists(snapshot):
+            start = time.perf_counter()
+            db.restore(snapshot)
+            logger.info("restored database from snapshot %s in %.1f s", snapshot, time.perf_counter() - start)
+
+        if db.schema.is_empty():
+            logger.info("initializing database %s using DDL script %s", dbname, script)
+            db.schema.initialize(script)
+
+        version = db.schema.upgrade()
+        if version == db.schema.VERSION:
+            logger.info("database %s schema version %d", dbname, version)
+        else:
+            logger.info("database %s schema version %d, upgraded from %d", dbname, db.schema.version(), version)
+    except Exception as e:
+        logger.exception("exception %s while initializing database %s", type(e).__name__, dbname)
+        db.close()
+        return False
+
+    try:
+        logger.info("compacted %d changes in database %s", db.task.compact_changes(CHANGE_LOG_MAX_AGE), dbname)
+    except Exception as e:
+        logger.exception("exception %s while compacting change log of %s", type(e).__name__, dbname)
+
+    try:
+        settings = ", ".join(f"{pragma}={value}" for pragma, value in db.settings().items())
+        logger.info("database %s settings: %s", dbname, settings)
+    except sqlite3.Error as e:
+        logger.error("cannot read settings of database %s: %s - %s", dbname, type(e).__name__, e)
+
+    db.release()  # return the connection of the main thread to the pool before serving requests
+
+    return True
+
+
+def snapshot_database(filename):
+    """ Return a maintenance task which writes a snapshot of the database to filename. """
+
+    def snapshot():
+        start = time.perf_counter()
+        db.snapshot(filename)
+        logger.info("wrote snapshot %s in %.1f s", filename, time.perf_counter() - start)
+
+    return snapshot
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    """ WSGI server which handles every request in a thread of its own.
+
+    Needed for the long-poll and Server-Sent Events requests for changes, which would otherwise
+    block all other requests, including the writes they are waiting for, until they time out.
+    """
+    daemon_threads = True  # do not wait for open change streams when stopping
+
+
+HOST = "127.0.0.10"
+PORT = 8080
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    import prefork
+
+    parser = argparse.ArgumentParser(description="RESTful web service for a todo list")
+    parser.add_argument("--db", default=":memory:", help="database file, created if it does not exist "
+                                                         "(default: :memory:)")
+    parser.add_argument("--script", default="todo.sql", help="DDL script for a new database (default: todo.sql)")
+    parser.add_argument("--profile", default=PRAGMAS, choices=db.PROFILES, help="database performance profile")
+    parser.add_argument("--snapshot", help="snapshot file, an in-memory database is restored from it at start "
+                                           "and written to it at exit")
+    parser.add_argument("--snapshot-interval", type=int, default=300, help="seconds between snapshots (default: 300)")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes (default: 1), more "
+                                                               "than one requires a database file")
+    parser.add_argument("--group-commit", action="store_true", help="let concurrent writes share commits, "
+                                                                    "requires a database file")
+    parser.add_argument("--synchronous", default="NORMAL", choices=db.SYNCHRONOUS,
+                        help="PRAGMA synchronous for group commit (default: NORMAL)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.workers > 1 and args.db == ":memory:":
+        parser.error("--workers requires a database file (--db), an in-memory database cannot be shared")
+    if args.group_commit and args.db == ":memory:":
+        parser.error("--group-commit requires a database file (--db), the writer needs its own connection")
+
+    logName = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+
+    def log_handlers(name):
+        """ Return the handlers which write the log to name.log and the access log to name.access.log. """
+        logHandler = logging.handlers.RotatingFileHandler(f"{name}.log",
+                                                          maxBytes=1000000,
+                                                          backupCount=1)  # keeps 1 old file
+        logHandler.setFormatter(logging.Formatter(fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                                                  datefmt="%Y-%m-%d %H:%M:%S"))
+        logHandler.addFilter(lambda record: record.name != access_logger.name)
+
+        accessLogHandler = logging.handlers.RotatingFileHandler(f"{name}.access.log",
+                                                                maxBytes=1000000,
+                                                                backupCount=1)
+        accessLogHandler.setFormatter(logqueue.JSONFormatter())
+        accessLogHandler.addFilter(logging.Filter(access_logger.name))
+
+        return [logHandler, accessLogHandler]
+
+    logging.disable(logging.DEBUG)  # Only show messages *above* this level
+
+    metrics.install(app, caches={"task": task_cache, "page": page_cache})  # remove to skip measuring
+
+    maintenance = dict(MAINTENANCE)
+    if args.snapshot:
+        maintenance[snapshot_database(args.snapshot)] = args.snapshot_interval
+
+    if args.workers == 1:
+        # Request threads only put records on a queue, a background thread writes them to the files
+        logqueue.start(log_handlers(logName), level=logging.NOTSET)
+
+        logger.info("start server")
+
+        if open_database(args.db, args.script, args.profile, args.snapshot):
+            if args.group_commit:
+                db.start_group_commit(synchronous=args.synchronous)
+            threading.Thread(target=maintain_database, args=(maintenance,), name="maintenance", daemon=True).start()
+            app.run(host=args.host, port=args.port, server_class=ThreadingWSGIServer)
+            db.stop_group_commit()
+            if args.snapshot:
+                with db.pooled():
+                    snapshot_database(args.snapshot)()
+    else:
+        # The master writes its few records directly, a queue and its thread would not survive a fork
+        for handler in log_handlers(logName):
+            logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.NOTSET)
+
+        logger.info("start server with %d workers", args.workers)
+
+        def start_worker(number):
+            """ Give the worker its own log files and database connections.
+
+            The first worker also maintains the database.
+            """
+            global logListener
+            logListener = logqueue.start(log_handlers(f"{logName}.{number}"), level=logging.NOTSET)
+            db.connect(args.db, pragmas=args.profile)
+            if args.group_commit:
+                db.start_group_commit(synchronous=args.synchronous)
+            app.add_hook("before_request", check_external_changes_hook)
+            threading.Thread(target=watch_external_changes, name="watch", daemon=True).start()
+            if number == 1:
+                threading.Thread(target=maintain_database, args=(maintenance,), name="maintenance", daemon=True).start()
+
+        def stop_worker(number):
+            db.close()
+            logger.info("worker %d stopped", number)
+            logListener.stop()  # write the remaining records, the worker exits without running exit handlers
+
+        if open_database(args.db, args.script, args.profile):  # creates or upgrades the database once
+            db.close()  # the workers must not share the connections of the master
+            prefork.run(app, args.host, args.port, args.workers, start_worker, stop_worker)
+            if args.snapshot:
+                db.connect(args.db, pragmas=args.profile)
+                snapshot_database(args.snapshot)()
+                db.close()
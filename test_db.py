@@ -0,0 +1,573 @@
+""" Tests of the database layer (package db), transfer.py and the web service.
+
+No server needs to be running: the web service (server.app) is called in-process via call().
+
+Usage:
+    > python -m unittest test_db
+"""
+import base64
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from wsgiref.util import setup_testing_defaults
+
+import bottle
+
+import db
+import jsend
+import metrics
+import server
+import transfer
+from bench import plans
+from bench.load import seed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class NewDatabase(unittest.TestCase):
+    """ Base class for tests on an in-memory database initialized by todo.sql. """
+
+    def setUp(self):
+        db.connect(":memory:")
+        db.schema.initialize(os.path.join(HERE, "todo.sql"))
+
+    def tearDown(self):
+        db.close()
+
+
+class WebService(NewDatabase):
+    """ Base class for tests of the web service, the responses cached for the previous database are dropped. """
+
+    def setUp(self):
+        super().setUp()
+        server.invalidate_cache(None)
+
+
+class DatabaseFile(unittest.TestCase):
+    """ Base class for tests on a new database file initialized by todo.sql, with a pool of several connections. """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dbname = os.path.join(self.directory, "todo.db")
+        db.connect(self.dbname, pool_size=4, create=True)
+        db.schema.initialize(os.path.join(HERE, "todo.sql"))
+        db.release()
+
+    def tearDown(self):
+        db.close()
+        shutil.rmtree(self.directory)
+
+
+def call(method, path, body=None, headers=None, content_type="application/json", app=server.app):
+    """ Call the web service in-process.
+
+    :param body: sent as JSON, or as is if bytes
+    :param dict headers: request headers
+    :param str content_type: Content-Type of the body
+    :param bottle.Bottle app: application to call
+    :return tuple: (status code, response headers with lowercase names, JSON body as dict or None)
+    """
+    path, _, query = path.partition("?")
+    data = body if isinstance(body, bytes) else b"" if body is None else json.dumps(body).encode("utf-8")
+    environ = dict(REQUEST_METHOD=method, PATH_INFO=path, QUERY_STRING=query, CONTENT_TYPE=content_type,
+                   CONTENT_LENGTH=str(len(data)))
+    environ["wsgi.input"] = io.BytesIO(data)
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    setup_testing_defaults(environ)
+
+    started = []
+    content = b"".join(app(environ, lambda status, headers, exc_info=None: started.append((status, headers))))
+    status, headers = started[0]
+    headers = {name.lower(): value for name, value in headers}
+    if headers.get("content-type", "").startswith("application/json") and content:
+        return int(status.split()[0]), headers, json.loads(content)
+    return int(status.split()[0]), headers, None
+
+
+class TestUpgrade(unittest.TestCase):
+    """ Upgrade a copy of todo.db, which has the schema from before it was versioned. """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dbname = os.path.join(self.directory, "todo.db")
+        shutil.copy(os.path.join(HERE, "todo.db"), self.dbname)
+        db.connect(self.dbname)
+
+    def tearDown(self):
+        db.close()
+        shutil.rmtree(self.directory)
+
+    def test_upgrade(self):
+        self.assertEqual(db.schema.version(), 0)
+        self.assertEqual(db.schema.upgrade(), 0)
+        self.assertEqual(db.schema.version(), db.schema.VERSION)
+        self.assertEqual(db.schema.upgrade(), db.schema.VERSION)  # nothing left to do
+
+        task = db.task.select(1, raw=True)
+        self.assertEqual(task["version"], 1)
+        revision = db.task.revision()
+        last_change = db.task.last_change()
+
+        self.assertEqual(db.task.update(1, summary="Upgraded", version=1), 1)
+        self.assertEqual(db.task.select(1, raw=True)["version"], 2)
+        self.assertEqual(db.task.revision(), revision + 1)
+        self.assertEqual(db.task.last_change(), last_change + 1)
+        self.assertEqual([result["id"] for result in db.task.search("Upgraded")[0]], [1])
+
+        task_id = db.task.insert("New task", "inserted after the upgrade")
+        self.assertEqual(db.task.select(task_id, raw=True)["version"], 1)
+        self.assertEqual(db.task.delete(task_id, returning=True)["id"], task_id)
+        self.assertEqual(db.task.revision(), revision + 3)
+
+    def test_upgrade_is_repeatable(self):
+        """ An interrupted migration is repeated on the next start. """
+        db.schema.MIGRATIONS[1]()
+        self.assertEqual(db.schema.version(), 0)
+        db.schema.upgrade()
+        self.assertEqual(db.schema.version(), db.schema.VERSION)
+        self.assertEqual(len(db.task.select()), len(db.execute("SELECT id FROM task;").fetchall()))
+
+
+class TestNewDatabase(NewDatabase):
+    """ A database initialized by todo.sql needs no migrations. """
+
+    def test_version(self):
+        self.assertEqual(db.schema.upgrade(), db.schema.VERSION)
+
+    def test_create_versioning_is_idempotent(self):
+        tasks = db.task.select(raw=True)
+        revision = db.task.revision()
+        db.task.create_versioning()
+        self.assertEqual(db.task.select(raw=True), tasks)
+        self.assertEqual(db.task.revision(), revision)
+
+
+class TestSearch(NewDatabase):
+    def test_match(self):
+        tasks, after = db.task.search("python")
+        self.assertEqual({task["id"] for task in tasks}, {1, 2})
+        self.assertIsNone(after)
+
+    def test_invalid_query(self):
+        """ Any query FTS5 rejects is reported as invalid input, see server.task_search() (400 Bad Request). """
+        for query in ('"unbalanced', "python AND", "(python", "unknown:column", "*"):
+            with self.subTest(query=query), self.assertLogs("db.sqlite", "ERROR"):  # the failed statement is logged
+                self.assertRaises(ValueError, db.task.search, query)
+
+
+class TestTransfer(NewDatabase):
+    def export(self, format):
+        return io.BytesIO(b"".join(transfer.export_tasks(format, chunksize=2)))
+
+    def test_reimport_changes_nothing(self):
+        for format in transfer.FORMATS:
+            with self.subTest(format=format):
+                tasks = db.task.select(raw=True)
+                revision = db.task.revision()
+                last_change = db.task.last_change()
+                self.assertEqual(transfer.import_tasks(self.export(format), format, batch_size=2), len(tasks))
+                self.assertEqual(db.task.select(raw=True), tasks)
+                self.assertEqual(db.task.revision(), revision)
+                self.assertEqual(db.task.last_change(), last_change)
+
+    def test_import_restores_export(self):
+        for format in transfer.FORMATS:
+            with self.subTest(format=format):
+                tasks = db.task.select(raw=True)
+                exported = self.export(format)
+                db.task.update(1, summary="Changed", status_id="O")
+                db.task.delete(2)
+                revision = db.task.revision()
+                last_change = db.task.last_change()
+                transfer.import_tasks(exported, format)
+                self.assertEqual(db.task.select(raw=True), tasks)  # also version and modified
+                self.assertEqual(db.task.revision(), revision + 2)
+                self.assertEqual([(change["task_id"], change["operation"]) for change in db.task.changes(last_change)],
+                                 [(1, "update"), (2, "insert")])
+                self.assertEqual([task["id"] for task in db.task.search("Changed")[0]], [])
+
+
+class TestBulk(NewDatabase):
+    def count(self):
+        return db.execute("SELECT count(*) FROM task;").fetchone()[0]
+
+    def test_insert_many(self):
+        """ The ids are returned in order, also across batches and statements with a different set of fields. """
+        tasks = [dict(summary=f"task {i}", status_id="C") if i % 3 else dict(summary=f"task {i}") for i in range(7)]
+        ids = db.task.insert_many(tasks, batch_size=2)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([db.task.select(task_id, raw=True)["summary"] for task_id in ids],
+                         [task["summary"] for task in tasks])
+
+    def test_insert_many_retries_row_by_row(self):
+        """ A failing task rolls back its batch, the other tasks in it are inserted one by one. """
+        count = self.count()
+        tasks = [dict(summary="first", status_id="O"), dict(summary="invalid", status_id="X"),
+                 dict(summary="third", status_id="C"), dict(summary="", status_id="O"), dict(summary="fifth")]
+        with self.assertLogs("db.task", "WARNING"):
+            results = db.task.insert_many(tasks, batch_size=10)
+        self.assertIsInstance(results[1], sqlite3.IntegrityError)
+        self.assertIsInstance(results[3], sqlite3.IntegrityError)
+        first, third, fifth = results[0], results[2], results[4]
+        self.assertEqual((third, fifth), (first + 1, first + 2))
+        self.assertEqual(self.count(), count + 3)  # no task of the failed batch is inserted twice
+        self.assertEqual([db.task.select(task_id, raw=True)["summary"] for task_id in (first, third, fifth)],
+                         ["first", "third", "fifth"])
+
+    def test_update_many(self):
+        unchanged = db.task.select(2, raw=True)
+        with self.assertLogs("db.task", "WARNING"):
+            results = db.task.update_many([dict(id=1, status_id="C"), dict(id=999, status_id="C"),
+                                           dict(id=2, status_id="X"), dict(id=3, status_id="C")])
+        self.assertEqual(results[:2], [True, False])
+        self.assertIsInstance(results[2], sqlite3.IntegrityError)
+        self.assertIs(results[3], True)
+        self.assertEqual([db.task.select(task_id, raw=True)["status_id"] for task_id in (1, 3)], ["C", "C"])
+        self.assertEqual(db.task.select(2, raw=True), unchanged)
+
+    def test_delete_many(self):
+        count = self.count()
+        self.assertEqual(db.task.delete_many([1, 999, 1, 2], batch_size=2), [True, False, False, True])
+        self.assertEqual(self.count(), count - 2)
+
+    def test_post(self):
+        count = self.count()
+        tasks = [{"summary": "first"}, {"summary": "invalid", "status_id": "X"}, "not a task", {"summary": "fourth"}]
+        with self.assertLogs("db.task", "WARNING"):
+            status, _, result = call("POST", "/task/_bulk?batch_size=2", tasks)
+        self.assertEqual(status, 200)
+        self.assertEqual([item["status"] for item in result["data"]], ["success", "error", "fail", "success"])
+        self.assertEqual(result["data"][1]["code"], "IntegrityError")
+        ids = [result["data"][0]["data"]["id"], result["data"][3]["data"]["id"]]
+        self.assertEqual([db.task.select(task_id, raw=True)["summary"] for task_id in ids], ["first", "fourth"])
+        self.assertEqual(self.count(), count + 2)
+
+    def test_post_ndjson(self):
+        body = b'{"summary": "first"}\n{invalid\n\n{"summary": "third"}\n'
+        status, _, result = call("POST", "/task/_bulk", body, content_type="application/x-ndjson")
+        self.assertEqual(status, 200)
+        self.assertEqual([item["status"] for item in result["data"]], ["success", "fail", "success"])
+
+    def test_post_invalid(self):
+        for body, path in (({"summary": "not an array"}, "/task/_bulk"), ([], "/task/_bulk?batch_size=0")):
+            with self.subTest(body=body, path=path):
+                status, _, result = call("POST", path, body)
+                self.assertEqual(status, 400)
+                self.assertEqual(result["status"], "fail")
+
+
+class TestPool(DatabaseFile):
+    def hold(self, release):
+        """ Check out a connection in a new thread and keep it until event release is set. """
+        acquired = threading.Event()
+
+        def holder():
+            db.acquire()
+            acquired.set()
+            release.wait(5)
+            db.release()
+
+        thread = threading.Thread(target=holder)
+        thread.start()
+        self.assertTrue(acquired.wait(5))
+        return thread
+
+    def test_checkout_timeout(self):
+        release = threading.Event()
+        threads = [self.hold(release) for _ in range(4)]
+        self.assertEqual(db.pool_status(), dict(size=4, open=4, idle=0, in_use=4))
+        self.assertRaises(db.ErrorPoolExhausted, db.acquire, 0.1)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(db.pool_status(), dict(size=4, open=4, idle=4, in_use=0))
+        db.acquire(0.1)
+        self.assertEqual(db.pool_status(), dict(size=4, open=4, idle=3, in_use=1))
+        db.release()
+
+    def test_unhealthy_connection(self):
+        """ An idle connection which became unusable is discarded at checkout. """
+        broken = db.acquire()
+        db.release()
+        broken.close()
+        with self.assertLogs("db.sqlite", "WARNING"):
+            connection = db.acquire()
+        self.assertIsNot(connection, broken)
+        self.assertEqual(db.execute("SELECT count(*) FROM task;").fetchone()[0], len(db.task.select()))
+        self.assertEqual(db.pool_status(), dict(size=4, open=1, idle=0, in_use=1))
+
+    def test_read_during_write(self):
+        """ Two threads read at the same time while another thread holds the write transaction. """
+        count = len(db.task.select())
+        db.release()
+        commit = threading.Event()
+        written = threading.Event()
+
+        def writer():
+            with db.transaction():
+                insert("uncommitted")
+                written.set()
+                commit.wait(5)
+            db.release()
+
+        both_reading = threading.Barrier(2, timeout=5)
+        counts = []
+
+        def reader():
+            counts.append(db.execute("SELECT count(*) FROM task;").fetchone()[0])
+            both_reading.wait()  # breaks if the reads are serialized
+            db.release()
+
+        threads = [threading.Thread(target=writer)]
+        threads[0].start()
+        self.assertTrue(written.wait(5))
+        threads += [threading.Thread(target=reader) for _ in range(2)]
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads[1:]:
+            thread.join()
+        commit.set()
+        threads[0].join()
+
+        self.assertFalse(both_reading.broken)
+        self.assertEqual(counts, [count, count])  # the uncommitted insert is not seen
+        self.assertEqual(len(db.task.select()), count + 1)
+
+
+def insert(summary):
+    return db.execute("INSERT INTO task (summary) VALUES (?);", (summary,)).lastrowid
+
+
+def insert_then_fail(summary):
+    insert(summary)
+    raise ValueError(summary)
+
+
+class TestGroupCommit(DatabaseFile):
+    def count(self, summary):
+        return db.execute("SELECT count(*) FROM task WHERE summary = ?;", (summary,)).fetchone()[0]
+
+    def test_threads(self):
+        """ Every thread gets the ids of its own tasks. """
+        db.start_group_commit(interval=0.01)
+        ids = {}
+
+        def writer(n):
+            ids[n] = [db.task.insert(f"thread {n} task {i}") for i in range(20)]
+            db.release()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        db.stop_group_commit()
+        self.assertEqual(len({task_id for task_ids in ids.values() for task_id in task_ids}), 8 * 20)
+        for n, task_ids in ids.items():
+            self.assertEqual([db.task.select(task_id, raw=True)["summary"] for task_id in task_ids],
+                             [f"thread {n} task {i}" for i in range(20)])
+
+    def test_failing_write(self):
+        """ A failing write rolls back its own savepoint only, the other writes of its group are committed. """
+        db.start_group_commit(interval=0.5)
+        with self.assertLogs("db.sqlite", "DEBUG") as logs:
+            futures = [db.submit(insert, "first"), db.submit(insert_then_fail, "second"), db.submit(insert, "third")]
+            first, third = futures[0].result(), futures[2].result()
+        self.assertIn("DEBUG:db.sqlite:group commit of 3 writes", logs.output)
+        self.assertIsInstance(futures[1].exception(), ValueError)
+        self.assertEqual(str(futures[1].exception()), "second")
+        self.assertGreater(third, first)
+        self.assertEqual([self.count(summary) for summary in ("first", "second", "third")], [1, 0, 1])
+
+    def test_stop_applies_pending_writes(self):
+        db.start_group_commit(interval=10)
+        futures = [db.submit(insert, f"pending {i}") for i in range(5)]
+        db.stop_group_commit()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(len({future.result() for future in futures}), 5)
+        self.assertEqual(sum(self.count(f"pending {i}") for i in range(5)), 5)
+        self.assertEqual(db.task.insert("after stop"), max(future.result() for future in futures) + 1)
+
+    def test_in_memory_database(self):
+        db.close()
+        db.connect(":memory:")
+        self.assertRaises(ValueError, db.start_group_commit)
+
+
+class TestQueryPlans(NewDatabase):
+    """ No statement issued by db.task reads a large table without an index, see bench.plans. """
+
+    def test_no_full_scans(self):
+        seed(2000)
+        db.execute("ANALYZE;")
+        with db.record_statements() as statements:
+            plans.workload()
+        self.assertGreater(len(statements), 100)
+        self.assertEqual(plans.unexpected_scans(statements, min_rows=1000), [])
+
+
+class TestCursor(WebService):
+    @staticmethod
+    def cursor(*key):
+        return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+    def test_paging(self):
+        cursor = None
+        ids = []
+        while True:
+            status, _, result = call("GET", "/task?sort=duedate&limit=2" + (f"&after={cursor}" if cursor else ""))
+            self.assertEqual(status, 200)
+            ids.extend(task["id"] for task in result["data"]["tasks"])
+            cursor = result["data"]["next"]
+            if cursor is None:
+                break
+        self.assertEqual(ids, [task["id"] for task in sorted(db.task.select(raw=True),
+                                                            key=lambda task: (task["duedate"], task["id"]))])
+
+    def test_invalid_cursor(self):
+        for sort, key in (("id", ("id",)), ("id", ("id", 1, 2)), ("id", ("id", [1])), ("id", ("id", {"a": 1})),
+                          ("duedate", ("duedate", "x")), ("duedate", ("id", 1)), ("-id", ("id", 1))):
+            with self.subTest(sort=sort, key=key):
+                status, _, result = call("GET", f"/task?sort={sort}&after={self.cursor(*key)}")
+                self.assertEqual(status, 400)
+                self.assertEqual(result["status"], "fail")
+        status, _, _ = call("GET", "/task?after=not-a-cursor")
+        self.assertEqual(status, 400)
+        status, _, _ = call("GET", f"/task/_search?q=python&after={self.cursor('search', 1)}")
+        self.assertEqual(status, 400)
+
+
+class TestConditionalGet(WebService):
+    def test_if_none_match(self):
+        status, headers, _ = call("GET", "/task/1")
+        etag = headers["etag"]
+        for _ in range(2):  # from the database, then from the cache
+            status, headers, result = call("GET", "/task/1", headers={"If-None-Match": etag})
+            self.assertEqual((status, headers["etag"], result), (304, etag, None))
+        for if_none_match in (f"W/{etag}", f'"1-0", {etag}', "*"):
+            status, _, _ = call("GET", "/task/1", headers={"If-None-Match": if_none_match})
+            self.assertEqual(status, 304)
+        status, _, result = call("GET", "/task/1", headers={"If-None-Match": '"1-0"'})
+        self.assertEqual(status, 200)
+        self.assertEqual(result["data"]["id"], 1)
+
+    def test_if_modified_since(self):
+        status, headers, _ = call("GET", "/task/1")
+        last_modified = headers["last-modified"]
+        status, _, _ = call("GET", "/task/1", headers={"If-Modified-Since": last_modified})
+        self.assertEqual(status, 304)
+        status, _, _ = call("GET", "/task/1", headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"})
+        self.assertEqual(status, 200)
+        status, _, _ = call("GET", "/task/1", headers={"If-Modified-Since": last_modified, "If-None-Match": '"1-0"'})
+        self.assertEqual(status, 200)  # If-None-Match takes precedence
+
+    def test_collection_etag(self):
+        """ The ETag of the collection changes after every insert, update and delete. """
+        etags = [call("GET", "/task")[1]["etag"]]
+        for method, path, body in (("POST", "/task", {"summary": "New"}), ("PUT", "/task/1", {"summary": "Changed"}),
+                                   ("DELETE", "/task/2", None)):
+            status, _, _ = call("GET", "/task?limit=2", headers={"If-None-Match": etags[-1]})
+            self.assertEqual(status, 304)
+            call(method, path, body)
+            status, headers, _ = call("GET", "/task?limit=2", headers={"If-None-Match": etags[-1]})
+            self.assertEqual(status, 200)
+            self.assertNotIn(headers["etag"], etags)
+            etags.append(headers["etag"])
+
+
+class TestTransaction(WebService):
+    """ PUT and DELETE run in a transaction of their own, see server.TransactionPlugin. """
+
+    def setUp(self):
+        super().setUp()
+        self.changes = []  # (task_id, in transaction) per call of the listener
+        self.listener = lambda task_id: self.changes.append((task_id, db.connection().in_transaction))
+        db.task.listeners.append(self.listener)
+
+    def tearDown(self):
+        db.task.listeners.remove(self.listener)
+        super().tearDown()
+
+    def test_put(self):
+        status, headers, _ = call("GET", "/task/1")
+        etag = headers["etag"]
+        status, headers, result = call("PUT", "/task/1", {"summary": "Changed"}, {"If-Match": etag})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["etag"], '"1-2"')
+        self.assertEqual(result["data"]["summary"], "Changed")
+        self.assertEqual(self.changes, [(1, False)])  # the caches are invalidated after the commit
+
+        status, _, result = call("GET", "/task/1")
+        self.assertEqual(result["data"]["summary"], "Changed")
+        status, _, _ = call("PUT", "/task/1", {"summary": "Lost update"}, {"If-Match": etag})
+        self.assertEqual(status, 412)
+        status, _, _ = call("PUT", "/task/999", {"summary": "Changed"})
+        self.assertEqual(status, 404)
+        self.assertEqual(db.task.select(1, raw=True)["summary"], "Changed")
+
+    def test_delete(self):
+        status, _, _ = call("DELETE", "/task/1", headers={"If-Match": '"1-0"'})
+        self.assertEqual(status, 412)
+        status, _, result = call("DELETE", "/task/1", headers={"If-Match": '"1-1"'})
+        self.assertEqual(status, 200)
+        self.assertEqual(result["data"]["id"], 1)
+        self.assertEqual(self.changes, [(1, False)])
+        for method in ("GET", "DELETE"):
+            status, _, _ = call(method, "/task/1")
+            self.assertEqual(status, 404)
+
+    def test_rollback_on_server_error(self):
+        """ A 5xx response rolls back the changes already made, and leaves the caches alone. """
+        unchanged = db.task.select(1, raw=True)
+        _, _, task = call("GET", "/task/1")
+        with mock.patch("server.task_etag", side_effect=sqlite3.OperationalError("disk I/O error")), \
+                self.assertLogs("server", "ERROR"):
+            status, _, result = call("PUT", "/task/1", {"summary": "Rolled back"})
+        self.assertEqual(status, 500)
+        self.assertEqual(result["code"], "OperationalError")
+        self.assertEqual(self.changes, [])
+        self.assertEqual(db.task.select(1, raw=True), unchanged)
+        self.assertEqual(call("GET", "/task/1")[:3:2], (200, task))
+
+
+class TestMetrics(NewDatabase):
+    def setUp(self):
+        super().setUp()
+        self.app = bottle.Bottle()
+        self.app.install(server.TransactionPlugin())  # installed before metrics, like in server.py
+
+        @self.app.post("/commit_fails", transaction=True)
+        def commit_fails():
+            db.execute("PRAGMA defer_foreign_keys = ON;")  # checked at the commit
+            db.execute("INSERT INTO task (summary, status_id) VALUES ('unknown status', 'X');")
+            return "inserted"
+
+        metrics.reset()
+        metrics.install(self.app)
+
+    def tearDown(self):
+        db.observe(None)
+        jsend.observer = None
+        metrics.reset()
+        super().tearDown()
+
+    def test_measures_transaction(self):
+        """ The failed commit after the handler returned is recorded as a 500. """
+        with self.assertLogs("server", "ERROR"):
+            status, _, result = call("POST", "/commit_fails", app=self.app)
+        self.assertEqual(status, 500)
+        self.assertEqual(result["code"], "IntegrityError")
+        self.assertIn('todo_http_requests_total{method="POST",route="/commit_fails",status="500"} 1', metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,156 +1,436 @@
---
--- File generated with SQLiteStudio v3.2.1 on wo aug 21 21:21:54 2019
---
--- Text encoding used: System
---
-PRAGMA foreign_keys = off;
-BEGIN TRANSACTION;
-
--- Table: status
-DROP TABLE IF EXISTS status;
-
-CREATE TABLE status (
-    id          TEXT PRIMARY KEY
-                     CONSTRAINT [status id may not be empty] CHECK (LENGTH(id) > 0),
-    description TEXT NOT NULL
-                     CONSTRAINT [status description may not be empty] CHECK (LENGTH(description) > 0) 
-)
-WITHOUT ROWID;
-
-INSERT INTO status (
-                       id,
-                       description
-                   )
-                   VALUES (
-                       'C',
-                       'Closed'
-                   );
-
-INSERT INTO status (
-                       id,
-                       description
-                   )
-                   VALUES (
-                       'O',
-                       'Open'
-                   );
-
-
--- Table: task
-DROP TABLE IF EXISTS task;
-
-CREATE TABLE task (
-    id          INTEGER   PRIMARY KEY AUTOINCREMENT,
-    summary     TEXT      CONSTRAINT [summary may not be empty] CHECK (LENGTH(summary) > 0) 
-                          NOT NULL,
-    description TEXT,
-    duedate     DATE      NOT NULL
-                          DEFAULT (DATE('now', 'localtime') ),
-    status_id   TEXT      NOT NULL
-                          REFERENCES status (id) 
-                          DEFAULT O,
-    modified    TIMESTAMP DEFAULT (DATETIME('now', 'localtime') ) 
-);
-
-INSERT INTO task (
-                     id,
-                     summary,
-                     description,
-                     duedate,
-                     status_id,
-                     modified
-                 )
-                 VALUES (
-                     1,
-                     'Read a book',
-                     'Read a book to get a good introduction into Python',
-                     '2020-01-01',
-                     'C',
-                     '2017-09-18 09:10:20'
-                 );
-
-INSERT INTO task (
-                     id,
-                     summary,
-                     description,
-                     duedate,
-                     status_id,
-                     modified
-                 )
-                 VALUES (
-                     2,
-                     'Visit python.org',
-                     'Visit the python.org website and browse around',
-                     '2015-03-27',
-                     'C',
-                     '2017-09-17 17:58:28'
-                 );
-
-INSERT INTO task (
-                     id,
-                     summary,
-                     description,
-                     duedate,
-                     status_id,
-                     modified
-                 )
-                 VALUES (
-                     3,
-                     'Test editors',
-                     'Test various editors and check the syntax highlighting',
-                     '2015-01-01',
-                     'O',
-                     '2017-09-17 17:58:40'
-                 );
-
-INSERT INTO task (
-                     id,
-                     summary,
-                     description,
-                     duedate,
-                     status_id,
-                     modified
-                 )
-                 VALUES (
-                     4,
-                     'Choose GUI-framework',
-                     'Choose your favorite GUI-Framework',
-                     '2015-01-03',
-                     'O',
-                     '2016-05-15 10:57:26'
-                 );
-
-INSERT INTO task (
-                     id,
-                     summary,
-                     description,
-                     duedate,
-                     status_id,
-                     modified
-                 )
-                 VALUES (
-                     5,
-                     'Rubber Duck',
-                     'Go to amazon.com and buy a rubber duck',
-                     '2020-01-01',
-                     'O',
-                     '2019-08-21 21:20:24'
-                 );
-
-
--- Trigger: update modified
-DROP TRIGGER IF EXISTS "update modified";
-CREATE TRIGGER [update modified]
-         AFTER UPDATE
-            ON task
-      FOR EACH ROW
-          WHEN NEW.modified = OLD.modified
-BEGIN
-    UPDATE task
-       SET modified = DATETIME('now', 'localtime') 
-     WHERE id = OLD.id;
-END;
-
-
-COMMIT TRANSACTION;
-PRAGMA foreign_keys = on;
+--
+-- File generated with SQLiteStudio v3.2.1 on wo aug 21 21:21:54 2019
+--
+-- Text encoding used: System
+--
+PRAGMA foreign_keys = off;
+BEGIN TRANSACTION;
+
+-- Table: revision
+DROP TABLE IF EXISTS revision;
+
+CREATE TABLE revision (
+    name  TEXT    PRIMARY KEY,
+    value INTEGER NOT NULL
+                  DEFAULT 0
+)
+WITHOUT ROWID;
+
+INSERT INTO revision (
+                         name,
+                         value
+                     )
+                     VALUES (
+                         'task',
+                         0
+                     );
+
+INSERT INTO revision (
+                         name,
+                         value
+                     )
+                     VALUES (
+                         'task_change',
+                         0
+                     );
+
+
+-- Table: status
+DROP TABLE IF EXISTS status;
+
+CREATE TABLE status (
+    id          TEXT PRIMARY KEY
+                     CONSTRAINT [status id may not be empty] CHECK (LENGTH(id) > 0),
+    description TEXT NOT NULL
+                     CONSTRAINT [status description may not be empty] CHECK (LENGTH(description) > 0) 
+)
+WITHOUT ROWID;
+
+INSERT INTO status (
+                       id,
+                       description
+                   )
+                   VALUES (
+                       'C',
+                       'Closed'
+                   );
+
+INSERT INTO status (
+                       id,
+                       description
+                   )
+                   VALUES (
+                       'O',
+                       'Open'
+                   );
+
+
+-- Table: task
+DROP TABLE IF EXISTS task;
+
+CREATE TABLE task (
+    id          INTEGER   PRIMARY KEY AUTOINCREMENT,
+    summary     TEXT      CONSTRAINT [summary may not be empty] CHECK (LENGTH(summary) > 0) 
+                          NOT NULL,
+    description TEXT,
+    duedate     DATE      NOT NULL
+                          DEFAULT (DATE('now', 'localtime') ),
+    status_id   TEXT      NOT NULL
+                          REFERENCES status (id) 
+                          DEFAULT O,
+    modified    TIMESTAMP DEFAULT (DATETIME('now', 'localtime') ),
+    version     INTEGER   NOT NULL
+                          DEFAULT 1
+);
+
+INSERT INTO task (
+                     id,
+                     summary,
+                     description,
+                     duedate,
+                     status_id,
+                     modified
+                 )
+                 VALUES (
+                     1,
+                     'Read a book',
+                     'Read a book to get a good introduction into Python',
+                     '2020-01-01',
+                     'C',
+                     '2017-09-18 09:10:20'
+                 );
+
+INSERT INTO task (
+                     id,
+                     summary,
+                     description,
+                     duedate,
+                     status_id,
+                     modified
+                 )
+                 VALUES (
+                     2,
+                     'Visit python.org',
+                     'Visit the python.org website and browse around',
+                     '2015-03-27',
+                     'C',
+                     '2017-09-17 17:58:28'
+                 );
+
+INSERT INTO task (
+                     id,
+                     summary,
+                     description,
+                     duedate,
+                     status_id,
+                     modified
+                 )
+                 VALUES (
+                     3,
+                     'Test editors',
+                     'Test various editors and check the syntax highlighting',
+                     '2015-01-01',
+                     'O',
+                     '2017-09-17 17:58:40'
+                 );
+
+INSERT INTO task (
+                     id,
+                     summary,
+                     description,
+                     duedate,
+                     status_id,
+                     modified
+                 )
+                 VALUES (
+                     4,
+                     'Choose GUI-framework',
+                     'Choose your favorite GUI-Framework',
+                     '2015-01-03',
+                     'O',
+                     '2016-05-15 10:57:26'
+                 );
+
+INSERT INTO task (
+                     id,
+                     summary,
+                     description,
+                     duedate,
+                     status_id,
+                     modified
+                 )
+                 VALUES (
+                     5,
+                     'Rubber Duck',
+                     'Go to amazon.com and buy a rubber duck',
+                     '2020-01-01',
+                     'O',
+                     '2019-08-21 21:20:24'
+                 );
+
+
+-- Table: task_change
+DROP TABLE IF EXISTS task_change;
+
+CREATE TABLE task_change (
+    seq       INTEGER   PRIMARY KEY AUTOINCREMENT,
+    task_id   INTEGER   NOT NULL,
+    operation TEXT      NOT NULL
+                        CHECK (operation IN ('insert', 'update', 'delete') ),
+    changed   TIMESTAMP NOT NULL
+                        DEFAULT (DATETIME('now', 'localtime') ) 
+);
+
+
+-- Table: task_fts
+DROP TABLE IF EXISTS task_fts;
+
+CREATE VIRTUAL TABLE task_fts USING fts5 (
+    summary,
+    description,
+    content = task,
+    content_rowid = id
+);
+
+
+-- Index: task_change_changed
+DROP INDEX IF EXISTS task_change_changed;
+
+CREATE INDEX task_change_changed ON task_change (
+    changed
+);
+
+
+-- Index: task_duedate
+DROP INDEX IF EXISTS task_duedate;
+
+CREATE INDEX task_duedate ON task (
+    duedate
+);
+
+
+-- Index: task_modified
+DROP INDEX IF EXISTS task_modified;
+
+CREATE INDEX task_modified ON task (
+    modified
+);
+
+
+-- Index: task_status_duedate
+DROP INDEX IF EXISTS task_status_duedate;
+
+CREATE INDEX task_status_duedate ON task (
+    status_id,
+    duedate
+);
+
+
+-- Trigger: index task delete
+DROP TRIGGER IF EXISTS "index task delete";
+CREATE TRIGGER [index task delete]
+         AFTER DELETE
+            ON task
+      FOR EACH ROW
+BEGIN
+    INSERT INTO task_fts (
+                             task_fts,
+                             rowid,
+                             summary,
+                             description
+                         )
+                         SELECT 'delete',
+                                OLD.id,
+                                OLD.summary,
+                                OLD.description
+                          WHERE EXISTS (
+                                    SELECT 1
+                                      FROM task_fts_docsize
+                                     WHERE id = OLD.id
+                                );
+END;
+
+
+-- Trigger: index task insert
+DROP TRIGGER IF EXISTS "index task insert";
+CREATE TRIGGER [index task insert]
+         AFTER INSERT
+            ON task
+      FOR EACH ROW
+BEGIN
+    INSERT INTO task_fts (
+                             rowid,
+                             summary,
+                             description
+                         )
+                         VALUES (
+                             NEW.id,
+                             NEW.summary,
+                             NEW.description
+                         );
+END;
+
+
+-- Trigger: index task update
+DROP TRIGGER IF EXISTS "index task update";
+CREATE TRIGGER [index task update]
+         AFTER UPDATE OF summary,
+                         description
+            ON task
+      FOR EACH ROW
+BEGIN
+    INSERT INTO task_fts (
+                             task_fts,
+                             rowid,
+                             summary,
+                             description
+                         )
+                         SELECT 'delete',
+                                OLD.id,
+                                OLD.summary,
+                                OLD.description
+                          WHERE EXISTS (
+                                    SELECT 1
+                                      FROM task_fts_docsize
+                                     WHERE id = OLD.id
+                                );
+    INSERT INTO task_fts (
+                             rowid,
+                             summary,
+                             description
+                         )
+                         VALUES (
+                             NEW.id,
+                             NEW.summary,
+                             NEW.description
+                         );
+END;
+
+
+-- Trigger: log task delete
+DROP TRIGGER IF EXISTS "log task delete";
+CREATE TRIGGER [log task delete]
+         AFTER DELETE
+            ON task
+      FOR EACH ROW
+BEGIN
+    INSERT INTO task_change (
+                                task_id,
+                                operation
+                            )
+                            VALUES (
+                                OLD.id,
+                                'delete'
+                            );
+END;
+
+
+-- Trigger: log task insert
+DROP TRIGGER IF EXISTS "log task insert";
+CREATE TRIGGER [log task insert]
+         AFTER INSERT
+            ON task
+      FOR EACH ROW
+BEGIN
+    INSERT INTO task_change (
+                                task_id,
+                                operation
+                            )
+                            VALUES (
+                                NEW.id,
+                                'insert'
+                            );
+END;
+
+
+-- Trigger: log task update
+DROP TRIGGER IF EXISTS "log task update";
+CREATE TRIGGER [log task update]
+         AFTER UPDATE
+            ON task
+      FOR EACH ROW
+          WHEN NEW.version <> OLD.version OR 
+               NEW.modified IS NOT OLD.modified
+BEGIN
+    INSERT INTO task_change (
+                                task_id,
+                                operation
+                            )
+                            VALUES (
+                                NEW.id,
+                                'update'
+                            );
+END;
+
+
+-- Trigger: revise task delete
+DROP TRIGGER IF EXISTS "revise task delete";
+CREATE TRIGGER [revise task delete]
+         AFTER DELETE
+            ON task
+      FOR EACH ROW
+BEGIN
+    UPDATE revision
+       SET value = value + 1
+     WHERE name = 'task';
+END;
+
+
+-- Trigger: revise task insert
+DROP TRIGGER IF EXISTS "revise task insert";
+CREATE TRIGGER [revise task insert]
+         AFTER INSERT
+            ON task
+      FOR EACH ROW
+BEGIN
+    UPDATE revision
+       SET value = value + 1
+     WHERE name = 'task';
+END;
+
+
+-- Trigger: revise task update
+DROP TRIGGER IF EXISTS "revise task update";
+CREATE TRIGGER [revise task update]
+         AFTER UPDATE
+            ON task
+      FOR EACH ROW
+          WHEN NEW.version <> OLD.version OR 
+               NEW.modified IS NOT OLD.modified
+BEGIN
+    UPDATE revision
+       SET value = value + 1
+     WHERE name = 'task';
+END;
+
+
+-- Trigger: update modified
+DROP TRIGGER IF EXISTS "update modified";
+CREATE TRIGGER [update modified]
+         AFTER UPDATE
+            ON task
+      FOR EACH ROW
+          WHEN NEW.version = OLD.version AND 
+               NEW.modified IS OLD.modified
+BEGIN
+    UPDATE task
+       SET modified = DATETIME('now', 'localtime'),
+           version = OLD.version + 1
+     WHERE id = OLD.id;
+END;
+
+
+-- Index the tasks inserted above
+INSERT INTO task_fts (
+                         task_fts
+                     )
+                     VALUES (
+                         'rebuild'
+                     );
+
+
+COMMIT TRANSACTION;
+PRAGMA foreign_keys = on;
+
+-- Schema version, see db/schema.py
+PRAGMA user_version = 2;
@@ -0,0 +1,169 @@
+""" Streaming export and import of tasks as NDJSON or CSV, and of the complete database as SQL.
+
+Export fetches the tasks in id order in chunks and yields them as UTF-8 encoded pieces.
+Import parses the input while reading it and inserts the tasks in batches, committing
+every batch (see db.task.import_many). Both work in constant memory, whatever the number
+of tasks. An exported file can be imported again: tasks keep their id and a task which
+already exists is replaced.
+
+NDJSON has one JSON object per line with the fields of db.task.Task. CSV has a header line
+with the field names; an empty value means null, which for description is stored as "".
+
+The web service exposes export and import as GET /task/_export and POST /task/_import.
+Via the terminal:
+    > python transfer.py export tasks.ndjson --db todo.db
+    > python transfer.py import tasks.csv --db todo.db
+    > python transfer.py dump dump.sql --db todo.db
+    > python transfer.py load dump.sql --db new.db
+"""
+import csv
+import io
+import itertools
+import json
+import sqlite3
+
+import db
+import jsend
+
+FORMATS = {  # name: content type
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+FIELDS = db.task.Task.__slots__
+INTEGER_FIELDS = ("id", "version")
+
+
+def export_tasks(format="ndjson", chunksize=1000, progress=None):
+    """ Yield all tasks in NDJSON or CSV format, in UTF-8 encoded pieces of chunksize tasks.
+
+    :param str format: ndjson or csv
+    :param int chunksize: number of tasks fetched and yielded at a time
+    :param function progress: progress(count) is called with the number of tasks exported after every piece
+    :raises: ValueError - unknown format
+    """
+    if format not in FORMATS:
+        raise ValueError(f"unknown format {format}, use {' or '.join(FORMATS)}")
+
+    tasks = db.task.iterate(arraysize=chunksize, raw=True)
+
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(FIELDS)
+        yield buffer.getvalue().encode("utf-8")
+
+    count = 0
+    for chunk in iter(lambda: list(itertools.islice(tasks, chunksize)), []):
+        if format == "csv":
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode("utf-8")
+        else:
+            yield jsend.ndjson(chunk)
+        count += len(chunk)
+        if progress is not None:
+            progress(count)
+
+
+def read_ndjson(file):
+    """ Yield a task dict per non-empty line of a binary NDJSON file, or a ValueError for an invalid line. """
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"invalid JSON: {e}")
+
+
+def read_csv(file):
+    """ Yield a task dict per record of a binary CSV file with a header line, or a ValueError for an invalid record. """
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8", newline=""))
+    unknown = set(reader.fieldnames or ()) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields in CSV header: {', '.join(sorted(unknown))}")
+    for record in reader:
+        try:
+            task = {field: value if value != "" else None for field, value in record.items() if field is not None}
+            for field in INTEGER_FIELDS:
+                if task.get(field) is not None:
+                    task[field] = int(task[field])
+            yield task
+        except ValueError as e:
+            yield ValueError(f"invalid record: {e}")
+
+
+READERS = {"ndjson": read_ndjson, "csv": read_csv}
+
+
+def import_tasks(file, format="ndjson", batch_size=db.task.BATCH_SIZE, on_error=None, progress=None):
+    """ Import the tasks from a binary file-like object in NDJSON or CSV format.
+
+    :param file: file opened in binary mode, or any iterable of lines as bytes for NDJSON
+    :param str format: ndjson or csv
+    :param int batch_size: number of tasks per transaction
+    :param function on_error: on_error(index, exception) is called for every task which failed,
+                              index counts the tasks (lines for NDJSON, records for CSV) from 0
+    :param function progress: progress(count) is called with the number of tasks processed after every batch
+    :return int: number of tasks imported
+    :raises: ValueError - unknown format or invalid CSV header
+    """
+    if format not in READERS:
+        raise ValueError(f"unknown format {format}, use {' or '.join(READERS)}")
+    return db.task.import_many(READERS[format](file), batch_size, on_error, progress)
+
+
+def format_of(filename):
+    """ Return the format for a filename based on its extension, ndjson when unknown. """
+    return "csv" if filename.lower().endswith(".csv") else "ndjson"
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Export, import, dump or load the todo database")
+    parser.add_argument("command", choices=("export", "import", "dump", "load"))
+    parser.add_argument("file", help="file to write (export, dump) or read (import, load)")
+    parser.add_argument("--db", default="todo.db", help="database file (default: todo.db)")
+    parser.add_argument("--script", default="todo.sql", help="DDL script for a new database on import "
+                                                             "(default: todo.sql)")
+    parser.add_argument("--format", choices=FORMATS, help="format for export and import (default: from extension)")
+    parser.add_argument("--batch-size", type=int, default=db.task.BATCH_SIZE, help="tasks or statements per commit")
+    args = parser.parse_args()
+
+    done = [0]  # last count reported
+
+    def report(count):
+        done[0] = count
+        print(f"\r{count} ...", end="", file=sys.stderr, flush=True)
+
+    def failed(index, error):
+        print(f"\rtask {index}: {error}", file=sys.stderr)
+
+    try:
+        db.connect(args.db, create=args.command in ("import", "load"))
+        if args.command == "import":  # like server.open_database()
+            if db.schema.is_empty():
+                db.schema.initialize(args.script)
+            db.schema.upgrade()
+    except (OSError, sqlite3.Error, db.schema.ErrorSchemaTooNew) as e:
+        db.close()
+        sys.exit(f"cannot open database {args.db}: {type(e).__name__} - {e}")
+
+    try:
+        if args.command == "export":
+            with open(args.file, "wb") as file:
+                for piece in export_tasks(args.format or format_of(args.file), progress=report):
+                    file.write(piece)
+            print(f"\rexported {done[0]} tasks", file=sys.stderr)
+        elif args.command == "import":
+            with open(args.file, "rb") as file:
+                count = import_tasks(file, args.format or format_of(args.file), args.batch_size, failed, report)
+            print(f"\rimported {count} tasks", file=sys.stderr)
+        elif args.command == "dump":
+            print(f"\rdumped {db.dump(args.file, report)} statements", file=sys.stderr)
+        else:
+            print(f"\rloaded {db.load(args.file, args.batch_size, report)} statements", file=sys.stderr)
+    finally:
+        db.close()